@@ -21,9 +21,9 @@ class ProductoAdmin(admin.ModelAdmin):
         ("Identificación", {"fields": ("sku", "ean_upc", "nombre", "descripcion", "categoria", "marca", "modelo")}),
         ("Unidades y conversión", {"fields": ("uom_compra", "uom_venta", "factor_conversion")}),
         ("Precios e impuestos", {"fields": ("costo_estandar", "precio_venta", "impuesto_iva")}),
-        ("Stock y reorden", {"fields": ("stock_minimo", "stock_maximo", "punto_reorden")}),
-        ("Controles especiales", {"fields": ("perecible", "control_por_lote", "control_por_serie")}),
+        ("Stock y reorden", {"fields": ("stock_total", "stock_minimo", "stock_maximo", "punto_reorden")}),
+        ("Controles especiales", {"fields": ("perecible", "control_por_lote", "control_por_serie", "stock_fragmentado")}),
         ("Recursos", {"fields": ("url_imagen", "url_ficha_tecnica")}),
         ("Estado y tiempos", {"fields": ("activo", "creado_en", "actualizado_en")}),
     )
-    readonly_fields = ("creado_en", "actualizado_en")
+    readonly_fields = ("stock_total", "creado_en", "actualizado_en")
@@ -0,0 +1,75 @@
+"""
+Alertas de bajo stock.
+
+Un producto está en alerta cuando su stock total (Producto.stock_total, que mantienen
+los movimientos) es menor o igual a su umbral: el punto de reorden, o el stock mínimo
+si no tiene punto de reorden. Es un solo filtro sobre la tabla de productos, sin
+sumar Stock por producto.
+
+- filtrar(qs):  productos en alerta de `qs` (filtro ?alerta=bajo del listado).
+- resumen():    lista cacheada para el endpoint /productos/bajo-stock/.
+- invalidar():  cambia la versión de la lista al confirmar la transacción; la llaman
+                StockResumen (cambios de stock_total), compactar_stock, resumen_stock y la
+                señal de Producto.
+
+La caché es la de settings.CACHES (DatabaseCache, común a todos los procesos): una
+versión nueva escrita por stock_applier o por otro worker la ve también el que sirve el
+endpoint. La lista se guarda bajo su versión y una transacción que mueve stock de muchos
+productos escribe en la caché una sola vez (la versión), no una vez por movimiento; las
+listas de versiones viejas simplemente expiran.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import Producto
+
+CLAVE_CACHE = "productos:bajo_stock"
+CLAVE_VERSION = "productos:bajo_stock:version"
+SEGUNDOS_CACHE = 300
+LIMITE = 500
+
+
+def umbral():
+    """Expresión del umbral: punto_reorden (si es > 0) o stock_minimo."""
+    return Coalesce(NullIf(F("punto_reorden"), Value(0)), F("stock_minimo"),
+                    output_field=DecimalField(max_digits=12, decimal_places=3))
+
+
+def filtrar(qs=None):
+    """Productos de `qs` con stock_total <= umbral, anotados con `umbral`."""
+    qs = Producto.objects.all() if qs is None else qs
+    return qs.annotate(umbral=umbral()).filter(stock_total__lte=F("umbral"))
+
+
+def _calcular():
+    qs = (filtrar(Producto.objects.filter(activo=True))
+          .order_by("stock_total", "sku")
+          .values("id", "sku", "nombre", "stock_total", "umbral", categoria_nombre=F("categoria__nombre")))
+    productos = [
+        {"id": p["id"], "sku": p["sku"], "nombre": p["nombre"], "categoria": p["categoria_nombre"] or "",
+         "stock": p["stock_total"], "umbral": p["umbral"], "faltante": p["umbral"] - p["stock_total"]}
+        for p in qs[:LIMITE + 1]
+    ]
+    return {"total": len(productos) if len(productos) <= LIMITE else qs.count(), "productos": productos[:LIMITE]}
+
+
+def resumen():
+    """{"total", "productos": [...]} de los productos activos en alerta, más urgentes primero."""
+    return cache.get_or_set(CLAVE_CACHE, _calcular, SEGUNDOS_CACHE, version=cache.get(CLAVE_VERSION, 0))
+
+
+def _nueva_version():
+    # Un valor nuevo en vez de incr(): en DatabaseCache incr es leer + escribir, y dos
+    # procesos a la vez podrían dejar la misma versión.
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar():
+    conexion = transaction.get_connection()
+    if conexion.in_atomic_block and any(f is _nueva_version for _, f, *_ in conexion.run_on_commit):
+        return  # ya se cambia al confirmar esta transacción
+    transaction.on_commit(_nueva_version)
@@ -0,0 +1,155 @@
+"""
+Búsqueda indexada de productos.
+
+`ProductoBusqueda` guarda los sufijos normalizados (sin tildes, mayúsculas) de cada
+palabra del SKU, nombre y categoría. Un término de búsqueda se resuelve como
+un rango sobre el índice (fragmento, producto) (equivale a `LIKE 'TERM%'`),
+en vez de los icontains (LIKE '%term%') que obligaban a recorrer toda la tabla.
+
+- condicion(texto) / filtrar(qs, texto): todos los términos deben aparecer (AND), en cualquier campo.
+- sugerencias(texto, limite): ids más relevantes para el autocompletar (ver PESOS).
+- reindexar(ids): reconstruye el índice de esos productos (lo llaman las señales).
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from lilis_erp.texto import prefijo_q, tokens
+
+from .models import Producto, ProductoBusqueda
+
+LARGO_FRAGMENTO = 64
+LOTE = 1000
+
+# Menor = más relevante: coincidir al inicio de una palabra pesa más que en medio,
+# y el SKU más que el nombre, y éste más que la categoría.
+PESOS = {
+    ("sku", True): 0,
+    ("nombre", True): 1,
+    ("categoria", True): 2,
+    ("sku", False): 3,
+    ("nombre", False): 4,
+    ("categoria", False): 5,
+}
+SIN_PESO = 99
+
+
+def fragmentos(sku, nombre, categoria):
+    """{fragmento: peso} con todos los sufijos de cada palabra (el mejor peso si se repite)."""
+    salida = {}
+    for campo, valor in (("sku", sku), ("nombre", nombre), ("categoria", categoria)):
+        for palabra in tokens(valor):
+            for i in range(len(palabra)):
+                frag = palabra[i:i + LARGO_FRAGMENTO]
+                peso = PESOS[(campo, i == 0)]
+                if peso < salida.get(frag, SIN_PESO):
+                    salida[frag] = peso
+    return salida
+
+
+def terminos(texto):
+    """Términos de búsqueda normalizados, sin repetir y en el orden escrito."""
+    vistos = []
+    for t in tokens(texto):
+        t = t[:LARGO_FRAGMENTO]
+        if t not in vistos:
+            vistos.append(t)
+    return vistos
+
+
+def _filas(producto_id, sku, nombre, categoria):
+    return [ProductoBusqueda(producto_id=producto_id, fragmento=f, peso=p)
+            for f, p in fragmentos(sku, nombre, categoria).items()]
+
+
+@transaction.atomic
+def reindexar(ids=None):
+    """Reconstruye el índice de los productos `ids` (todos si es None). Devuelve filas creadas."""
+    qs = Producto.objects.order_by("id").values_list("id", "sku", "nombre", "categoria__nombre")
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        qs = qs.filter(id__in=ids)
+        ProductoBusqueda.objects.filter(producto_id__in=ids).delete()
+    else:
+        ProductoBusqueda.objects.all().delete()
+
+    creadas = 0
+    pendientes = []
+    for fila in qs.iterator(chunk_size=LOTE):
+        pendientes.extend(_filas(*fila))
+        if len(pendientes) >= LOTE * 20:
+            ProductoBusqueda.objects.bulk_create(pendientes, batch_size=LOTE)
+            creadas += len(pendientes)
+            pendientes = []
+    if pendientes:
+        ProductoBusqueda.objects.bulk_create(pendientes, batch_size=LOTE)
+        creadas += len(pendientes)
+    return creadas
+
+
+def _coincidencias(termino):
+    return ProductoBusqueda.objects.filter(prefijo_q("fragmento", termino, normalizar=False))
+
+
+def condicion(texto):
+    lista = terminos(texto)
+    if not lista:
+        return None
+    cond = Q()
+    for t in lista:
+        cond &= Q(pk__in=_coincidencias(t).values("producto_id"))
+    texto = (texto or "").strip()
+    if texto.isdigit():
+        cond |= Q(pk=int(texto))
+    return cond
+
+
+def filtrar(queryset, texto):
+    cond = condicion(texto)
+    return queryset if cond is None else queryset.filter(cond)
+
+
+def sugerencias(texto, limite=10):
+    """
+    Ids de los `limite` productos más relevantes, en orden, para el autocompletar.
+
+    No ordena todas las coincidencias: recorre el índice (peso, fragmento, producto)
+    nivel por nivel de PESOS y se detiene apenas junta `limite` productos, así que el
+    costo no crece con el catálogo. Un SKU o ID escrito completo va primero.
+    """
+    lista = terminos(texto)
+    if not lista:
+        return []
+    texto = (texto or "").strip()
+
+    ids = list(Producto.objects.filter(sku=texto.upper()).values_list("id", flat=True))
+    if texto.isdigit() and int(texto) not in ids and Producto.objects.filter(pk=int(texto)).exists():
+        ids.append(int(texto))
+
+    # El término más largo suele ser el más selectivo: recorre el índice; los demás
+    # se verifican sólo sobre cada bloque de candidatos (no sobre todo el catálogo).
+    principal = max(lista, key=len)
+    otros = [t for t in lista if t != principal]
+    bloque = limite * 5
+
+    for peso in sorted(set(PESOS.values())):
+        qs = (_coincidencias(principal).filter(peso=peso)
+              .order_by("fragmento", "producto_id").values_list("producto_id", flat=True))
+        inicio = 0
+        while len(ids) < limite:
+            filas = list(qs[inicio:inicio + bloque])
+            candidatos = [pid for pid in dict.fromkeys(filas) if pid not in ids]
+            for t in otros:
+                if not candidatos:
+                    break
+                validos = set(_coincidencias(t).filter(producto_id__in=candidatos)
+                              .values_list("producto_id", flat=True))
+                candidatos = [pid for pid in candidatos if pid in validos]
+            ids.extend(candidatos)
+            if len(filas) < bloque:
+                break
+            inicio += bloque
+        if len(ids) >= limite:
+            break
+    return ids[:limite]
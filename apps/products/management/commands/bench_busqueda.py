@@ -0,0 +1,101 @@
+"""
+Benchmark de la búsqueda de productos.
+
+Crea N productos sintéticos dentro de una transacción, construye el índice, mide
+el autocompletar de search_products (sugerencias, 10 resultados) y la del listado
+(filtrada + paginada) para varios términos, y al final deshace todo (rollback).
+
+    python manage.py bench_busqueda --productos 100000
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.busqueda import filtrar, reindexar, sugerencias
+from apps.products.models import Categoria, Producto
+
+PALABRAS = ["CARAMELO", "CHOCOLATE", "MANI", "GOMITA", "ALFAJOR", "MENTA", "FRUTILLA", "LIMON",
+            "NARANJA", "COCO", "CHICLE", "TURRON", "MAZAPAN", "BOMBON", "CALUGA", "PALETA"]
+TERMINOS = ["car", "choco menta", "SKU-0001234", "fruti", "lim", "bombón", "42", "ala", "zzz"]
+OBJETIVO_MS = 10
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide la búsqueda indexada de productos con N productos sintéticos (se deshace al terminar)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=100000)
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument("--terminos", nargs="*", default=TERMINOS)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._ejecutar(opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos descartados (rollback).")
+
+    def _poblar(self, n):
+        rnd = random.Random(1234)
+        cats = [Categoria.objects.create(nombre=f"BENCH {p.title()} {i}")
+                for i, p in enumerate(PALABRAS[:8])]
+        lote = []
+        for i in range(n):
+            nombre = " ".join(rnd.sample(PALABRAS, 3)).title()
+            lote.append(Producto(
+                sku=f"SKU-{i:07d}", nombre=f"{nombre} {i}", categoria=rnd.choice(cats),
+                uom_compra="UN", uom_venta="UN", costo_estandar=Decimal("1"), precio_venta=Decimal("1"),
+            ))
+            if len(lote) >= 5000:
+                Producto.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            Producto.objects.bulk_create(lote)
+        return cats
+
+    def _medir(self, fn, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            fn()
+            tiempos.append((time.perf_counter() - t0) * 1000)
+        tiempos.sort()
+        return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+    def _ejecutar(self, opts):
+        n = opts["productos"]
+        t0 = time.perf_counter()
+        self._poblar(n)
+        self.stdout.write(f"{n} productos creados en {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        filas = reindexar()
+        self.stdout.write(f"Índice: {filas} fragmentos en {time.perf_counter() - t0:.1f}s")
+
+        base = Producto.objects.select_related("categoria")
+        self.stdout.write(f"{'término':<16}{'autocompletar p50/p95 ms':>28}{'listado p50/p95 ms':>24}{'hits':>8}")
+        peor = 0.0
+        for termino in opts["terminos"]:
+            auto = self._medir(
+                lambda: list(base.filter(id__in=sugerencias(termino, limite=10))),
+                opts["repeticiones"],
+            )
+            listado = self._medir(
+                lambda: list(filtrar(base, termino).order_by("sku", "id")[:10]),
+                opts["repeticiones"],
+            )
+            hits = len(sugerencias(termino, limite=10))
+            peor = max(peor, auto[0], listado[0])
+            self.stdout.write(f"{termino:<16}{auto[0]:>14.2f}/{auto[1]:<13.2f}{listado[0]:>11.2f}/{listado[1]:<12.2f}{hits:>8}")
+
+        estilo = self.style.SUCCESS if peor < OBJETIVO_MS else self.style.WARNING
+        self.stdout.write(estilo(f"Peor mediana: {peor:.2f} ms (objetivo < {OBJETIVO_MS} ms)"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.models import Categoria, Producto
+from apps.suppliers.models import Proveedor
+from apps.users.models import Usuario
+from lilis_erp.texto import rellenar_normalizados
+
+MODELOS = (Categoria, Producto, Proveedor, Usuario)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las columnas normalizadas (*_norm, sin tildes y en mayúsculas) de "
+        "categorías, productos, proveedores y usuarios. Útil tras cargas masivas "
+        "(bulk_create / update) que no pasan por save()."
+    )
+
+    def handle(self, *args, **opts):
+        for modelo in MODELOS:
+            cambiadas = rellenar_normalizados(modelo, modelo.CAMPOS_NORMALIZADOS)
+            self.stdout.write(f"{modelo._meta.verbose_name_plural}: {cambiadas} filas actualizadas")
+        self.stdout.write(self.style.SUCCESS("Columnas normalizadas al día."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.busqueda import reindexar
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de productos (ProductoBusqueda)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Sólo estos productos (por defecto, todos).")
+
+    def handle(self, *args, **opts):
+        creadas = reindexar(opts["ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda reconstruido: {creadas} fragmentos."))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_producto_uom_compra_alter_producto_uom_venta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_total',
+            field=models.DecimalField(decimal_places=3, default=0, editable=False, max_digits=14, verbose_name='Stock total'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['stock_total'], name='products_pr_stock_t_e6bd25_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_indice(apps, schema_editor):
+    from apps.products.busqueda import fragmentos
+
+    Producto = apps.get_model("products", "Producto")
+    ProductoBusqueda = apps.get_model("products", "ProductoBusqueda")
+
+    filas = []
+    for pk, sku, nombre, categoria in Producto.objects.values_list("id", "sku", "nombre", "categoria__nombre").iterator():
+        filas.extend(ProductoBusqueda(producto_id=pk, fragmento=f, peso=p)
+                     for f, p in fragmentos(sku, nombre, categoria).items())
+    ProductoBusqueda.objects.bulk_create(filas, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_producto_stock_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fragmento', models.CharField(max_length=64, verbose_name='Fragmento')),
+                ('peso', models.PositiveSmallIntegerField(default=0, verbose_name='Peso')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='busqueda', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de búsqueda',
+                'verbose_name_plural': 'Índice de búsqueda de productos',
+                'indexes': [models.Index(fields=['fragmento', 'producto'], name='products_pr_fragmen_d39a9e_idx'), models.Index(fields=['peso', 'fragmento', 'producto'], name='products_pr_peso_3a5839_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+from lilis_erp.texto import rellenar_normalizados
+
+
+def rellenar(apps, schema_editor):
+    rellenar_normalizados(apps.get_model("products", "Categoria"), {"nombre": "nombre_norm"})
+    rellenar_normalizados(apps.get_model("products", "Producto"), {"nombre": "nombre_norm"})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_productobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='nombre_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Nombre normalizado'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=191, verbose_name='Nombre normalizado'),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['nombre_norm'], name='products_ca_nombre__1ae696_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre_norm'], name='products_pr_nombre__0c987e_idx'),
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_columnas_normalizadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_fragmentado',
+            field=models.BooleanField(default=False, verbose_name='Stock fragmentado'),
+        ),
+    ]
@@ -2,24 +2,35 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 
+from lilis_erp.texto import NormalizaTextoMixin
+
 valida_sku = RegexValidator(r'^[A-Z0-9\-_.]{3,50}$', "SKU inválido (usa A-Z, 0-9, -, _, .)")
 valida_ean = RegexValidator(r'^\d{8}(\d{4,6})?$', "EAN/UPC debe ser 8/12/13/14 dígitos")
 
-class Categoria(models.Model):
+class Categoria(NormalizaTextoMixin, models.Model):
+    CAMPOS_NORMALIZADOS = {"nombre": "nombre_norm"}
+
     nombre = models.CharField("Nombre", max_length=100, unique=True)
+    # Copia sin tildes y en mayúsculas para búsquedas por prefijo (ver lilis_erp/texto.py)
+    nombre_norm = models.CharField("Nombre normalizado", max_length=100, blank=True, default="", editable=False)
     descripcion = models.TextField("Descripción", blank=True)
 
     class Meta:
         ordering = ["nombre"]
         verbose_name = "Categoría"
         verbose_name_plural = "Categorías"
-        indexes = [models.Index(fields=["nombre"])]
+        indexes = [
+            models.Index(fields=["nombre"]),
+            models.Index(fields=["nombre_norm"]),
+        ]
 
     def __str__(self):
         return self.nombre
 
 
-class Producto(models.Model):
+class Producto(NormalizaTextoMixin, models.Model):
+    CAMPOS_NORMALIZADOS = {"nombre": "nombre_norm"}
+
     UOMS = (
         ("UN", "Unidad"),
         ("CAJA", "Caja"),
@@ -33,6 +44,7 @@ class Producto(models.Model):
     sku = models.CharField("SKU", max_length=50, unique=True, validators=[valida_sku])
     ean_upc = models.CharField("EAN/UPC", max_length=14, blank=True, null=True, unique=True, validators=[valida_ean])
     nombre = models.CharField("Nombre", max_length=191)
+    nombre_norm = models.CharField("Nombre normalizado", max_length=191, blank=True, default="", editable=False)
     descripcion = models.TextField("Descripción", blank=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, related_name="productos", verbose_name="Categoría")
     marca = models.CharField("Marca", max_length=100, blank=True)
@@ -56,10 +68,16 @@ class Producto(models.Model):
                                        validators=[MinValueValidator(0)])
     punto_reorden = models.DecimalField("Punto de reorden", max_digits=12, decimal_places=3, null=True, blank=True,
                                         validators=[MinValueValidator(0)])
+    # Total desnormalizado (suma de Stock en todas las bodegas). Lo mantiene
+    # MovimientoInventario.aplicar_a_stock y se reconstruye con `manage.py resumen_stock`.
+    stock_total = models.DecimalField("Stock total", max_digits=14, decimal_places=3, default=0, editable=False)
 
     perecible = models.BooleanField("Perecible", default=False)
     control_por_lote = models.BooleanField("Control por lote", default=False)
     control_por_serie = models.BooleanField("Control por serie", default=False)
+    # Alta rotación (promociones): el stock se reparte en sub-filas para no serializar
+    # las salidas en un solo bloqueo (ver Stock.fragmento y `manage.py compactar_stock`)
+    stock_fragmentado = models.BooleanField("Stock fragmentado", default=False)
 
     url_imagen = models.URLField("URL Imagen", blank=True)
     url_ficha_tecnica = models.URLField("URL Ficha técnica", blank=True)
@@ -75,8 +93,10 @@ class Producto(models.Model):
         indexes = [
             models.Index(fields=["sku"]),
             models.Index(fields=["nombre"]),
+            models.Index(fields=["nombre_norm"]),
             models.Index(fields=["categoria"]),
             models.Index(fields=["activo"]),
+            models.Index(fields=["stock_total"]),
         ]
         constraints = [
             models.CheckConstraint(
@@ -118,6 +138,12 @@ class Producto(models.Model):
             self.nombre = self.nombre.strip()
         # Ejecuta todas las validaciones del modelo, incluido el método clean().
         self.full_clean()
+        # stock_total lo escriben sólo los movimientos (UPDATE ... + delta): un save() completo
+        # de una instancia leída antes pisaría los cambios de stock concurrentes con un total viejo.
+        if not self._state.adding and not args and kwargs.get("update_fields") is None \
+                and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != "stock_total"]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -125,9 +151,30 @@ class Producto(models.Model):
 
     @property
     def alerta_bajo_stock(self):
-        from transactional.models import Stock
-        total = (Stock.objects
-                 .filter(producto=self)
-                 .aggregate(models.Sum("cantidad"))["cantidad__sum"] or 0)
+        # Sobre el total desnormalizado: sin consultas. Para listas, alertas.filtrar()
         umbral = self.punto_reorden or self.stock_minimo or 0
-        return total <= umbral
+        return self.stock_total <= umbral
+
+
+class ProductoBusqueda(models.Model):
+    """
+    Índice de búsqueda de productos: cada sufijo normalizado de cada palabra del SKU,
+    nombre y categoría. Buscar "ARAM" es un rango sobre el índice (fragmentos que empiezan con 'ARAM')
+    que encuentra "CARAMELO" sin recorrer la tabla de productos.
+    Lo mantienen las señales de Producto/Categoría (ver busqueda.py).
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="busqueda", verbose_name="Producto")
+    fragmento = models.CharField("Fragmento", max_length=64)
+    # Menor = más relevante (ver busqueda.PESOS)
+    peso = models.PositiveSmallIntegerField("Peso", default=0)
+
+    class Meta:
+        verbose_name = "Fragmento de búsqueda"
+        verbose_name_plural = "Índice de búsqueda de productos"
+        indexes = [
+            models.Index(fields=["fragmento", "producto"]),      # filtrar (listado)
+            models.Index(fields=["peso", "fragmento", "producto"]),  # sugerencias (autocompletar)
+        ]
+
+    def __str__(self):
+        return f"{self.fragmento} → {self.producto_id}"
@@ -0,0 +1,46 @@
+"""
+Mantiene el índice de búsqueda (ProductoBusqueda) y la caché de bajo stock al día.
+El borrado de un producto arrastra sus fragmentos por CASCADE.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Categoria, Producto
+
+CAMPOS_INDEXADOS = {"sku", "nombre", "categoria", "categoria_id"}
+# Campos que cambian la lista de bajo stock (alertas.py); stock_total lo invalida StockResumen
+CAMPOS_ALERTA = {"sku", "nombre", "categoria", "categoria_id", "stock_minimo", "punto_reorden", "activo"}
+
+
+@receiver(post_save, sender=Producto, dispatch_uid="productos_busqueda_producto")
+def reindexar_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not (set(update_fields) & CAMPOS_INDEXADOS):
+        return
+    from .busqueda import reindexar
+    pk = instance.pk
+    transaction.on_commit(lambda: reindexar([pk]))
+
+
+@receiver(post_save, sender=Categoria, dispatch_uid="productos_busqueda_categoria")
+def reindexar_categoria(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    from .busqueda import reindexar
+    cat_id = instance.pk
+    transaction.on_commit(
+        lambda: reindexar(Producto.objects.filter(categoria_id=cat_id).values_list("id", flat=True))
+    )
+
+
+@receiver(post_save, sender=Producto, dispatch_uid="productos_alertas_producto")
+@receiver(post_delete, sender=Producto, dispatch_uid="productos_alertas_producto_borrado")
+def invalidar_alertas(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not (set(update_fields) & CAMPOS_ALERTA):
+        return
+    from .alertas import invalidar
+    invalidar()
@@ -1,14 +1,11 @@
-from datetime import datetime
 import json
 import traceback
 from decimal import Decimal
 
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.db import transaction, models, IntegrityError
-from django.db.models import Q, CharField, DecimalField, Value
-from django.db.models.functions import Cast, Coalesce
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.forms.models import model_to_dict
@@ -16,15 +13,13 @@ from django.core.exceptions import FieldError
 from django.apps import apps  # <- para cargar Bodega de forma segura
 from django.db.models.deletion import ProtectedError, RestrictedError  # 👈 NUEVO
 
+from lilis_erp.idempotencia import idempotente
 from lilis_erp.roles import require_roles
-
-# Excel opcional
-try:
-    from openpyxl import Workbook
-except ImportError:
-    Workbook = None
+from lilis_erp.paginacion import paginar
+from lilis_erp.exportar import Columna, FORMATOS, respuesta_exportacion
 
 # Modelos locales
+from . import alertas, busqueda
 from .models import Producto as Product
 from .models import Categoria
 
@@ -39,8 +34,14 @@ ALLOWED_SORT_FIELDS = {
     "stock", "-stock",
 }
 
-# Campo decimal único para todas las anotaciones de stock
-DEC = DecimalField(max_digits=14, decimal_places=3)
+
+COLUMNAS_EXPORT = [
+    Columna("ID", "id"),
+    Columna("SKU", "sku", lambda v: v or ""),
+    Columna("Nombre", "nombre", lambda v: v or ""),
+    Columna("Categoría", "categoria__nombre", lambda v: v or ""),
+    Columna("Stock", "stock_total", lambda v: int(v or 0)),
+]
 
 
 def _display_categoria(obj):
@@ -58,42 +59,26 @@ def _qs_to_dicts(qs):
             "nombre": p.nombre or "",
             "categoria": _display_categoria(p),
             "stock": int(st or 0),
+            "bajo_stock": p.alerta_bajo_stock,
         })
     return out
 
 
 def _base_queryset():
     """
-    - id_text para buscar por ID (icontains)
-    - stock_total por JOIN + SUM sobre related_name='stocks'
-    - Tipado como Decimal para evitar 'mixed types'
+    - stock_total es una columna indexada que mantiene aplicar_a_stock
+      (sin JOIN + SUM sobre Stock en cada listado)
     """
-    return (
-        Product.objects.select_related("categoria")
-        .annotate(
-            id_text=Cast("id", output_field=CharField()),
-            stock_total=Coalesce(
-                models.Sum("stocks__cantidad", output_field=DEC),
-                Value(Decimal("0"), output_field=DEC),
-                output_field=DEC,
-            ),
-        )
-    )
+    return Product.objects.select_related("categoria")
 
 
 def _build_search_q(q: str):
-    q = (q or "").strip()
-    if not q:
-        return Q()
-    expr = (
-        Q(sku__icontains=q) |
-        Q(nombre__icontains=q) |
-        Q(categoria__nombre__icontains=q) |
-        Q(id_text__icontains=q)
-    )
-    if q.isdigit():
-        expr |= Q(id=int(q))
-    return expr
+    """
+    Condición de búsqueda sobre el índice ProductoBusqueda (ver busqueda.py):
+    cada término debe aparecer como inicio de un sufijo de alguna palabra del
+    SKU, nombre o categoría; un número exacto también busca por ID.
+    """
+    return busqueda.condicion(q) or Q()
 
 
 def _apply_filters(qs, request):
@@ -101,6 +86,7 @@ def _apply_filters(qs, request):
     Filtros ligeros SIN romper nada de lo tuyo.
     - categoría: ?categoria=<id>  (o ?cat=<id>)
     - estado/activo: ?estado=activos | inactivos   (si el modelo tiene 'activo')
+    - bajo stock: ?alerta=bajo  (stock total <= punto de reorden / stock mínimo, ver alertas.py)
     """
     cat = (request.GET.get("categoria") or request.GET.get("cat") or "").strip()
     if cat.isdigit():
@@ -110,10 +96,14 @@ def _apply_filters(qs, request):
     if estado in {"activos", "inactivos"} and hasattr(Product, "activo"):
         qs = qs.filter(activo=(estado == "activos"))
 
+    if (request.GET.get("alerta") or "").strip().lower() == "bajo":
+        qs = alertas.filtrar(qs)
+
     return qs
 
 
-def _apply_sort(qs, sort_by: str):
+def _sort_field(sort_by: str):
+    """Traduce el ?sort= del listado a (columna real, descendente)."""
     sort_by = (sort_by or "").strip()
     if sort_by not in ALLOWED_SORT_FIELDS:
         sort_by = "sku"
@@ -125,6 +115,11 @@ def _apply_sort(qs, sort_by: str):
         "categoria": "categoria__nombre",
         "stock": "stock_total",
     }.get(key, key)
+    return sort_field, reverse
+
+
+def _apply_sort(qs, sort_by: str):
+    sort_field, reverse = _sort_field(sort_by)
 
     try:
         ordered = qs.order_by(f"-{sort_field}" if reverse else sort_field, "id")
@@ -184,31 +179,19 @@ def product_list_view(request):
         traceback.print_exc()
         qs = Product.objects.none()
 
-    # Exportación a XLSX
-    if export == "xlsx":
-        if Workbook is None:
-            return HttpResponse("Falta dependencia: pip install openpyxl", status=500)
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Productos"
-        ws.append(["ID", "SKU", "Nombre", "Categoría", "Stock"])
-        for p in _qs_to_dicts(qs):
-            ws.append([p["id"], p["sku"], p["nombre"], p["categoria"], p["stock"]])
-        resp = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = f'attachment; filename="productos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        wb.save(resp)
-        return resp
+    # Exportación a XLSX / CSV (streaming)
+    if export in FORMATOS:
+        return respuesta_exportacion(qs, COLUMNAS_EXPORT, "productos", formato=export, hoja="Productos")
 
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    sort_field, reverse = _sort_field(sort_by)
+    page_obj = paginar(request, qs, f"-{sort_field}" if reverse else sort_field)
 
     ctx = {
         "productos": _qs_to_dicts(page_obj.object_list),
         "page_obj": page_obj,
         "query": query,
         "sort_by": sort_by,
+        "alerta": (request.GET.get("alerta") or "").strip().lower(),
         "categorias": Categoria.objects.all(),
         "uom_choices": getattr(Product, "UOMS", []),
         "bodegas": _load_bodegas_safe(),
@@ -229,10 +212,13 @@ def product_list_view(request):
 def search_products(request):
     q = (request.GET.get("q") or "").strip()
     try:
-        qs = _base_queryset()
         if q:
-            qs = qs.filter(_build_search_q(q))
-        qs = _apply_sort(qs, "id")[:10]
+            # Más relevantes primero (SKU/ID exacto, luego inicio de palabra, ...)
+            ids = busqueda.sugerencias(q, limite=10)
+            por_id = {p.id: p for p in _base_queryset().filter(id__in=ids)}
+            qs = [por_id[i] for i in ids if i in por_id]
+        else:
+            qs = _apply_sort(_base_queryset(), "id")[:10]
         data = _qs_to_dicts(qs)
     except Exception as e:
         print("[productos.search] ERROR:", e)
@@ -241,10 +227,30 @@ def search_products(request):
     return JsonResponse({"results": data})
 
 
+# ---------------- ALERTAS DE BAJO STOCK ----------------
+@login_required
+@require_roles("ADMIN", "INVENTARIO", "PRODUCCION", "VENTAS", "COMPRAS")
+def productos_bajo_stock(request):
+    """
+    GET /productos/bajo-stock/ -> productos activos con stock total <= punto de reorden
+    (o stock mínimo), más urgentes primero. Cacheado; se invalida con cada cambio de stock.
+    """
+    datos = alertas.resumen()
+    return JsonResponse({
+        "ok": True,
+        "total": datos["total"],
+        "productos": [
+            {**p, "stock": str(p["stock"]), "umbral": str(p["umbral"]), "faltante": str(p["faltante"])}
+            for p in datos["productos"]
+        ],
+    })
+
+
 # ---------------- CRUD ----------------
 
 @login_required
 @require_roles("ADMIN", "INVENTARIO", "PRODUCCION", "VENTAS")
+@idempotente
 @transaction.atomic
 def crear_producto(request):
     if request.method != "POST":
@@ -374,11 +380,9 @@ def editar_producto(request, prod_id: int):
                     # no corta el flujo si viene sucio
                     pass
 
+        # Sólo las columnas que llegaron: nunca se reescribe stock_total con el valor leído
         if update_fields:
             producto.save(update_fields=update_fields)
-        else:
-            # si no vino ningún campo actualizable, igual asegura persistencia
-            producto.save()
 
         return JsonResponse({"ok": True, "message": "Producto actualizado."})
 
@@ -0,0 +1,98 @@
+"""
+Benchmark del motor de sugerencias de compra (reorden.py).
+
+    python manage.py bench_reorden --productos 50000 --proveedores 200
+
+Crea productos bajo su punto de reorden con 1 a 3 proveedores cada uno, y compara el
+cálculo vectorizado con la alternativa de evaluar producto por producto con el ORM.
+Todo corre dentro de una transacción que se deshace al final.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.models import Categoria, Producto
+from apps.suppliers import reorden
+from apps.suppliers.models import Proveedor, ProveedorProducto
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide las sugerencias de compra con miles de productos (datos sintéticos, con rollback)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=50000)
+        parser.add_argument("--proveedores", type=int, default=200)
+        parser.add_argument("--muestra", type=int, default=2000,
+                            help="Productos evaluados con el método uno a uno (se extrapola).")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._ejecutar(opts["productos"], opts["proveedores"], opts["muestra"])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos descartados (rollback).")
+
+    def _ejecutar(self, n, n_proveedores, muestra):
+        rnd = random.Random(1)
+        categoria = Categoria.objects.create(nombre="BENCH REORDEN")
+        proveedores = Proveedor.objects.bulk_create([
+            Proveedor(rut_nif=f"9{i:07d}-1", rut_normalizado=f"9{i:07d}1", razon_social=f"Bench {i:04d}",
+                      email=f"bench{i}@example.com", condiciones_pago="30 días")
+            for i in range(n_proveedores)
+        ])
+        Producto.objects.bulk_create([
+            Producto(sku=f"BENCH-R{i:06d}", nombre=f"Bench reorden {i}", categoria=categoria,
+                     costo_estandar=Decimal("1"), precio_venta=Decimal("2"),
+                     stock_total=Decimal(rnd.randint(0, 60)), stock_minimo=Decimal("10"),
+                     punto_reorden=Decimal("40"), stock_maximo=Decimal("100"))
+            for i in range(n)
+        ], batch_size=2000)
+        ids = list(Producto.objects.filter(categoria=categoria).values_list("id", flat=True))
+        ofertas = []
+        for pid in ids:
+            for j, prov in enumerate(rnd.sample(proveedores, rnd.randint(1, 3))):
+                ofertas.append(ProveedorProducto(
+                    proveedor=prov, producto_id=pid, costo=Decimal(rnd.randint(500, 900)) / 100,
+                    descuento_porcentaje=Decimal(rnd.choice([0, 5, 10])), minimo_lote=Decimal(rnd.choice([1, 6, 12, 24])),
+                    lead_time_dias=rnd.randint(1, 20), preferente=(j == 0 and rnd.random() < 0.3),
+                ))
+        ProveedorProducto.objects.bulk_create(ofertas, batch_size=2000)
+        self.stdout.write(f"{n} productos, {len(ofertas)} condiciones de proveedor")
+
+        t0 = time.perf_counter()
+        resultado = reorden.calcular(ids)
+        t_vector = time.perf_counter() - t0
+        lineas = sum(len(g["lineas"]) for g in resultado["proveedores"])
+
+        t0 = time.perf_counter()
+        for producto in Producto.objects.filter(pk__in=ids[:muestra]):
+            self._uno_a_uno(producto)
+        t_orm = (time.perf_counter() - t0) * len(ids) / max(1, min(muestra, len(ids)))
+
+        self.stdout.write(
+            f"  vectorizado: {t_vector:6.2f} s ({lineas} líneas, {len(resultado['proveedores'])} proveedores) | "
+            f"uno a uno (extrapolado): {t_orm:6.2f} s"
+        )
+
+    def _uno_a_uno(self, producto):
+        # Referencia: una consulta de proveedores por producto y la regla en Python
+        umbral = producto.punto_reorden or producto.stock_minimo or 0
+        if producto.stock_total > umbral:
+            return None
+        ofertas = sorted(
+            producto.proveedores.filter(proveedor__activo=True),
+            key=lambda o: (not o.preferente, o.costo * (1 - (o.descuento_porcentaje or Decimal("0")) / 100), o.lead_time_dias),
+        )
+        if not ofertas:
+            return None
+        falta = (producto.stock_maximo or umbral) - producto.stock_total
+        lotes = -(-falta // ofertas[0].minimo_lote)
+        return ofertas[0].proveedor_id, lotes * ofertas[0].minimo_lote
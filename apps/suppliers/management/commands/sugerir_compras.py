@@ -0,0 +1,50 @@
+import csv
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.suppliers import reorden
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula las cantidades a reponer de todos los productos (hasta el stock máximo, en "
+        "múltiplos del lote mínimo) y las agrupa por proveedor preferente o de menor costo efectivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", help="Ruta del archivo CSV con una línea por producto a pedir.")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        try:
+            resultado = reorden.calcular()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        segundos = time.perf_counter() - t0
+
+        for grupo in resultado["proveedores"]:
+            self.stdout.write(f"{grupo['proveedor']} ({grupo['rut']}): "
+                              f"{len(grupo['lineas'])} producto(s), total {grupo['total']:.2f}")
+        if resultado["sin_proveedor"]:
+            self.stdout.write(self.style.WARNING(
+                f"{len(resultado['sin_proveedor'])} producto(s) a reponer sin proveedor activo."
+            ))
+
+        if opts["csv"]:
+            campos = ["proveedor", "rut", "sku", "nombre", "stock", "objetivo", "cantidad", "minimo_lote",
+                      "costo_unitario", "subtotal", "lead_time_dias"]
+            with open(opts["csv"], "w", encoding="utf-8", newline="") as fh:
+                escritor = csv.DictWriter(fh, fieldnames=campos, extrasaction="ignore")
+                escritor.writeheader()
+                for grupo in resultado["proveedores"]:
+                    escritor.writerows({"proveedor": grupo["proveedor"], "rut": grupo["rut"], **ln}
+                                       for ln in grupo["lineas"])
+                escritor.writerows({"proveedor": "", "rut": "", **ln} for ln in resultado["sin_proveedor"])
+
+        lineas = sum(len(g["lineas"]) for g in resultado["proveedores"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['productos']} producto(s) evaluados, {lineas} línea(s) sugeridas en "
+            f"{len(resultado['proveedores'])} proveedor(es) ({segundos:.2f} s)."
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+from lilis_erp.texto import rellenar_normalizados
+
+
+def rellenar(apps, schema_editor):
+    rellenar_normalizados(apps.get_model("suppliers", "Proveedor"), {"razon_social": "razon_social_norm", "nombre_fantasia": "nombre_fantasia_norm"})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proveedor',
+            name='nombre_fantasia_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=191, verbose_name='Nombre de fantasía normalizado'),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='razon_social_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=191, verbose_name='Razón social normalizada'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['razon_social_norm'], name='suppliers_p_razon_s_fac7ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['nombre_fantasia_norm'], name='suppliers_p_nombre__aecc54_idx'),
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+def normalizar(rut):
+    return (rut or "").replace(".", "").replace("-", "").strip().upper()
+
+
+def rellenar_rut(apps, schema_editor):
+    """
+    Rellena rut_normalizado. Si dos proveedores tienen el mismo RUT escrito distinto la
+    migración se detiene y lista los RUT repetidos: hay que fusionarlos o corregirlos a mano
+    antes de volver a migrar (no se elige uno por su cuenta).
+    """
+    Proveedor = apps.get_model("suppliers", "Proveedor")
+    por_rut = {}
+    pendientes = []
+    for prov in Proveedor.objects.order_by("id").only("id", "rut_nif", "rut_normalizado"):
+        rut = normalizar(prov.rut_nif) or None
+        if rut:
+            por_rut.setdefault(rut, []).append(prov)
+        prov.rut_normalizado = rut
+        pendientes.append(prov)
+
+    repetidos = {rut: provs for rut, provs in por_rut.items() if len(provs) > 1}
+    if repetidos:
+        detalle = "; ".join(
+            f"{rut}: " + ", ".join(f"id={p.pk} '{p.rut_nif}'" for p in provs)
+            for rut, provs in sorted(repetidos.items())
+        )
+        raise RuntimeError(f"Hay proveedores con el mismo RUT escrito de distinta forma ({detalle}). "
+                           "Fusiónalos o corrige su RUT y vuelve a ejecutar migrate.")
+    Proveedor.objects.bulk_update(pendientes, ["rut_normalizado"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0002_columnas_normalizadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proveedor',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, unique=True, verbose_name='RUT normalizado'),
+        ),
+        migrations.RunPython(rellenar_rut, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,43 @@
+import re
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.db.models import Q
 from apps.products.models import Producto
+from lilis_erp.texto import NormalizaTextoMixin
 
 valida_rut = RegexValidator(r'^[0-9Kk\.\-]{7,20}$', "RUT/NIF inválido")
 valida_fono = RegexValidator(r'^[0-9+()\-\s]{6,30}$', 'Teléfono inválido')
 
-class Proveedor(models.Model):
+
+def normalizar_rut(rut: str) -> str:
+    """
+    Elimina puntos y guión, deja sólo dígitos + K en mayúscula.
+    """
+    return (rut or "").replace(".", "").replace("-", "").strip().upper()
+
+
+def parece_rut(texto: str) -> bool:
+    """'12.345.678-9', '123456789', '7654321-k' -> True (cuerpo de 7-8 dígitos + DV)."""
+    texto = (texto or "").strip()
+    return bool(re.fullmatch(r"[0-9Kk.\-]+", texto)) and bool(re.fullmatch(r"\d{7,8}[0-9K]", normalizar_rut(texto)))
+
+
+class Proveedor(NormalizaTextoMixin, models.Model):
     ESTADO_ACTIVO = "ACTIVO"
     ESTADO_BLOQUEADO = "BLOQUEADO"
     ESTADOS = ((ESTADO_ACTIVO, "Activo"), (ESTADO_BLOQUEADO, "Bloqueado"))
+    CAMPOS_NORMALIZADOS = {"razon_social": "razon_social_norm", "nombre_fantasia": "nombre_fantasia_norm"}
 
     rut_nif = models.CharField("RUT/NIF", max_length=20, unique=True, validators=[valida_rut])
+    # Forma canónica (sin puntos ni guión, K mayúscula): "12.345.678-9" y "123456789" son el mismo
+    rut_normalizado = models.CharField("RUT normalizado", max_length=20, unique=True, null=True, blank=True, editable=False)
     razon_social = models.CharField("Razón social", max_length=191)
     nombre_fantasia = models.CharField("Nombre de fantasía", max_length=191, blank=True)
+    # Copias sin tildes y en mayúsculas para búsquedas por prefijo (ver lilis_erp/texto.py)
+    razon_social_norm = models.CharField("Razón social normalizada", max_length=191, blank=True, default="", editable=False)
+    nombre_fantasia_norm = models.CharField("Nombre de fantasía normalizado", max_length=191, blank=True, default="", editable=False)
     email = models.EmailField("Correo electrónico")
     telefono = models.CharField("Teléfono", max_length=30, blank=True, validators=[valida_fono])
     sitio_web = models.URLField("Sitio web", blank=True)
@@ -43,6 +67,8 @@ class Proveedor(models.Model):
         indexes = [
             models.Index(fields=["rut_nif"]),
             models.Index(fields=["razon_social"]),
+            models.Index(fields=["razon_social_norm"]),
+            models.Index(fields=["nombre_fantasia_norm"]),
             models.Index(fields=["estado"]),
             models.Index(fields=["activo"]),
         ]
@@ -50,6 +76,27 @@ class Proveedor(models.Model):
     def __str__(self):
         return f"{self.razon_social} ({self.rut_nif})"
 
+    def clean(self):
+        super().clean()
+        # rut_normalizado no está en los formularios, así que su unicidad no la revisa
+        # validate_unique: sin esto un "12345678-9" repetido como "12.345.678-9" llega a la BD.
+        rut = normalizar_rut(self.rut_nif)
+        if rut and Proveedor.objects.filter(rut_normalizado=rut).exclude(pk=self.pk).exists():
+            raise ValidationError({"rut_nif": "Ya existe otro proveedor con este RUT/NIF."})
+
+    def save(self, *args, **kwargs):
+        self.rut_normalizado = normalizar_rut(self.rut_nif) or None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "rut_nif" in update_fields:
+            kwargs["update_fields"] = list(dict.fromkeys([*update_fields, "rut_normalizado"]))
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def por_rut(cls, rut):
+        """Proveedor con ese RUT, escrito como sea (una búsqueda por índice único) o None."""
+        rut = normalizar_rut(rut)
+        return cls.objects.filter(rut_normalizado=rut).first() if rut else None
+
 
 class ProveedorProducto(models.Model):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name="productos", verbose_name="Proveedor")
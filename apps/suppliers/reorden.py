@@ -0,0 +1,175 @@
+"""
+Sugerencias de compra (reposición) para todos los productos a la vez.
+
+Se cargan las columnas necesarias en arreglos NumPy (una consulta para los productos
+activos y otra para las condiciones de ProveedorProducto) y las reglas se aplican
+sobre los arreglos completos, sin un ciclo por producto:
+
+1. Umbral = punto_reorden (si es > 0) o stock_minimo, igual que apps/products/alertas.py.
+   Se repone si stock_total <= umbral.
+2. Objetivo = stock_maximo (o el umbral si no tiene máximo); se pide objetivo - stock.
+3. Proveedor: el preferente; si no hay, el de menor costo efectivo
+   (costo × (1 - descuento)) y, a igual costo, el de menor lead time. Sólo cuentan
+   proveedores activos y no bloqueados.
+4. La cantidad se redondea hacia arriba al múltiplo de minimo_lote del proveedor elegido.
+
+Los decimales se leen como double (CAST en la consulta): construir un Decimal por
+valor era la mayor parte del tiempo. Las cantidades vuelven a Decimal sólo en las
+líneas sugeridas.
+
+El resultado se agrupa por proveedor; los productos a reponer sin proveedor se
+informan aparte. `manage.py sugerir_compras` y la vista sugerencias_compra lo usan.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from apps.products.models import Producto
+
+from .models import Proveedor, ProveedorProducto
+
+# NumPy opcional: sólo lo necesita este motor
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def requiere_numpy():
+    if np is None:
+        raise ImproperlyConfigured("Falta dependencia: instala numpy (pip install numpy)")
+
+
+def _double(campo):
+    return Cast(campo, FloatField())
+
+
+def _columna(valores, vacio=None):
+    """Columna de float/None -> float64; los None quedan en NaN o en `vacio`."""
+    a = np.array(valores, dtype=np.float64)
+    return a if vacio is None else np.where(np.isnan(a), vacio, a)
+
+
+def _decimal(x, decimales=3):
+    return Decimal(f"{x:.{decimales}f}")
+
+
+def _productos(producto_ids):
+    qs = Producto.objects.filter(activo=True)
+    if producto_ids is not None:
+        qs = qs.filter(pk__in=producto_ids)
+    filas = list(
+        qs.annotate(f_stock=_double("stock_total"), f_maximo=_double("stock_maximo"),
+                    f_reorden=_double("punto_reorden"), f_minimo=_double("stock_minimo"))
+        .order_by("id")
+        .values_list("id", "sku", "nombre", "f_stock", "f_maximo", "f_reorden", "f_minimo")
+    )
+    if not filas:
+        return None
+    ids, sku, nombre, stock, maximo, reorden, minimo = zip(*filas)
+    return (np.array(ids, dtype=np.int64), np.array(sku, dtype=object), np.array(nombre, dtype=object),
+            _columna(stock, 0), _columna(maximo), _columna(reorden, 0), _columna(minimo, 0))
+
+
+def ofertas(producto_ids=None):
+    """
+    Condición elegida por producto (regla 3): arreglos (producto_ids ordenados, proveedor,
+    costo efectivo, lote, lead time). También la usa el pronóstico de demanda.
+    """
+    requiere_numpy()
+    qs = (ProveedorProducto.objects
+          .filter(producto__activo=True, proveedor__activo=True)
+          .exclude(proveedor__estado=Proveedor.ESTADO_BLOQUEADO))
+    if producto_ids is not None:
+        qs = qs.filter(producto_id__in=producto_ids)
+    filas = list(
+        qs.annotate(f_costo=_double("costo"), f_descuento=_double("descuento_porcentaje"),
+                    f_lote=_double("minimo_lote"))
+        .values_list("producto_id", "proveedor_id", "f_costo", "f_descuento", "f_lote", "lead_time_dias",
+                     "preferente")
+    )
+    if not filas:
+        vacio = np.array([], dtype=np.int64)
+        return vacio, vacio, np.array([]), np.array([]), vacio
+    producto, proveedor, costo, descuento, lote, lead, preferente = zip(*filas)
+    producto = np.array(producto, dtype=np.int64)
+    proveedor = np.array(proveedor, dtype=np.int64)
+    efectivo = _columna(costo, 0) * (1 - _columna(descuento, 0) / 100)
+    lote = _columna(lote, 1)
+    lead = np.array(lead, dtype=np.int64)
+    preferente = np.array(preferente, dtype=bool)
+
+    # Por producto: preferente primero, luego menor costo efectivo, menor lead time, menor id de proveedor
+    orden = np.lexsort((proveedor, lead, efectivo, ~preferente, producto))
+    _, primeras = np.unique(producto[orden], return_index=True)
+    elegidas = orden[primeras]
+    return producto[elegidas], proveedor[elegidas], efectivo[elegidas], lote[elegidas], lead[elegidas]
+
+
+def calcular(producto_ids=None):
+    """
+    {"productos": evaluados, "proveedores": [{proveedor_id, proveedor, rut, lineas, total}],
+     "sin_proveedor": [{producto_id, sku, nombre, stock, objetivo, cantidad}]}
+    """
+    requiere_numpy()
+    datos = _productos(producto_ids)
+    if datos is None:
+        return {"productos": 0, "proveedores": [], "sin_proveedor": []}
+    ids, sku, nombre, stock, maximo, reorden, minimo = datos
+    evaluados = len(ids)
+
+    umbral = np.where(reorden > 0, reorden, minimo)
+    objetivo = np.where(np.isnan(maximo), umbral, maximo)
+    falta = objetivo - stock
+    reponer = (stock <= umbral) & (falta > 0)
+    ids, sku, nombre = ids[reponer], sku[reponer], nombre[reponer]
+    stock, objetivo, falta = stock[reponer], objetivo[reponer], falta[reponer]
+
+    o_producto, o_proveedor, o_costo, o_lote, o_lead = ofertas()
+    pos = np.zeros(len(ids), dtype=np.int64)
+    con_oferta = np.zeros(len(ids), dtype=bool)
+    if len(o_producto):
+        pos = np.minimum(np.searchsorted(o_producto, ids), len(o_producto) - 1)
+        con_oferta = o_producto[pos] == ids
+
+    sin = ~con_oferta
+    sin_proveedor = [
+        {"producto_id": p, "sku": s, "nombre": n, "stock": _decimal(st), "objetivo": _decimal(o),
+         "cantidad": _decimal(f)}
+        for p, s, n, st, o, f in zip(ids[sin].tolist(), sku[sin], nombre[sin], stock[sin].tolist(),
+                                     objetivo[sin].tolist(), falta[sin].tolist())
+    ]
+
+    i = pos[con_oferta]
+    proveedor, costo, lote, lead = o_proveedor[i], o_costo[i], o_lote[i], o_lead[i]
+    ids, sku, nombre = ids[con_oferta], sku[con_oferta], nombre[con_oferta]
+    stock, objetivo = stock[con_oferta], objetivo[con_oferta]
+    # Hacia arriba al múltiplo del lote mínimo (el redondeo previo evita 2.0000000001 lotes)
+    cantidad = np.ceil(np.round(falta[con_oferta] / lote, 6)) * lote
+    subtotal = cantidad * costo
+
+    # Agrupación por proveedor: orden (proveedor, sku) y cortes donde cambia el proveedor
+    grupos = []
+    if len(ids):
+        orden = np.lexsort((sku.astype(str), proveedor))
+        proveedores = {p.pk: p for p in Proveedor.objects.filter(pk__in=set(proveedor.tolist()))}
+        columnas = [ids.tolist(), list(sku), list(nombre), stock.tolist(), objetivo.tolist(), cantidad.tolist(),
+                    lote.tolist(), costo.tolist(), subtotal.tolist(), lead.tolist()]
+        for bloque in np.split(orden, np.flatnonzero(np.diff(proveedor[orden])) + 1):
+            prov = proveedores[int(proveedor[bloque[0]])]
+            lineas = []
+            for k in bloque.tolist():
+                p, s, n, st, o, c, lt, cu, sub, ld = (col[k] for col in columnas)
+                lineas.append({
+                    "producto_id": p, "sku": s, "nombre": n, "stock": _decimal(st), "objetivo": _decimal(o),
+                    "cantidad": _decimal(c), "minimo_lote": _decimal(lt), "costo_unitario": _decimal(cu, 4),
+                    "subtotal": _decimal(sub, 4), "lead_time_dias": ld,
+                })
+            grupos.append({
+                "proveedor_id": prov.pk, "proveedor": prov.razon_social, "rut": prov.rut_nif,
+                "lineas": lineas, "total": sum((ln["subtotal"] for ln in lineas), Decimal("0")),
+            })
+        grupos.sort(key=lambda g: g["proveedor"])
+    return {"productos": evaluados, "proveedores": grupos, "sin_proveedor": sin_proveedor}
@@ -12,6 +12,7 @@ urlpatterns = [
     path("search/", views.search_suppliers, name="search"),
     path("relations/search/", views.relations_search, name="relations_search"),
     path("relations/export/", views.relations_export, name="relations_export"),
+    path("sugerencias-compra/", views.sugerencias_compra, name="sugerencias_compra"),
     path('desactivar/<int:supplier_id>/', views.desactivar_proveedor, name='desactivar_proveedor'),
     path('reactivar/<int:supplier_id>/', views.reactivar_proveedor, name='reactivar_proveedor'),
     path('relacion/eliminar/<int:relation_id>/', views.eliminar_relacion, name='delete_relation'),
@@ -1,27 +1,54 @@
-from datetime import datetime
 import json
 import re
 
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ImproperlyConfigured
 from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST
 
 from lilis_erp.roles import require_roles
+from lilis_erp.paginacion import paginar
+from lilis_erp.texto import prefijo_q
+from lilis_erp.exportar import Columna, FORMATOS, o_defecto, respuesta_exportacion, si_no
 
 # Modelos
-from apps.suppliers.models import Proveedor, ProveedorProducto
+from apps.suppliers.models import Proveedor, ProveedorProducto, normalizar_rut, parece_rut
+from apps.suppliers import reorden
 from apps.products.models import Producto
 
-# Excel
-try:
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    Workbook = None
+
+# -------------------------- Columnas de exportación --------------------------
+
+COLUMNAS_EXPORT = [
+    Columna("ID", "id"),
+    Columna("RUT/NIF", "rut_nif", o_defecto("")),
+    Columna("Razón Social", "razon_social", o_defecto("")),
+    Columna("Nombre Fantasía", "nombre_fantasia", o_defecto("")),
+    Columna("Email", "email", o_defecto("")),
+    Columna("Teléfono", "telefono", o_defecto("")),
+    Columna("Sitio Web", "sitio_web", o_defecto("")),
+    Columna("Condiciones de pago", "condiciones_pago", o_defecto("")),
+    Columna("Moneda", "moneda", o_defecto("")),
+    Columna("Estado", "estado", o_defecto("")),
+    Columna("Activo", "activo", si_no),
+]
+
+COLUMNAS_EXPORT_RELACIONES = [
+    Columna("ID", "id"),
+    Columna("Proveedor", "proveedor__razon_social", o_defecto("")),
+    Columna("RUT/NIF", "proveedor__rut_nif", o_defecto("")),
+    Columna("Producto", "producto__nombre", o_defecto("")),
+    Columna("SKU", "producto__sku", o_defecto("")),
+    Columna("Preferente", "preferente", si_no),
+    Columna("Lead time (d)", "lead_time_dias", o_defecto(0)),
+    Columna("Costo", "costo", o_defecto(0)),
+    Columna("Mínimo lote", "minimo_lote", o_defecto(0)),
+    Columna("Descuento (%)", "descuento_porcentaje", o_defecto(0)),
+]
 
 
 # -------------------------- Helpers --------------------------
@@ -29,13 +56,7 @@ except ImportError:
 def _valid_email(s: str) -> bool:
     return bool(re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", s or ""))
 
-# NUEVO: helpers para RUT chileno
-def normalizar_rut(rut: str) -> str:
-    """
-    Elimina puntos y guión, deja sólo dígitos + K en mayúscula.
-    """
-    return (rut or "").replace(".", "").replace("-", "").strip().upper()
-
+# NUEVO: helpers para RUT chileno (normalizar_rut vive en models: lo usa Proveedor.save)
 def rut_chileno_valido(rut: str) -> bool:
     """
     Valida RUT chileno:
@@ -86,28 +107,22 @@ def _estado_from_text(q: str):
 
 def _build_supplier_q(q: str) -> Q:
     """
-    Búsqueda para proveedores:
-    - rut_nif, razon_social, estado, email (requerido)
-    - extras no invasivos (ayudan)
+    Búsqueda para proveedores, por prefijo sobre columnas indexadas:
+    - si parece un RUT completo: igualdad sobre rut_normalizado (nada más)
+    - rut (como sea que venga escrito), email
+    - razon_social / nombre_fantasia sin tildes ni mayúsculas ("dulceria" encuentra "Dulcería")
     """
     q = (q or "").strip()
     if not q:
         return Q()
+    if parece_rut(q):
+        return Q(rut_normalizado=normalizar_rut(q))
 
     expr = (
-        Q(rut_nif__icontains=q) |
-        Q(razon_social__icontains=q) |
-        Q(email__icontains=q) |
-        # extras útiles
-        Q(nombre_fantasia__icontains=q) |
-        Q(telefono__icontains=q) |
-        Q(direccion__icontains=q) |
-        Q(ciudad__icontains=q) |
-        Q(pais__icontains=q) |
-        Q(contacto_principal_nombre__icontains=q) |
-        Q(contacto_principal_email__icontains=q) |
-        Q(contacto_principal_telefono__icontains=q) |
-        Q(condiciones_pago__icontains=q)
+        prefijo_q("rut_normalizado", normalizar_rut(q), normalizar=False) |
+        Q(email__istartswith=q) |
+        prefijo_q("razon_social_norm", q) |
+        prefijo_q("nombre_fantasia_norm", q)
     )
 
     # ID exacto si es número
@@ -123,10 +138,10 @@ def _build_relation_q(q: str) -> Q:
     if not q:
         return Q()
     return (
-        Q(proveedor__rut_nif__icontains=q) |
-        Q(proveedor__razon_social__icontains=q) |
-        Q(producto__sku__icontains=q) |
-        Q(producto__nombre__icontains=q)
+        prefijo_q("proveedor__rut_normalizado", normalizar_rut(q), normalizar=False) |
+        prefijo_q("proveedor__razon_social_norm", q) |
+        Q(producto__sku__istartswith=q) |
+        prefijo_q("producto__nombre_norm", q)
     )
 
 
@@ -158,57 +173,11 @@ def supplier_list_view(request):
 
     qs = qs.order_by(sort_by)
 
-    # Export a Excel
-    if export == "xlsx":
-        if Workbook is None:
-            return HttpResponse(
-                "Falta dependencia: instala openpyxl (pip install openpyxl)",
-                status=500,
-                content_type="text/plain; charset=utf-8",
-            )
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Proveedores"
-        headers = [
-            "ID", "RUT/NIF", "Razón Social", "Nombre Fantasía", "Email", "Teléfono",
-            "Sitio Web", "Plazos Pago (días)", "Moneda", "Descuento (%)", "Estado", "Activo"
-        ]
-        ws.append(headers)
-
-        for p in qs:
-            ws.append([
-                p.id,
-                getattr(p, "rut_nif", ""),
-                getattr(p, "razon_social", ""),
-                getattr(p, "nombre_fantasia", ""),
-                getattr(p, "email", ""),
-                getattr(p, "telefono", ""),
-                getattr(p, "sitio_web", ""),
-                getattr(p, "plazos_pago_dias", 0),
-                getattr(p, "moneda", ""),
-                getattr(p, "descuento_porcentaje", 0),
-                getattr(p, "estado", ""),
-                "Sí" if getattr(p, "activo", False) else "No",
-            ])
-
-        for col in ws.columns:
-            max_len = 0
-            col_letter = get_column_letter(col[0].column)
-            for cell in col:
-                max_len = max(max_len, len(str(cell.value)) if cell.value else 0)
-            ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        filename = f"proveedores_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        wb.save(response)
-        return response
+    # Export a Excel / CSV (streaming)
+    if export in FORMATOS:
+        return respuesta_exportacion(qs, COLUMNAS_EXPORT, "proveedores", formato=export, hoja="Proveedores")
 
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = paginar(request, qs, sort_by)
 
     # Relaciones proveedor-producto (filtradas también por q)
     relations_qs = ProveedorProducto.objects.select_related('proveedor', 'producto').order_by('-id')
@@ -293,7 +262,7 @@ def create_supplier(request):
 
     # Duplicado por RUT exacto
     if not errors:
-        existente = Proveedor.objects.filter(rut_nif=rut).first()
+        existente = Proveedor.por_rut(rut)
         if existente and str(existente.id) != str(data.get("id") or ""):
             errors["rut_nif"] = "Ya existe un proveedor con este RUT/NIF."
 
@@ -377,14 +346,14 @@ def create_relation(request):
     producto = None
 
     if not errors:
-        proveedor = Proveedor.objects.filter(rut_nif=rut).first()
+        proveedor = Proveedor.por_rut(rut)
         if not proveedor:
             errors["rut_nif"] = "Proveedor no existe. Guárdalo primero."
 
     if not errors:
         # buscar producto por SKU exacto o por nombre (primer resultado)
         producto = (Producto.objects.filter(sku=sku_or_name).first() or
-                    Producto.objects.filter(nombre__icontains=sku_or_name).order_by("id").first())
+                    Producto.objects.filter(prefijo_q("nombre_norm", sku_or_name)).order_by("id").first())
         if not producto:
             errors["sku_or_name"] = "Producto no encontrado."
 
@@ -455,56 +424,15 @@ def relations_search(request):
 @login_required
 @require_roles("ADMIN", "COMPRAS", "INVENTARIO")
 def relations_export(request):
-    if Workbook is None:
-        return HttpResponse(
-            "Falta dependencia: instala openpyxl (pip install openpyxl)",
-            status=500,
-            content_type="text/plain; charset=utf-8",
-        )
-
     q = (request.GET.get("q") or "").strip()
-    qs = ProveedorProducto.objects.select_related("proveedor", "producto")
+    qs = ProveedorProducto.objects.all()
     if q:
         qs = qs.filter(_build_relation_q(q))
     qs = qs.order_by("id")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relaciones"
-    headers = ["ID", "Proveedor", "RUT/NIF", "Producto", "SKU",
-               "Preferente", "Lead time (d)", "Costo", "Mínimo lote", "Descuento (%)"]
-    ws.append(headers)
-
-    for r in qs:
-        pvd = r.proveedor
-        pro = r.producto
-        ws.append([
-            r.id,
-            getattr(pvd, "razon_social", ""),
-            getattr(pvd, "rut_nif", ""),
-            getattr(pro, "nombre", ""),
-            getattr(pro, "sku", ""),
-            "Sí" if getattr(r, "preferente", False) else "No",
-            getattr(r, "lead_time_dias", 0) or 0,
-            getattr(r, "costo", 0) or 0,
-            getattr(r, "minimo_lote", 0) or 0,
-            getattr(r, "descuento_porcentaje", 0) or 0,
-        ])
-
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            max_len = max(max_len, len(str(cell.value)) if cell.value else 0)
-        ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    filename = f"relaciones_proveedor_producto_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+    formato = (request.GET.get("formato") or "xlsx").strip()
+    return respuesta_exportacion(qs, COLUMNAS_EXPORT_RELACIONES, "relaciones_proveedor_producto",
+                                 formato=formato, hoja="Relaciones")
 
 
 # ---------------------- EDITAR / ESTADO / ELIMINAR ----------------------
@@ -546,7 +474,7 @@ def editar_proveedor(request, supplier_id):
                     "message": "RUT/NIF inválido. Ejemplo: 12.345.678-9."
                 }, status=400)
 
-            if Proveedor.objects.filter(rut_nif=proveedor.rut_nif).exclude(id=supplier_id).exists():
+            if Proveedor.objects.filter(rut_normalizado=normalizar_rut(proveedor.rut_nif)).exclude(id=supplier_id).exists():
                 return JsonResponse({"status": "error", "message": "Ya existe otro proveedor con este RUT/NIF."}, status=400)
 
             proveedor.save()
@@ -620,3 +548,17 @@ def eliminar_relacion(request, relation_id):
         return JsonResponse({"status": "error", "message": "La relación no fue encontrada."}, status=404)
     except Exception as e:
         return JsonResponse({"status": "error", "message": f"No se pudo eliminar la relación. Error: {str(e)}"}, status=500)
+
+
+@login_required
+@require_roles("ADMIN", "COMPRAS", "INVENTARIO")
+def sugerencias_compra(request):
+    """
+    GET /proveedores/sugerencias-compra/ -> cantidades a reponer de todos los productos,
+    agrupadas por proveedor (ver reorden.py).
+    """
+    try:
+        resultado = reorden.calcular()
+    except ImproperlyConfigured as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+    return JsonResponse({"ok": True, **resultado})
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Bodega, Stock, MovimientoInventario
+from django.db import transaction
+from .models import (Bodega, CierreStock, ColaStock, ConteoInventario, KardexCierre, MovimientoDiario,
+                     MovimientoInventario, PronosticoDemanda, Stock, StockResumen, StockVencimiento, TrabajoExportacion)
 from .forms import MovimientoInventarioForm
 
 @admin.register(Bodega)
@@ -14,18 +16,117 @@ class StockAdmin(admin.ModelAdmin):
     list_filter = ("bodega", "producto", "fecha_vencimiento")
     search_fields = ("producto__sku", "producto__nombre", "lote", "serie")
     ordering = ("producto__nombre",)
-    readonly_fields = ()  
+    # El stock cambia sólo con movimientos (mantienen StockResumen, stock_total, vencimientos y alertas)
+    readonly_fields = ("producto", "bodega", "lote", "serie", "fecha_vencimiento", "cantidad", "clave", "fragmento")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockResumen)
+class StockResumenAdmin(admin.ModelAdmin):
+    list_display = ("producto", "bodega", "cantidad")
+    list_filter = ("bodega",)
+    search_fields = ("producto__sku", "producto__nombre")
+    ordering = ("producto__nombre",)
+    readonly_fields = ("producto", "bodega", "cantidad")
+
+@admin.register(StockVencimiento)
+class StockVencimientoAdmin(admin.ModelAdmin):
+    list_display = ("fecha_vencimiento", "bodega", "categoria", "cantidad", "valor")
+    list_filter = ("bodega", "categoria")
+    ordering = ("fecha_vencimiento",)
+    readonly_fields = ("bodega", "categoria", "fecha_vencimiento", "cantidad", "valor")
+
+@admin.register(MovimientoDiario)
+class MovimientoDiarioAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "tipo", "bodega", "producto", "entradas", "salidas", "movimientos")
+    list_filter = ("tipo", "bodega", "fecha")
+    search_fields = ("producto__sku", "producto__nombre")
+    ordering = ("-fecha",)
+    readonly_fields = ("fecha", "tipo", "bodega", "producto", "entradas", "salidas", "movimientos")
+
+@admin.register(PronosticoDemanda)
+class PronosticoDemandaAdmin(admin.ModelAdmin):
+    list_display = ("producto", "metodo", "demanda_diaria", "lead_time_dias", "stock_seguridad", "punto_reorden",
+                    "calculado_en")
+    list_filter = ("metodo",)
+    search_fields = ("producto__sku", "producto__nombre")
+    ordering = ("producto__nombre",)
+    readonly_fields = ("producto", "metodo", "ventana_dias", "alfa", "nivel_servicio", "demanda_diaria",
+                       "desviacion_diaria", "lead_time_dias", "stock_seguridad", "punto_reorden", "calculado_en")
+
+@admin.register(CierreStock)
+class CierreStockAdmin(admin.ModelAdmin):
+    list_display = ("fecha_corte", "lineas", "movimientos", "creado_en")
+    ordering = ("-fecha_corte",)
+    readonly_fields = ("fecha_corte", "lineas", "movimientos", "creado_en")
+
+@admin.register(KardexCierre)
+class KardexCierreAdmin(admin.ModelAdmin):
+    list_display = ("producto", "metodo", "corte", "cantidad", "valor")
+    list_filter = ("metodo",)
+    search_fields = ("producto__sku", "producto__nombre")
+    ordering = ("producto__nombre", "-corte")
+    readonly_fields = ("producto", "metodo", "corte", "cantidad", "valor", "capas")
 
 @admin.register(MovimientoInventario)
 class MovimientoInventarioAdmin(admin.ModelAdmin):
     form = MovimientoInventarioForm
     list_display = ("tipo", "fecha", "producto", "cantidad", "bodega_origen", "bodega_destino", "lote", "serie", "fecha_vencimiento", "creado_por")
-    list_filter = ("tipo", "bodega_origen", "bodega_destino", "producto", "fecha")
+    list_filter = ("tipo", "solo_libro", "bodega_origen", "bodega_destino", "producto", "fecha")
     search_fields = ("producto__sku", "producto__nombre", "lote", "serie", "observacion")
     ordering = ("-fecha",)
     fieldsets = (
         ("Datos del movimiento", {"fields": ("tipo", "fecha", "producto", "cantidad", "observacion", "creado_por")}),
         ("Ubicaciones", {"fields": ("bodega_origen", "bodega_destino")}),
-        ("Trazabilidad", {"fields": ("lote", "serie", "fecha_vencimiento", "proveedor")}),
+        ("Trazabilidad", {"fields": ("lote", "serie", "fecha_vencimiento", "proveedor", "costo_unitario")}),
     )
     readonly_fields = ("fecha",)
+
+    # Guardar aplica (o corrige) Stock en la misma transacción que el movimiento
+    def save_model(self, request, obj, form, change):
+        form.save()
+
+    # Eliminar revierte el efecto del movimiento sobre Stock
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and obj.solo_libro:
+            return False  # ajuste de conciliación: no tiene efecto que revertir
+        return super().has_delete_permission(request, obj)
+
+    def delete_model(self, request, obj):
+        obj.eliminar()
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            for obj in queryset.select_related("producto"):
+                obj.eliminar()
+
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "formato", "estado", "solicitado_por", "creado_en", "terminado_en")
+    list_filter = ("estado", "tipo", "formato")
+    ordering = ("-creado_en",)
+    readonly_fields = ("huella", "archivo", "nombre_descarga", "error", "creado_en", "iniciado_en", "terminado_en")
+
+
+@admin.register(ColaStock)
+class ColaStockAdmin(admin.ModelAdmin):
+    list_display = ("id", "particion", "estado", "parcial", "solicitado_por", "creado_en", "aplicado_en")
+    list_filter = ("estado", "particion")
+    ordering = ("-id",)
+    readonly_fields = ("particion", "estado", "movimientos", "lineas", "parcial", "resultado", "solicitado_por",
+                       "creado_en", "aplicado_en")
+
+
+@admin.register(ConteoInventario)
+class ConteoInventarioAdmin(admin.ModelAdmin):
+    list_display = ("id", "bodega", "categoria", "estado", "lineas", "contadas", "ajustes", "creado_en",
+                    "cerrado_en")
+    list_filter = ("estado", "bodega")
+    ordering = ("-creado_en",)
+    readonly_fields = ("bodega", "categoria", "estado", "lineas", "contadas", "ajustes", "creado_por", "creado_en",
+                       "cerrado_por", "cerrado_en")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TransactionalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.transactional'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (invalidación de cierres de kardex y de stock)
@@ -0,0 +1,120 @@
+"""
+Stock a una fecha ("¿cuánto había al 31 de marzo?").
+
+Un cierre (CierreStock) guarda el saldo por producto×bodega×lote a su fecha de corte.
+Para cualquier instante se parte del cierre anterior más cercano y se reproducen, en
+orden de fecha, sólo los movimientos posteriores (con las mismas reglas de
+stock.deltas). Cada cierre nuevo se arma igual, desde el anterior, así que nunca
+depende de que Stock esté al día.
+
+Los movimientos se leen con iterator() (sin cargar la tabla en memoria) y las líneas
+del cierre se insertan con bulk_create por bloques.
+"""
+from datetime import datetime, time
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CierreStock, CierreStockLinea, MovimientoInventario
+from .stock import deltas
+
+CERO = Decimal("0")
+LOTE = 2000
+_CAMPOS_MOVIMIENTO = ("id", "fecha", "tipo", "producto_id", "bodega_origen_id", "bodega_destino_id",
+                      "cantidad", "lote", "serie", "fecha_vencimiento")
+
+
+def fin_del_dia(fecha):
+    """date -> último instante de ese día en la zona horaria local."""
+    return timezone.make_aware(datetime.combine(fecha, time.max))
+
+
+def _clave(producto_id, bodega_id, lote, serie, fecha_vencimiento):
+    # lote/serie vacíos y NULL son el mismo lote (como Stock.calcular_clave)
+    return (producto_id, bodega_id, (lote or "").strip(), (serie or "").strip(), fecha_vencimiento)
+
+
+def cierre_anterior(fecha):
+    return CierreStock.objects.filter(fecha_corte__lte=fecha).order_by("-fecha_corte").first()
+
+
+def _saldos_cierre(cierre, producto_ids=None, bodega_ids=None):
+    qs = CierreStockLinea.objects.filter(cierre=cierre)
+    if producto_ids:
+        qs = qs.filter(producto_id__in=producto_ids)
+    if bodega_ids:
+        qs = qs.filter(bodega_id__in=bodega_ids)
+    campos = ("producto_id", "bodega_id", "lote", "serie", "fecha_vencimiento", "cantidad")
+    saldos = {}
+    for p, b, lote, serie, venc, cantidad in qs.values_list(*campos).order_by().iterator(chunk_size=LOTE):
+        saldos[_clave(p, b, lote, serie, venc)] = cantidad
+    return saldos
+
+
+def movimientos_entre(desde, hasta, producto_ids=None, bodega_ids=None):
+    """Movimientos con desde < fecha <= hasta, en orden de fecha, leídos de a bloques."""
+    qs = MovimientoInventario.objects.filter(fecha__lte=hasta)
+    if desde is not None:
+        qs = qs.filter(fecha__gt=desde)
+    if producto_ids:
+        qs = qs.filter(producto_id__in=producto_ids)
+    if bodega_ids:
+        qs = qs.filter(Q(bodega_origen_id__in=bodega_ids) | Q(bodega_destino_id__in=bodega_ids))
+    return qs.order_by("fecha", "id").only(*_CAMPOS_MOVIMIENTO).iterator(chunk_size=LOTE)
+
+
+def reproducir(saldos, movimientos, bodega_ids=None):
+    """Aplica `movimientos` sobre `saldos` (in place). Devuelve cuántos se reprodujeron."""
+    n = 0
+    for mov in movimientos:
+        for c, d in deltas(mov):
+            if bodega_ids and c[1] not in bodega_ids:
+                continue  # la otra pata de una transferencia
+            k = _clave(*c)
+            saldos[k] = saldos.get(k, CERO) + d
+        n += 1
+    return n
+
+
+def stock_al(fecha, producto_ids=None, bodega_ids=None):
+    """
+    Saldos al instante `fecha`: ({(producto_id, bodega_id, lote, serie, vencimiento): cantidad},
+    cierre usado o None, movimientos reproducidos). Omite los saldos en cero.
+    """
+    cierre = cierre_anterior(fecha)
+    saldos = _saldos_cierre(cierre, producto_ids, bodega_ids) if cierre else {}
+    n = reproducir(
+        saldos,
+        movimientos_entre(cierre.fecha_corte if cierre else None, fecha, producto_ids, bodega_ids),
+        bodega_ids,
+    )
+    return {k: v for k, v in saldos.items() if v}, cierre, n
+
+
+@transaction.atomic
+def cerrar(fecha_corte):
+    """
+    Crea el CierreStock al `fecha_corte` desde el cierre anterior + movimientos.
+    Conviene correrlo con margen (p. ej. de madrugada para el día anterior): los
+    movimientos que aún no hacen COMMIT al momento del cierre no quedan en la foto.
+    """
+    if CierreStock.objects.filter(fecha_corte=fecha_corte).exists():
+        raise ValidationError("Ya existe un cierre con esa fecha de corte.")
+    saldos, _, n = stock_al(fecha_corte)
+    cierre = CierreStock.objects.create(fecha_corte=fecha_corte, lineas=len(saldos), movimientos=n)
+
+    lineas = (
+        CierreStockLinea(cierre=cierre, producto_id=p, bodega_id=b, lote=lote, serie=serie,
+                         fecha_vencimiento=venc, cantidad=cantidad)
+        for (p, b, lote, serie, venc), cantidad in sorted(saldos.items(), key=lambda kv: kv[0][:2])
+    )
+    while True:
+        bloque = list(islice(lineas, LOTE))
+        if not bloque:
+            break
+        CierreStockLinea.objects.bulk_create(bloque)
+    return cierre
@@ -0,0 +1,173 @@
+"""
+Cola de aplicación de stock (STOCK_COLA, `manage.py stock_applier`).
+
+Con muchas recepciones y despachos a la vez, cada request que aplica movimientos
+bloquea filas de Stock/StockResumen de su bodega y espera a los demás (o choca en un
+deadlock). En modo cola POST /transacciones/lote/ sólo inserta un ColaStock y un
+worker por partición de bodegas aplica esos lotes en serie:
+
+- encolar():  guarda el lote ya validado (commit junto con la transacción del que llama).
+- esperar():  consulta el registro hasta que se aplique o pase el plazo; si no, el
+              cliente sigue por GET /transacciones/cola/<id>/.
+- procesar(): toma hasta `tamano` registros pendientes de la partición en orden de
+              llegada y los aplica juntos con un solo stock.aplicar_movimientos (un
+              commit por tanda). Si alguna línea no se puede aplicar, la tanda se
+              repite lote por lote, cada uno en su savepoint.
+
+Alcance: la cola sólo ordena los lotes de /transacciones/lote/ cuyas bodegas (origen y
+destino de todas las líneas) caen en una misma partición, bodega % STOCK_COLA_PARTICIONES
+(particion_de). El worker NO es el único que escribe el stock de su partición: los lotes
+que cruzan particiones y el resto de las escrituras (crear_transaccion, FEFO, edición y
+eliminación de movimientos, admin, conteos) aplican directo, como sin cola. Lo que
+mantiene el stock correcto es que toda escritura bloquea o actualiza las filas de Stock
+en orden de clave dentro de su transacción (stock.bloquear,
+MovimientoInventario._aplicar_cambios) y se reintenta ante un deadlock
+(reintentar_bloqueos); la cola sólo reduce la contención entre lotes de una bodega.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from lilis_erp.reintentos import es_bloqueo, reintentar_bloqueos
+
+from .models import ColaStock, MovimientoInventario, Producto
+from .stock import aplicar_movimientos
+
+TAMANO = 50
+PAUSA = 0.005
+PAUSA_MAXIMA = 0.05
+_CAMPOS = ("tipo", "producto_id", "proveedor_id", "bodega_origen_id", "bodega_destino_id", "cantidad", "lote",
+           "serie", "fecha_vencimiento", "costo_unitario", "observacion", "creado_por_id")
+
+
+def activa():
+    return getattr(settings, "STOCK_COLA", False)
+
+
+def particion(bodega_id):
+    return (bodega_id or 0) % max(1, settings.STOCK_COLA_PARTICIONES)
+
+
+def particion_de(movimientos):
+    """Partición común a todas las bodegas que tocan `movimientos`, o None si son de varias."""
+    particiones = {particion(b) for mov in movimientos
+                   for b in (mov.bodega_origen_id, mov.bodega_destino_id) if b}
+    return particiones.pop() if len(particiones) == 1 else None
+
+
+def _serializar(mov):
+    datos = {}
+    for c in _CAMPOS:
+        valor = getattr(mov, c)
+        datos[c] = valor if valor is None or isinstance(valor, (int, str)) else str(valor)  # Decimal, date
+    return datos
+
+
+def _deserializar(datos, productos):
+    campos = MovimientoInventario._meta
+    mov = MovimientoInventario(**{c: campos.get_field(c).to_python(v) for c, v in datos.items()})
+    mov.producto = productos[mov.producto_id]  # StockVencimiento necesita la categoría
+    return mov
+
+
+def encolar(movimientos, lineas, parcial=False, usuario=None):
+    """
+    Encola `movimientos` (sin guardar, ya validados) como un solo lote. Devuelve el ColaStock.
+    Todas sus bodegas deben ser de una misma partición (ver particion_de).
+    """
+    num_particion = particion_de(movimientos)
+    if num_particion is None:
+        raise ValueError("El lote toca bodegas de más de una partición: se aplica sin cola.")
+    return ColaStock.objects.create(
+        particion=num_particion,
+        movimientos=[_serializar(mov) for mov in movimientos], lineas=list(lineas), parcial=parcial,
+        solicitado_por=usuario,
+    )
+
+
+def esperar(cola_id, segundos):
+    """El ColaStock cuando deja de estar pendiente, o el último leído si se cumple el plazo."""
+    limite = time.monotonic() + segundos
+    pausa = PAUSA
+    while True:
+        item = ColaStock.objects.get(pk=cola_id)
+        if item.estado != ColaStock.ESTADO_PENDIENTE or time.monotonic() >= limite:
+            return item
+        time.sleep(pausa)
+        pausa = min(pausa * 2, PAUSA_MAXIMA)
+
+
+def _resultado(item, guardados, errores):
+    item.estado = ColaStock.ESTADO_APLICADO
+    item.resultado = {
+        "creados": len(guardados),
+        "ids": [m.pk for m in guardados if m.pk],  # MySQL no devuelve ids en bulk_create
+        "errores": {str(item.lineas[pos]): mensaje for pos, mensaje in errores.items()},
+    }
+
+
+def _aplicar_uno(item, productos):
+    movimientos = [_deserializar(d, productos) for d in item.movimientos]
+    try:
+        guardados, errores = aplicar_movimientos(movimientos, parcial=item.parcial)
+    except Exception as e:  # el savepoint de aplicar_movimientos ya lo revirtió
+        if es_bloqueo(e):
+            raise  # el motor revirtió toda la transacción: se reintenta la tanda completa
+        item.estado, item.resultado = ColaStock.ESTADO_ERROR, {"error": str(e)}
+        return
+    _resultado(item, guardados, errores)
+
+
+def _aplicar_todos(items, productos):
+    """
+    Caso normal: todos los lotes de la tanda en un solo aplicar_movimientos (un bloqueo
+    ordenado y un bulk por tabla). Si alguna línea falla se revierte y devuelve False.
+    """
+    planes = [[_deserializar(d, productos) for d in item.movimientos] for item in items]
+    try:
+        guardados, errores = aplicar_movimientos([mov for movs in planes for mov in movs])
+    except Exception as e:
+        if es_bloqueo(e):
+            raise
+        return False
+    if errores:
+        return False
+    inicio = 0
+    for item, movs in zip(items, planes):
+        _resultado(item, guardados[inicio:inicio + len(movs)], {})
+        inicio += len(movs)
+    return True
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def procesar(num_particion, tamano=TAMANO):
+    """Aplica hasta `tamano` registros pendientes de la partición. Devuelve cuántos procesó."""
+    items = list(ColaStock.objects.select_for_update(skip_locked=True)
+                 .filter(particion=num_particion, estado=ColaStock.ESTADO_PENDIENTE)
+                 .order_by("id")[:tamano])
+    if not items:
+        return 0
+    productos = Producto.objects.in_bulk({d["producto_id"] for item in items for d in item.movimientos})
+    if not _aplicar_todos(items, productos):
+        # Algún lote no se puede aplicar: cada uno por separado, en su savepoint y con su
+        # propia regla (parcial o todo o nada), en orden de llegada.
+        for item in items:
+            _aplicar_uno(item, productos)
+    ahora = timezone.now()
+    for item in items:
+        item.aplicado_en = ahora
+    ColaStock.objects.bulk_update(items, ["estado", "resultado", "aplicado_en"])
+    return len(items)
+
+
+def purgar(horas=None):
+    """Borra los registros terminados hace más de `horas`."""
+    horas = horas if horas is not None else settings.STOCK_COLA_RETENCION_HORAS
+    limite = timezone.now() - timedelta(hours=horas)
+    return ColaStock.objects.filter(
+        estado__in=[ColaStock.ESTADO_APLICADO, ColaStock.ESTADO_ERROR], aplicado_en__lt=limite,
+    ).delete()[0]
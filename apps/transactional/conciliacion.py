@@ -0,0 +1,153 @@
+"""
+Conciliación de Stock contra el libro de movimientos (`manage.py reconcile_stock`).
+
+Por rango de ids de producto se calcula el saldo esperado por producto×bodega×lote
+sumando los movimientos en la base (GROUP BY, con las mismas reglas que stock.deltas)
+y se compara con la suma de Stock (incluye las sub-filas de productos fragmentados).
+Los rangos se reparten entre procesos (lilis_erp.procesos); cada uno devuelve sólo
+las diferencias. Las dos lecturas de un rango se hacen en una misma transacción para
+no comparar un libro y un stock de momentos distintos.
+
+corregir() registra AJUSTEs por la diferencia (stock - esperado) sin tocar Stock:
+el stock físico se da por bueno y el libro pasa a explicarlo. Quedan marcados
+solo_libro: como nunca se aplicaron, eliminar/guardar_cambios no los revierten.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+
+from apps.products.models import Producto
+from lilis_erp.procesos import crear_pool
+from lilis_erp.reintentos import reintentar_bloqueos
+
+from .models import CierreStock, MovimientoDiario, MovimientoInventario, Stock
+
+CERO = Decimal("0")
+RANGO = 5000
+LOTE = 1000
+_CAMPOS_LOTE = ("lote", "serie", "fecha_vencimiento")
+
+M = MovimientoInventario
+# (filtro, campo de bodega, signo)
+_REGLAS = (
+    (Q(tipo__in=[M.TIPO_INGRESO, M.TIPO_DEVOLUCION, M.TIPO_TRANSFERENCIA]), "bodega_destino_id", 1),
+    (Q(tipo__in=[M.TIPO_SALIDA, M.TIPO_TRANSFERENCIA]), "bodega_origen_id", -1),
+    (Q(tipo=M.TIPO_AJUSTE, bodega_destino__isnull=False), "bodega_destino_id", 1),
+    (Q(tipo=M.TIPO_AJUSTE, bodega_destino__isnull=True), "bodega_origen_id", 1),
+)
+
+
+def _clave(producto_id, bodega_id, lote, serie, fecha_vencimiento):
+    return (producto_id, bodega_id, (lote or "").strip(), (serie or "").strip(), fecha_vencimiento)
+
+
+def rangos(tamano=RANGO):
+    """[(desde_id, hasta_id)] que cubren todos los productos."""
+    limites = Producto.objects.aggregate(min=Min("id"), max=Max("id"))
+    if limites["min"] is None:
+        return []
+    return [(i, min(i + tamano - 1, limites["max"])) for i in range(limites["min"], limites["max"] + 1, tamano)]
+
+
+def _esperado(filtro):
+    saldos = {}
+    movs = MovimientoInventario.objects.filter(filtro)
+    for regla, bodega, signo in _REGLAS:
+        filas = (movs.filter(regla).exclude(**{f"{bodega}__isnull": True})
+                 .values_list("producto_id", bodega, *_CAMPOS_LOTE)
+                 .annotate(total=Sum("cantidad")).order_by())
+        for p, b, lote, serie, venc, total in filas.iterator(chunk_size=LOTE):
+            k = _clave(p, b, lote, serie, venc)
+            saldos[k] = saldos.get(k, CERO) + signo * total
+    return saldos
+
+
+def _actual(filtro):
+    saldos = {}
+    filas = (Stock.objects.filter(filtro)
+             .values_list("producto_id", "bodega_id", *_CAMPOS_LOTE)
+             .annotate(total=Sum("cantidad")).order_by())
+    for p, b, lote, serie, venc, total in filas.iterator(chunk_size=LOTE):
+        k = _clave(p, b, lote, serie, venc)
+        saldos[k] = saldos.get(k, CERO) + total
+    return saldos
+
+
+def _rango(desde_id, hasta_id):
+    return Q(producto_id__gte=desde_id, producto_id__lte=hasta_id)
+
+
+def esperado(desde_id, hasta_id):
+    """{clave: saldo} según los movimientos de los productos del rango."""
+    return _esperado(_rango(desde_id, hasta_id))
+
+
+def actual(desde_id, hasta_id):
+    """{clave: cantidad} en Stock para los productos del rango."""
+    return _actual(_rango(desde_id, hasta_id))
+
+
+def _diferencias(filtro):
+    """
+    {clave: (esperado, stock)} donde no coinciden. Ambas lecturas van en una misma
+    transacción: con REPEATABLE READ (MySQL) o SQLite ven la misma foto de la base, y
+    un movimiento que se confirma entre una y otra no aparece en sólo una de ellas.
+    """
+    with transaction.atomic():
+        libro, stock = _esperado(filtro), _actual(filtro)
+    diferencias = {}
+    for k in set(libro) | set(stock):
+        e, s = libro.get(k, CERO), stock.get(k, CERO)
+        if e != s:
+            diferencias[k] = (e, s)
+    return diferencias
+
+
+def conciliar_rango(rango):
+    """[(clave, esperado, stock)] con las diferencias del rango. Corre dentro de un proceso del pool."""
+    diferencias = _diferencias(_rango(*rango))
+    return [(k, *diferencias[k]) for k in sorted(diferencias, key=lambda k: (*k[:4], k[4] or date.min))]
+
+
+def conciliar(procesos=1, tamano=RANGO):
+    """Genera las diferencias de todos los rangos, en orden de producto."""
+    partes = rangos(tamano)
+    if procesos > 1 and len(partes) > 1:
+        with crear_pool(procesos) as pool:
+            for diferencias in pool.map(conciliar_rango, partes):
+                yield from diferencias
+    else:
+        for rango in partes:
+            yield from conciliar_rango(rango)
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def corregir(diferencias, usuario=None, observacion="Conciliación de stock"):
+    """
+    Registra un AJUSTE por cada diferencia (cantidad = stock - esperado, puede ser negativa)
+    con bulk_create. No aplica los ajustes a Stock: sólo completan el libro (solo_libro=True).
+
+    Antes de escribir se vuelve a conciliar, en esta misma transacción, a los productos de
+    `diferencias`: sólo se corrige lo que sigue descuadrado y por la diferencia de ahora.
+    Un movimiento posterior cambia libro y stock a la vez, así que no la altera.
+    """
+    productos = {k[0] for k, _e, _s in diferencias}
+    vigentes = _diferencias(Q(producto_id__in=productos)) if productos else {}
+    ajustes = []
+    for k, _e, _s in diferencias:
+        if k not in vigentes:
+            continue
+        (p, b, lote, serie, venc), (e, s) = k, vigentes[k]
+        ajustes.append(MovimientoInventario(
+            tipo=MovimientoInventario.TIPO_AJUSTE, producto_id=p, bodega_destino_id=b,
+            cantidad=s - e, lote=lote or None, serie=serie or None, fecha_vencimiento=venc,
+            observacion=observacion, creado_por=usuario, solo_libro=True,
+        ))
+    MovimientoInventario.objects.bulk_create(ajustes, batch_size=LOTE)
+    if ajustes:
+        CierreStock.invalidar_desde(min(m.fecha for m in ajustes))
+    MovimientoDiario.registrar_lote(ajustes)
+    return len(ajustes)
@@ -0,0 +1,297 @@
+"""
+Conteos cíclicos (inventario físico) por bodega.
+
+1. abrir():    congela el stock esperado de la bodega (opcionalmente de una categoría)
+               en ConteoLinea, una línea por producto×lote×serie×vencimiento, con una
+               consulta agregada sobre Stock y bulk_create.
+2. leer_archivo() + cargar():  las cantidades contadas llegan en CSV o XLSX
+               (columnas producto/sku, lote, serie, fecha_vencimiento, cantidad). Se
+               resuelven los productos con una consulta, se suman las filas repetidas
+               (el mismo lote contado en dos ubicaciones) y se escriben con
+               bulk_update / bulk_create. Cargar de nuevo una clave la reemplaza.
+3. diferencias():  contado - esperado de todas las líneas en una sola consulta (la
+               resta la hace la base de datos, no un recorrido en Python).
+4. cerrar():   registra un AJUSTE por diferencia con stock.aplicar_movimientos: todos
+               en una transacción, con las filas bloqueadas en orden. Si algún ajuste
+               negativo ya no cabe (se despachó después de abrir), no se registra ninguno.
+
+El ajuste es contado - esperado sobre el stock actual: los movimientos registrados entre
+la apertura y el cierre se conservan. Conviene contar apenas se abre el conteo.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from lilis_erp.reintentos import reintentar_bloqueos
+from lilis_erp.texto import tokens
+
+from .models import Bodega, ConteoInventario, ConteoLinea, MovimientoInventario, Producto, Stock
+from .registro_lote import _productos
+from .stock import aplicar_movimientos
+
+# Excel opcional
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+CERO = Decimal("0")
+LOTE = 2000
+MAX_ERRORES = 50
+
+# Encabezados aceptados (en forma de texto.tokens: "Fecha de vencimiento" -> "FECHA DE VENCIMIENTO") -> campo
+COLUMNAS = {
+    "PRODUCTO": "producto", "SKU": "producto", "CODIGO": "producto",
+    "LOTE": "lote",
+    "SERIE": "serie",
+    "FECHA VENCIMIENTO": "fecha_vencimiento", "FECHA DE VENCIMIENTO": "fecha_vencimiento",
+    "VENCIMIENTO": "fecha_vencimiento",
+    "CANTIDAD": "cantidad", "CONTADO": "cantidad", "CONTEO": "cantidad",
+}
+
+
+def _clave(producto_id, lote, serie, fecha_vencimiento):
+    # lote/serie vacíos y NULL son el mismo lote (como Stock.calcular_clave)
+    return (producto_id, (lote or "").strip(), (serie or "").strip(), fecha_vencimiento)
+
+
+# -------------------------- Apertura --------------------------
+
+@transaction.atomic
+def abrir(bodega, usuario=None, categoria=None, observacion=""):
+    """Crea el conteo y congela el stock esperado de la bodega. Devuelve el ConteoInventario."""
+    Bodega.objects.select_for_update().get(pk=bodega.pk)  # dos aperturas simultáneas se esperan
+    if ConteoInventario.objects.filter(bodega=bodega, estado=ConteoInventario.ESTADO_ABIERTO).exists():
+        raise ValidationError("La bodega ya tiene un conteo abierto.")
+    conteo = ConteoInventario.objects.create(bodega=bodega, categoria=categoria, observacion=observacion,
+                                             creado_por=usuario)
+    qs = Stock.objects.filter(bodega=bodega)
+    if categoria is not None:
+        qs = qs.filter(producto__categoria=categoria)
+    esperado = defaultdict(lambda: CERO)
+    # Las sub-filas de productos fragmentados y los lotes NULL / "" se juntan en la misma clave
+    for p, lote, serie, venc, total in (qs.values_list("producto_id", "lote", "serie", "fecha_vencimiento")
+                                        .annotate(total=Sum("cantidad")).order_by().iterator(chunk_size=LOTE)):
+        esperado[_clave(p, lote, serie, venc)] += total or CERO
+
+    lineas = [ConteoLinea(conteo=conteo, producto_id=p, lote=lote, serie=serie, fecha_vencimiento=venc,
+                          esperado=cantidad)
+              for (p, lote, serie, venc), cantidad in sorted(esperado.items(), key=lambda kv: kv[0][0])
+              if cantidad]
+    ConteoLinea.objects.bulk_create(lineas, batch_size=LOTE)
+    conteo.lineas = len(lineas)
+    conteo.save(update_fields=["lineas"])
+    return conteo
+
+
+def anular(conteo):
+    """Descarta un conteo abierto sin registrar ajustes."""
+    if conteo.estado != ConteoInventario.ESTADO_ABIERTO:
+        raise ValidationError("Sólo se puede anular un conteo abierto.")
+    conteo.estado = ConteoInventario.ESTADO_ANULADO
+    conteo.cerrado_en = timezone.now()
+    conteo.save(update_fields=["estado", "cerrado_en"])
+
+
+# -------------------------- Carga de cantidades contadas --------------------------
+
+def _filas_csv(contenido):
+    texto = contenido.decode("utf-8-sig") if isinstance(contenido, bytes) else contenido
+    muestra = texto[:4096]
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    yield from csv.reader(io.StringIO(texto), dialecto)
+
+
+def _filas_xlsx(contenido):
+    if load_workbook is None:
+        raise ImproperlyConfigured("Falta dependencia: instala openpyxl (pip install openpyxl)")
+    libro = load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer_archivo(contenido, nombre):
+    """
+    [dict] con las filas de un CSV o XLSX (según la extensión de `nombre`), con las claves
+    de COLUMNAS y "fila" (número de fila en el archivo). La primera fila es el encabezado.
+    """
+    filas = _filas_xlsx(contenido) if nombre.lower().endswith(".xlsx") else _filas_csv(contenido)
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise ValidationError("El archivo está vacío.")
+    campos = [COLUMNAS.get(" ".join(tokens(str(c or "")))) for c in encabezado]
+    if "producto" not in campos or "cantidad" not in campos:
+        raise ValidationError("El archivo debe tener columnas 'producto' (o 'sku') y 'cantidad'.")
+    resultado = []
+    for n, fila in enumerate(filas, start=2):
+        if not any(v not in (None, "") for v in fila):
+            continue  # filas en blanco (típicas al final de una planilla)
+        datos = {c: v for c, v in zip(campos, fila) if c}
+        datos["fila"] = n
+        resultado.append(datos)
+    return resultado
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # SKU o lote numérico leído desde Excel
+    return str(valor if valor is not None else "").strip()
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor or "").strip()
+    return date.fromisoformat(texto[:10]) if texto else None
+
+
+def _cantidad(valor):
+    if isinstance(valor, (int, float)):
+        return Decimal(str(valor))
+    return Decimal(str(valor or "").strip().replace(",", "."))
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def cargar(conteo_id, filas, parcial=False):
+    """
+    Registra las cantidades contadas de `filas` (salida de leer_archivo).
+    Devuelve (cargadas, nuevas, errores) con errores = {número de fila: mensaje}.
+    - parcial=False: si alguna fila tiene errores no se carga ninguna.
+    - parcial=True: se cargan las válidas.
+    """
+    conteo = ConteoInventario.objects.select_for_update().get(pk=conteo_id)
+    if conteo.estado != ConteoInventario.ESTADO_ABIERTO:
+        raise ValidationError("El conteo no está abierto.")
+
+    producto_de = _productos([{"producto": _texto(f, "producto")} for f in filas])
+    contado, errores = defaultdict(lambda: CERO), {}
+    for pos, fila in enumerate(filas, start=2):
+        n = fila.get("fila", pos)
+        ref = _texto(fila, "producto")
+        producto = producto_de(ref) if ref else None
+        if producto is None:
+            errores[n] = "Producto no encontrado."
+            continue
+        if conteo.categoria_id and producto.categoria_id != conteo.categoria_id:
+            errores[n] = "El producto no pertenece a la categoría del conteo."
+            continue
+        try:
+            cantidad = _cantidad(fila.get("cantidad"))
+            if not cantidad.is_finite() or cantidad < 0:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errores[n] = "Cantidad inválida."
+            continue
+        try:
+            venc = _fecha(fila.get("fecha_vencimiento"))
+        except ValueError:
+            errores[n] = "Fecha inválida (use AAAA-MM-DD)."
+            continue
+        contado[_clave(producto.pk, _texto(fila, "lote"), _texto(fila, "serie"), venc)] += cantidad
+
+    if errores and not parcial:
+        return 0, 0, errores
+
+    existentes = {
+        _clave(p, lote, serie, venc): (pk, esperado)
+        for pk, p, lote, serie, venc, esperado in ConteoLinea.objects.filter(conteo=conteo)
+        .values_list("pk", "producto_id", "lote", "serie", "fecha_vencimiento", "esperado").iterator(chunk_size=LOTE)
+    }
+    actualizar, crear = [], []
+    for (p, lote, serie, venc), cantidad in contado.items():
+        linea = ConteoLinea(conteo=conteo, producto_id=p, lote=lote, serie=serie, fecha_vencimiento=venc,
+                            esperado=CERO, contado=cantidad)
+        if (p, lote, serie, venc) in existentes:
+            linea.pk, linea.esperado = existentes[(p, lote, serie, venc)]
+            actualizar.append(linea)
+        else:  # lote que no figuraba en el sistema
+            crear.append(linea)
+    # Un INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE por bloque sobre la PK: bulk_update
+    # arma un CASE por fila y con miles de líneas es varias veces más lento. MySQL no acepta
+    # columnas de conflicto (ConteoLinea no tiene otro índice único que la PK).
+    conexion = connections[router.db_for_write(ConteoLinea)]
+    unicos = ["id"] if conexion.features.supports_update_conflicts_with_target else None
+    ConteoLinea.objects.bulk_create(actualizar, update_conflicts=True, unique_fields=unicos,
+                                    update_fields=["contado"], batch_size=LOTE)
+    ConteoLinea.objects.bulk_create(crear, batch_size=LOTE)
+
+    totales = ConteoLinea.objects.filter(conteo=conteo).aggregate(
+        lineas=Count("id"), contadas=Count("contado"),
+    )
+    conteo.lineas, conteo.contadas = totales["lineas"], totales["contadas"]
+    conteo.save(update_fields=["lineas", "contadas"])
+    return len(actualizar), len(crear), errores
+
+
+# -------------------------- Diferencias y cierre --------------------------
+
+def diferencias(conteo, no_contadas_en_cero=False):
+    """
+    Líneas con diferencia, anotadas con `diferencia` = contado - esperado.
+    Las líneas sin contar se omiten, o cuentan como 0 con `no_contadas_en_cero`
+    (conteo completo: lo que no se encontró se da de baja).
+    """
+    qs = ConteoLinea.objects.filter(conteo=conteo)
+    if no_contadas_en_cero:
+        contado = Coalesce("contado", Value(CERO), output_field=DecimalField(max_digits=14, decimal_places=3))
+    else:
+        qs = qs.filter(contado__isnull=False)
+        contado = F("contado")
+    return qs.annotate(diferencia=contado - F("esperado")).exclude(diferencia=0)
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def cerrar(conteo_id, usuario=None, no_contadas_en_cero=False):
+    """
+    Registra los AJUSTEs del conteo (todos o ninguno) y lo cierra.
+    Devuelve la lista de MovimientoInventario creados.
+    """
+    conteo = ConteoInventario.objects.select_for_update().select_related("bodega").get(pk=conteo_id)
+    if conteo.estado != ConteoInventario.ESTADO_ABIERTO:
+        raise ValidationError("El conteo no está abierto.")
+
+    filas = list(diferencias(conteo, no_contadas_en_cero)
+                 .values_list("producto_id", "lote", "serie", "fecha_vencimiento", "diferencia"))
+    productos = Producto.objects.in_bulk({f[0] for f in filas})
+    observacion = f"Conteo #{conteo.pk}"
+    ajustes = [
+        MovimientoInventario(
+            tipo=MovimientoInventario.TIPO_AJUSTE, producto=productos[p], bodega_destino=conteo.bodega,
+            cantidad=d, lote=lote or None, serie=serie or None, fecha_vencimiento=venc,
+            observacion=observacion, creado_por=usuario,
+        )
+        for p, lote, serie, venc, d in filas
+    ]
+    guardados, errores = aplicar_movimientos(ajustes) if ajustes else ([], {})
+    if errores:
+        detalle = [f"{ajustes[i].producto.sku} {ajustes[i].lote or ''}".strip()
+                   for i in sorted(errores)[:MAX_ERRORES]]
+        raise ValidationError(
+            f"{len(errores)} ajuste(s) dejarían el stock en negativo (hubo salidas después de abrir el "
+            f"conteo): {', '.join(detalle)}."
+        )
+
+    conteo.estado = ConteoInventario.ESTADO_CERRADO
+    conteo.ajustes = len(guardados)
+    conteo.cerrado_por = usuario
+    conteo.cerrado_en = timezone.now()
+    conteo.save(update_fields=["estado", "ajustes", "cerrado_por", "cerrado_en"])
+    return guardados
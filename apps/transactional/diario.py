@@ -0,0 +1,101 @@
+"""
+KPIs de movimientos para el dashboard.
+
+Se leen de MovimientoDiario (día × tipo × bodega × producto), no de MovimientoInventario:
+los movimientos se suman ahí al registrarse, así que cada consulta recorre a lo más
+un registro por combinación y día, no uno por movimiento.
+
+- MovimientoDiario.registrar_lote: desde aplicar_a_stock / aplicar_movimientos / fefo /
+  edición y eliminación de movimientos.
+- refrescar(): reconstrucción desde los movimientos (`manage.py refrescar_movimientos_diarios`);
+  compactar_stock la usa para los productos con stock fragmentado.
+- kpis():      movimientos por día y tipo, unidades por bodega y productos con más movimiento.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import MovimientoDiario, MovimientoInventario
+
+CERO = Decimal("0")
+LOTE = 2000
+DIAS = 30
+TOP = 10
+_CAMPOS = ("id", "fecha", "tipo", "producto_id", "cantidad", "bodega_origen_id", "bodega_destino_id")
+
+
+@transaction.atomic
+def refrescar(desde=None, producto_ids=None):
+    """
+    Reconstruye MovimientoDiario desde los movimientos a partir del día `desde` (todo si es
+    None), opcionalmente sólo para `producto_ids`. Devuelve cuántos movimientos se sumaron.
+    """
+    filas = MovimientoDiario.objects.all()
+    movs = MovimientoInventario.objects.all()
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+        movs = movs.filter(fecha__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+    if producto_ids is not None:
+        filas = filas.filter(producto_id__in=producto_ids)
+        movs = movs.filter(producto_id__in=producto_ids)
+    filas.delete()
+
+    n, bloque = 0, []
+    for mov in movs.order_by("id").only(*_CAMPOS).iterator(chunk_size=LOTE):
+        bloque.append(mov)
+        if len(bloque) == LOTE:
+            MovimientoDiario.registrar_lote(bloque)
+            n, bloque = n + len(bloque), []
+    MovimientoDiario.registrar_lote(bloque)
+    return n + len(bloque)
+
+
+def kpis(dias=DIAS, hoy=None):
+    """
+    KPIs de los últimos `dias` días (incluido hoy):
+    {"desde", "hasta", "totales", "tipos", "por_dia": [{fecha, total, tipos: {tipo: n}}],
+     "por_bodega": [...], "top_productos": [...]}
+    """
+    hoy = hoy or timezone.localdate()
+    desde = hoy - timedelta(days=dias - 1)
+    qs = MovimientoDiario.objects.filter(fecha__gte=desde, fecha__lte=hoy)
+
+    tipos = [t for t, _ in MovimientoInventario.TIPOS]
+    por_fecha = {}
+    for r in qs.values("fecha", "tipo").annotate(n=Sum("movimientos")).order_by():
+        por_fecha.setdefault(r["fecha"], dict.fromkeys(tipos, 0))[r["tipo"]] = r["n"]
+    por_dia = []
+    for i in range(dias):
+        fecha = desde + timedelta(days=i)
+        conteo = por_fecha.get(fecha, dict.fromkeys(tipos, 0))
+        por_dia.append({"fecha": fecha, "total": sum(conteo.values()), "tipos": conteo})
+
+    por_bodega = list(
+        qs.values("bodega_id", nombre=F("bodega__nombre"))
+        .annotate(entradas=Sum("entradas"), salidas=Sum("salidas"))
+        .order_by("nombre")
+    )
+    top_productos = list(
+        qs.values("producto_id", sku=F("producto__sku"), nombre=F("producto__nombre"))
+        .annotate(unidades=Sum(F("entradas") + F("salidas")), entradas=Sum("entradas"), salidas=Sum("salidas"),
+                  movimientos=Sum("movimientos"))
+        .filter(movimientos__gt=0)
+        .order_by("-unidades", "sku")[:TOP]
+    )
+    return {
+        "desde": desde,
+        "hasta": hoy,
+        "totales": {
+            "hoy": por_dia[-1]["total"] if por_dia else 0,
+            "movimientos": sum(d["total"] for d in por_dia),
+            "entradas": sum((b["entradas"] for b in por_bodega), CERO),
+            "salidas": sum((b["salidas"] for b in por_bodega), CERO),
+        },
+        "tipos": MovimientoInventario.TIPOS,
+        "por_dia": por_dia,
+        "por_bodega": por_bodega,
+        "top_productos": top_productos,
+    }
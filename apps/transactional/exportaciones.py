@@ -0,0 +1,170 @@
+"""
+Exportaciones en segundo plano (cola en BD, sin broker externo).
+
+- `encolar(tipo, formato, parametros, usuario)` crea (o reutiliza) un TrabajoExportacion.
+- `procesar_trabajo(id)` construye el archivo; lo ejecuta el pool de procesos de
+  `manage.py exportaciones_worker`.
+
+Los tipos exportables se declaran en TIPOS: cada uno sabe armar su queryset a partir
+de los parámetros guardados en el trabajo, igual que lo haría la vista.
+"""
+import hashlib
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lilis_erp.exportar import FORMATOS, Workbook, escribir_csv, escribir_xlsx, iterar_filas, nombre_archivo
+
+from .models import TrabajoExportacion
+
+
+def _movimientos(parametros):
+    from .views import COLUMNAS_EXPORT, _movimientos_queryset
+    qs, _sort = _movimientos_queryset(parametros.get("q", ""), parametros.get("sort", "-id"),
+                                      parametros.get("ver", "todos"))
+    return qs, COLUMNAS_EXPORT
+
+
+def _movimientos_simple(parametros):
+    from .views import COLUMNAS_EXPORT_SIMPLE
+    from .models import MovimientoInventario
+    return MovimientoInventario.objects.order_by("-fecha"), COLUMNAS_EXPORT_SIMPLE
+
+
+def _matriz_stock(parametros):
+    from .views import matriz_desde_parametros
+    from .matriz import columnas_export
+    bodegas, qs = matriz_desde_parametros(parametros)
+    return qs, columnas_export(bodegas)
+
+
+# tipo -> (constructor(parametros) -> (queryset, columnas), nombre base, hoja)
+TIPOS = {
+    "movimientos": (_movimientos, "movimientos_inventario", "Movimientos"),
+    "movimientos_simple": (_movimientos_simple, "movimientos", "Movimientos"),
+    "matriz_stock": (_matriz_stock, "stock_por_bodega", "Stock por bodega"),
+}
+
+
+def directorio():
+    ruta = getattr(settings, "EXPORTACIONES_DIR", os.path.join(settings.BASE_DIR, "exportaciones"))
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def huella(tipo, formato, parametros):
+    crudo = json.dumps([tipo, formato, parametros], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def encolar(tipo, formato, parametros, usuario=None):
+    """
+    Devuelve el trabajo a seguir. Si hay uno idéntico pendiente/en curso, o terminado
+    dentro de la ventana EXPORTACIONES_REUSO_MINUTOS, se reutiliza en vez de encolar otro.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de exportación desconocido: {tipo}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    h = huella(tipo, formato, parametros)
+    ventana = timezone.now() - timedelta(minutes=getattr(settings, "EXPORTACIONES_REUSO_MINUTOS", 10))
+    with transaction.atomic():
+        existente = (TrabajoExportacion.objects
+                     .filter(huella=h)
+                     .filter(Q(estado__in=[TrabajoExportacion.ESTADO_PENDIENTE, TrabajoExportacion.ESTADO_PROCESANDO]) |
+                             Q(estado=TrabajoExportacion.ESTADO_LISTO, terminado_en__gte=ventana))
+                     .order_by("-id")
+                     .first())
+        if existente and (existente.estado != TrabajoExportacion.ESTADO_LISTO or _archivo_existe(existente)):
+            return existente, False
+        trabajo = TrabajoExportacion.objects.create(
+            tipo=tipo, formato=formato, parametros=parametros, huella=h,
+            solicitado_por=usuario if getattr(usuario, "is_authenticated", False) else None,
+        )
+    return trabajo, True
+
+
+def ruta_archivo(trabajo):
+    return os.path.join(directorio(), trabajo.archivo)
+
+
+def _archivo_existe(trabajo):
+    return bool(trabajo.archivo) and os.path.exists(ruta_archivo(trabajo))
+
+
+def reclamar(cantidad):
+    """Marca hasta `cantidad` trabajos pendientes como PROCESANDO y devuelve sus ids."""
+    if cantidad <= 0:
+        return []
+    with transaction.atomic():
+        ids = list(TrabajoExportacion.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(estado=TrabajoExportacion.ESTADO_PENDIENTE)
+                   .order_by("id")
+                   .values_list("id", flat=True)[:cantidad])
+        if ids:
+            TrabajoExportacion.objects.filter(id__in=ids).update(
+                estado=TrabajoExportacion.ESTADO_PROCESANDO, iniciado_en=timezone.now()
+            )
+    return ids
+
+
+def procesar_trabajo(trabajo_id):
+    """Construye el archivo del trabajo. Corre dentro de un proceso del pool."""
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+    constructor, base, hoja = TIPOS[trabajo.tipo]
+    nombre = nombre_archivo(base, trabajo.formato)
+    archivo = f"{trabajo.pk}_{nombre}"
+    destino = os.path.join(directorio(), archivo)
+    try:
+        queryset, columnas = constructor(trabajo.parametros or {})
+        filas = iterar_filas(queryset, columnas)
+        if trabajo.formato == "csv":
+            with open(destino, "w", encoding="utf-8", newline="") as fh:
+                escribir_csv(fh, filas, columnas)
+        else:
+            if Workbook is None:
+                raise RuntimeError("Falta dependencia: instala openpyxl (pip install openpyxl)")
+            with open(destino, "wb") as fh:
+                escribir_xlsx(fh, filas, columnas, hoja=hoja)
+    except Exception as e:
+        if os.path.exists(destino):
+            os.remove(destino)
+        TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoExportacion.ESTADO_ERROR, error=str(e), terminado_en=timezone.now()
+        )
+        return trabajo_id, TrabajoExportacion.ESTADO_ERROR
+
+    TrabajoExportacion.objects.filter(pk=trabajo_id).update(
+        estado=TrabajoExportacion.ESTADO_LISTO, archivo=archivo, nombre_descarga=nombre,
+        terminado_en=timezone.now(),
+    )
+    return trabajo_id, TrabajoExportacion.ESTADO_LISTO
+
+
+def recuperar_colgados(minutos=30):
+    """Devuelve a PENDIENTE los trabajos que quedaron PROCESANDO (worker caído)."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TrabajoExportacion.objects.filter(
+        estado=TrabajoExportacion.ESTADO_PROCESANDO, iniciado_en__lt=limite
+    ).update(estado=TrabajoExportacion.ESTADO_PENDIENTE, iniciado_en=None)
+
+
+def purgar(horas=None):
+    """Borra archivos y registros de trabajos terminados hace más de `horas`."""
+    horas = horas if horas is not None else getattr(settings, "EXPORTACIONES_RETENCION_HORAS", 24)
+    limite = timezone.now() - timedelta(hours=horas)
+    viejos = TrabajoExportacion.objects.filter(
+        estado__in=[TrabajoExportacion.ESTADO_LISTO, TrabajoExportacion.ESTADO_ERROR],
+        terminado_en__lt=limite,
+    )
+    for trabajo in viejos.only("id", "archivo").iterator():
+        if trabajo.archivo and os.path.exists(ruta_archivo(trabajo)):
+            os.remove(ruta_archivo(trabajo))
+    return viejos.delete()[0]
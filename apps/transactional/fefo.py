@@ -0,0 +1,175 @@
+"""
+Asignación FEFO (first-expired, first-out) para salidas y transferencias.
+
+`aplicar_a_stock` descuenta exactamente el lote/serie/vencimiento indicado. Aquí
+basta con producto, bodega y cantidad: se recorren las filas de Stock por el índice
+(producto, bodega, fecha_vencimiento, clave) en orden de vencimiento, de a páginas
+(keyset, sin OFFSET), hasta juntar la cantidad. Sólo esas filas se bloquean (en
+orden de clave) y se descuentan; el movimiento se guarda como una línea por lote.
+
+Las transferencias tocan dos bodegas: bloquear primero el origen y después el destino
+haría que A->B y B->A se esperen mutuamente. Por eso se planifican los lotes con una
+lectura sin bloqueo y se aplican con stock.aplicar_movimientos, que bloquea origen y
+destino juntos en el orden fijo de clave; si otro despacho se llevó el saldo entretanto,
+se vuelve a planificar.
+
+Los lotes vencidos no se despachan. Las filas sin vencimiento van al final.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from lilis_erp.reintentos import reintentar_bloqueos
+
+from .models import CierreStock, MovimientoDiario, MovimientoInventario, Stock, StockResumen, StockVencimiento
+from .stock import aplicar_movimientos
+
+CERO = Decimal("0")
+PAGINA = 50
+REPLANIFICAR = 3
+
+
+def _recorrer(qs, orden):
+    """Filas (clave, cantidad, fecha_vencimiento) de `qs` en `orden`, paginando por keyset."""
+    ultimo = None
+    while True:
+        pagina = qs
+        if ultimo is not None:
+            _, _, fecha, clave = ultimo
+            if orden[0] == "fecha_vencimiento":
+                pagina = pagina.filter(Q(fecha_vencimiento__gt=fecha) | Q(fecha_vencimiento=fecha, clave__gt=clave))
+            else:
+                pagina = pagina.filter(clave__gt=clave)
+        filas = list(pagina.order_by(*orden).values_list("pk", "cantidad", "fecha_vencimiento", "clave")[:PAGINA])
+        yield from filas
+        if len(filas) < PAGINA:
+            return
+        ultimo = filas[-1]
+
+
+def candidatas(producto_id, bodega_id, hoy=None):
+    """Filas con saldo en orden FEFO: primero las que vencen (desde hoy), luego las sin vencimiento."""
+    hoy = hoy or timezone.localdate()
+    base = Stock.objects.filter(producto_id=producto_id, bodega_id=bodega_id, cantidad__gt=0)
+    yield from _recorrer(base.filter(fecha_vencimiento__gte=hoy), ("fecha_vencimiento", "clave"))
+    yield from _recorrer(base.filter(fecha_vencimiento__isnull=True), ("clave",))
+
+
+def asignar(producto_id, bodega_id, cantidad):
+    """
+    Descuenta `cantidad` de las filas FEFO del producto en la bodega.
+    Devuelve [(Stock, cantidad_tomada)] en orden de vencimiento. Lanza ValidationError
+    si no alcanza. Debe llamarse dentro de una transacción.
+    """
+    restante = cantidad
+    asignado = []
+    filas = candidatas(producto_id, bodega_id)
+    while restante > 0:
+        # Lectura sin bloqueo hasta cubrir lo que falta; luego se bloquean sólo esas filas.
+        # Si otra transacción las vació entretanto, la ronda siguiente sigue recorriendo.
+        ronda, visto = [], CERO
+        for pk, saldo, _, _ in filas:
+            ronda.append(pk)
+            visto += saldo
+            if visto >= restante:
+                break
+        if not ronda:
+            raise ValidationError("Stock insuficiente para realizar la salida.")
+
+        bloqueadas = {stk.pk: stk for stk in Stock.objects.select_for_update().filter(pk__in=ronda).order_by("clave")}
+        cambiadas = []
+        for pk in ronda:
+            stk = bloqueadas.get(pk)
+            if stk is None or stk.cantidad <= 0:
+                continue
+            tomado = min(stk.cantidad, restante)
+            stk.cantidad -= tomado
+            restante -= tomado
+            asignado.append((stk, tomado))
+            cambiadas.append(stk)
+            if not restante:
+                break
+        Stock.objects.bulk_update(cambiadas, ["cantidad"])
+    return asignado
+
+
+def planificar(producto_id, bodega_id, cantidad):
+    """
+    Como `asignar`, pero sólo lee: [(Stock, cantidad_a_tomar)] en orden FEFO según los
+    saldos vistos. Lanza ValidationError si no alcanza.
+    """
+    restante = cantidad
+    plan = []
+    for pk, saldo, _, _ in candidatas(producto_id, bodega_id):
+        tomado = min(saldo, restante)
+        plan.append((pk, tomado))
+        restante -= tomado
+        if not restante:
+            break
+    if restante > 0:
+        raise ValidationError("Stock insuficiente en bodega de origen.")
+    filas = Stock.objects.in_bulk([pk for pk, _ in plan])
+    return [(filas[pk], tomado) for pk, tomado in plan if pk in filas]
+
+
+def _por_lote(asignado):
+    # Las sub-filas de un producto fragmentado son el mismo lote: una sola línea
+    lineas = OrderedDict()
+    for stk, tomado in asignado:
+        clave = ((stk.lote or "").strip(), (stk.serie or "").strip(), stk.fecha_vencimiento)
+        lineas[clave] = lineas.get(clave, CERO) + tomado
+    return lineas
+
+
+def _movimientos(lineas, tipo, producto, bodega_origen, bodega_destino, proveedor, usuario, observacion):
+    return [
+        MovimientoInventario(
+            tipo=tipo, producto=producto, proveedor=proveedor,
+            bodega_origen=bodega_origen, bodega_destino=bodega_destino,
+            cantidad=tomado, lote=lote or None, serie=serie or None, fecha_vencimiento=fecha,
+            observacion=observacion, creado_por=usuario,
+        )
+        for (lote, serie, fecha), tomado in lineas.items()
+    ]
+
+
+def _transferir(producto, bodega_origen, cantidad, bodega_destino, proveedor, usuario, observacion):
+    for _ in range(REPLANIFICAR):
+        lineas = _por_lote(planificar(producto.pk, bodega_origen.pk, cantidad))
+        movimientos = _movimientos(lineas, MovimientoInventario.TIPO_TRANSFERENCIA, producto, bodega_origen,
+                                   bodega_destino, proveedor, usuario, observacion)
+        guardados, errores = aplicar_movimientos(movimientos)
+        if not errores:
+            return guardados
+        # Otro despacho tomó parte del saldo planificado: se replanifica con lo que quedó
+    raise ValidationError("Stock insuficiente en bodega de origen.")
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def registrar(producto, bodega_origen, cantidad, bodega_destino=None, proveedor=None, usuario=None, observacion=""):
+    """
+    Salida (o transferencia, si hay `bodega_destino`) asignada por FEFO.
+    Devuelve la lista de MovimientoInventario creados, uno por lote.
+    """
+    if cantidad <= 0:
+        raise ValidationError("La cantidad debe ser mayor a cero.")
+    if bodega_destino:
+        if bodega_destino.pk == bodega_origen.pk:
+            raise ValidationError("La transferencia debe ser entre bodegas distintas.")
+        return _transferir(producto, bodega_origen, cantidad, bodega_destino, proveedor, usuario, observacion)
+
+    lineas = _por_lote(asignar(producto.pk, bodega_origen.pk, cantidad))
+    movimientos = _movimientos(lineas, MovimientoInventario.TIPO_SALIDA, producto, bodega_origen, None, proveedor,
+                               usuario, observacion)
+    guardados = MovimientoInventario.objects.bulk_create(movimientos)
+    CierreStock.invalidar_desde(min(m.fecha for m in guardados))
+    if not producto.stock_fragmentado:  # su resumen lo recalcula compactar_stock
+        StockResumen.registrar(producto.pk, bodega_origen.pk, -cantidad)
+        MovimientoDiario.registrar_lote(guardados)
+    StockVencimiento.registrar_lote((producto, bodega_origen.pk, m.fecha_vencimiento, -m.cantidad) for m in movimientos)
+    return guardados
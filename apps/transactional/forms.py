@@ -1,5 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from lilis_erp.reintentos import reintentar_bloqueos
 from .models import MovimientoInventario
 
 class MovimientoInventarioForm(forms.ModelForm):
@@ -8,6 +10,8 @@ class MovimientoInventarioForm(forms.ModelForm):
         fields = "__all__"
 
     def clean(self):
+        if self.instance.solo_libro:
+            raise ValidationError(MovimientoInventario.MENSAJE_SOLO_LIBRO)
         cleaned = super().clean()
         mov = MovimientoInventario(**{f: cleaned.get(f) for f in cleaned})
         # Reutiliza las validaciones del modelo (en español)
@@ -15,7 +19,23 @@ class MovimientoInventarioForm(forms.ModelForm):
         return cleaned
 
     def save(self, commit=True):
-        obj = super().save(commit)
+        # commit=False no toca Stock: quien guarde después debe llamar a save() (ModelAdmin.save_model)
+        if not commit:
+            return super().save(commit=False)
+        if self.instance.pk is None:
+            return self._crear()
+        # Edición: revierte en Stock la versión guardada y aplica la nueva (y guarda el movimiento)
+        obj = super().save(commit=False)
+        obj.guardar_cambios()
+        return obj
+
+    @reintentar_bloqueos
+    @transaction.atomic
+    def _crear(self):
+        # Guardar y aplicar van juntos: si aplicar choca en un deadlock no queda el
+        # movimiento sin stock, y el reintento vuelve a insertarlo (pk de la vuelta revertida).
+        self.instance.pk = None
+        obj = super().save()
         # Aplica el movimiento al stock inmediatamente (empresa real)
         obj.aplicar_a_stock()
         return obj
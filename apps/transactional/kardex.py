@@ -0,0 +1,273 @@
+"""
+Kardex y valorización de inventario (costo promedio ponderado y FIFO).
+
+Por producto se recorren sus movimientos en orden (fecha, id) con iterator(): el
+estado es sólo el saldo y su valor (promedio) o las capas de costo abiertas (FIFO),
+no la lista de movimientos.
+
+- Entradas: INGRESO al costo_unitario del movimiento (o el costo estándar del producto
+  si es un movimiento antiguo sin costo); DEVOLUCION y AJUSTE sin costo entran al
+  costo vigente del kardex.
+- Salidas: SALIDA (y AJUSTE negativo) al costo promedio / consumiendo capas FIFO.
+- TRANSFERENCIA no cambia cantidad ni valor del producto (sólo de bodega).
+
+Caché: cuando el siguiente movimiento cae en un mes posterior se guarda, antes de
+aplicarlo, un KardexCierre con el estado al fin del mes anterior (sólo meses ya
+terminados y no posteriores a `hasta`). Nunca se guarda el estado después del último
+movimiento: podría incluir movimientos posteriores al corte. La consulta siguiente
+parte del último cierre anterior a la fecha pedida y sólo reproduce lo posterior.
+signals.py borra los cierres desde la fecha de un movimiento editado o eliminado (los
+nuevos siempre tienen fecha actual, posterior a todo cierre), así que se recalcula
+desde el primer movimiento que cambió.
+
+valorizar() reparte los productos en un pool de procesos (lilis_erp.procesos).
+"""
+from collections import deque
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.products.models import Producto
+from lilis_erp.procesos import crear_pool
+
+from .models import KardexCierre, MovimientoInventario
+
+CERO = Decimal("0")
+CUATRO = Decimal("0.0001")
+LOTE = 2000
+BLOQUE_PRODUCTOS = 200
+
+PROMEDIO = KardexCierre.METODO_PROMEDIO
+FIFO = KardexCierre.METODO_FIFO
+_CAMPOS = ("id", "fecha", "tipo", "cantidad", "costo_unitario", "bodega_origen_id", "bodega_destino_id")
+
+
+# -------------------------- Métodos de costeo --------------------------
+
+class Promedio:
+    """Costo promedio ponderado: saldo y valor."""
+
+    def __init__(self, cantidad=CERO, valor=CERO, capas=None):
+        self.cantidad, self.valor = Decimal(cantidad), Decimal(valor)
+
+    @property
+    def costo_unitario(self):
+        return (self.valor / self.cantidad).quantize(CUATRO) if self.cantidad > 0 else None
+
+    def entrada(self, cantidad, costo):
+        self.cantidad += cantidad
+        self.valor += cantidad * costo
+        return cantidad * costo
+
+    def salida(self, cantidad):
+        costo = self.costo_unitario or CERO
+        valor = self.valor if cantidad >= self.cantidad else cantidad * costo
+        self.cantidad -= cantidad
+        self.valor -= valor
+        return valor
+
+    def capas(self):
+        return []
+
+
+class Fifo(Promedio):
+    """FIFO: capas [cantidad, costo] de la más antigua a la más nueva."""
+
+    def __init__(self, cantidad=CERO, valor=CERO, capas=None):
+        super().__init__(cantidad, valor)
+        self._capas = deque([Decimal(c), Decimal(k)] for c, k in (capas or []))
+
+    @property
+    def costo_unitario(self):
+        return self._capas[0][1] if self._capas else None
+
+    def entrada(self, cantidad, costo):
+        self.cantidad += cantidad
+        valor = CERO
+        # Si hubo salidas sin stock (capa negativa) la entrada la cubre primero, al costo
+        # con que se valorizó esa salida: el valor sigue siendo la suma de las capas.
+        while cantidad and self._capas and self._capas[0][0] < 0:
+            capa = self._capas[0]
+            cubre = min(cantidad, -capa[0])
+            capa[0] += cubre
+            valor += cubre * capa[1]
+            cantidad -= cubre
+            if not capa[0]:
+                self._capas.popleft()
+        if cantidad:
+            self._capas.append([cantidad, costo])
+            valor += cantidad * costo
+        self.valor += valor
+        return valor
+
+    def salida(self, cantidad):
+        valor = CERO
+        ultimo = self._capas[-1][1] if self._capas else CERO
+        while cantidad and self._capas and self._capas[0][0] > 0:
+            capa = self._capas[0]
+            usa = min(cantidad, capa[0])
+            valor += usa * capa[1]
+            capa[0] -= usa
+            cantidad -= usa
+            self.cantidad -= usa
+            if not capa[0]:
+                self._capas.popleft()
+        if cantidad:  # stock negativo: queda pendiente al último costo conocido
+            valor += cantidad * ultimo
+            self.cantidad -= cantidad
+            self._capas.appendleft([-cantidad, ultimo])
+        self.valor -= valor
+        return valor
+
+    def capas(self):
+        return [[str(c), str(k)] for c, k in self._capas]
+
+
+METODOS = {PROMEDIO: Promedio, FIFO: Fifo}
+
+
+# -------------------------- Recorrido por producto --------------------------
+
+def _inicio_de_mes(fecha):
+    local = timezone.localtime(fecha)
+    return local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _fin_de_mes_anterior(fecha):
+    """Último instante del mes anterior al de `fecha` (hora local)."""
+    return _inicio_de_mes(fecha) - timedelta(microseconds=1)
+
+
+def _punto_de_partida(producto_id, metodo, antes_de):
+    cierre = (KardexCierre.objects.filter(producto_id=producto_id, metodo=metodo, corte__lt=antes_de)
+              .order_by("-corte").first())
+    if not cierre:
+        return METODOS[metodo](), None
+    return METODOS[metodo](cierre.cantidad, cierre.valor, cierre.capas), cierre.corte
+
+
+def _guardar_cierre(producto_id, metodo, corte, estado):
+    try:
+        with transaction.atomic():
+            KardexCierre.objects.create(producto_id=producto_id, metodo=metodo, corte=corte,
+                                        cantidad=estado.cantidad, valor=estado.valor.quantize(CUATRO),
+                                        capas=estado.capas())
+    except IntegrityError:
+        pass  # otro proceso lo guardó primero
+
+
+class Kardex:
+    """
+    Kardex de un producto entre `desde` y `hasta` (datetimes, opcionales).
+
+        k = Kardex(producto, FIFO, desde=..., hasta=...)
+        for fila in k.filas(): ...
+        k.estado.cantidad, k.estado.valor    # saldo a `hasta`
+
+    Lo anterior a `desde` se reproduce sin emitirse, a partir del último cierre de kardex.
+    """
+
+    def __init__(self, producto, metodo=PROMEDIO, desde=None, hasta=None):
+        self.producto = producto
+        self.metodo = metodo
+        self.desde = desde
+        self.hasta = hasta or timezone.now()
+        self.estado = None
+
+    def filas(self):
+        estado, corte = _punto_de_partida(self.producto.pk, self.metodo, self.desde or self.hasta)
+        self.estado = estado
+        # Sólo se cachean meses terminados y no posteriores a lo consultado
+        limite = min(_fin_de_mes_anterior(timezone.now()), self.hasta)
+        ultimo_corte = corte
+        costo_estandar = self.producto.costo_estandar or CERO
+
+        def cerrar_antes_de(fecha):
+            nonlocal ultimo_corte
+            fin = _fin_de_mes_anterior(fecha)
+            if fin <= limite and (ultimo_corte is None or fin > ultimo_corte):
+                _guardar_cierre(self.producto.pk, self.metodo, fin, estado)
+                ultimo_corte = fin
+
+        qs = MovimientoInventario.objects.filter(producto_id=self.producto.pk, fecha__lte=self.hasta)
+        if corte:
+            qs = qs.filter(fecha__gt=corte)
+        ultima_fecha = corte
+        for mov in qs.order_by("fecha", "id").only(*_CAMPOS).iterator(chunk_size=LOTE):
+            if ultima_fecha is not None and _inicio_de_mes(mov.fecha) > _inicio_de_mes(ultima_fecha):
+                cerrar_antes_de(mov.fecha)  # el estado actual vale al fin del mes anterior
+            ultima_fecha = mov.fecha
+
+            c = mov.cantidad
+            entrada = salida = CERO
+            ajuste_negativo = mov.tipo == MovimientoInventario.TIPO_AJUSTE and c < 0
+            if mov.tipo == MovimientoInventario.TIPO_SALIDA or ajuste_negativo:
+                salida = abs(c)
+                valor = -estado.salida(salida)
+            elif mov.tipo in (MovimientoInventario.TIPO_INGRESO, MovimientoInventario.TIPO_DEVOLUCION,
+                              MovimientoInventario.TIPO_AJUSTE):
+                entrada = c
+                if mov.costo_unitario is not None:
+                    costo = mov.costo_unitario
+                elif mov.tipo == MovimientoInventario.TIPO_INGRESO:
+                    costo = costo_estandar
+                else:
+                    costo = estado.costo_unitario or costo_estandar
+                valor = estado.entrada(c, costo)
+            else:
+                valor = CERO  # transferencia: cambia de bodega, no de valor
+
+            if self.desde is None or mov.fecha >= self.desde:
+                yield {
+                    "id": mov.pk, "fecha": mov.fecha, "tipo": mov.tipo,
+                    "bodega_origen_id": mov.bodega_origen_id, "bodega_destino_id": mov.bodega_destino_id,
+                    "entrada": entrada, "salida": salida, "valor": valor.quantize(CUATRO),
+                    "saldo": estado.cantidad, "costo_unitario": estado.costo_unitario,
+                    "valor_saldo": estado.valor.quantize(CUATRO),
+                }
+
+    def saldo(self):
+        """(cantidad, valor, costo_unitario) a `hasta`."""
+        for _ in self.filas():
+            pass
+        return self.estado.cantidad, self.estado.valor.quantize(CUATRO), self.estado.costo_unitario
+
+
+# -------------------------- Valorización --------------------------
+
+def valorizar_bloque(producto_ids, metodo, hasta):
+    """Saldo valorizado de cada producto. Corre dentro de un proceso del pool."""
+    filas = []
+    for producto in Producto.objects.filter(pk__in=producto_ids).only("id", "sku", "nombre", "costo_estandar"):
+        cantidad, valor, costo = Kardex(producto, metodo, hasta=hasta).saldo()
+        if cantidad or valor:
+            filas.append({"producto_id": producto.pk, "sku": producto.sku, "nombre": producto.nombre,
+                          "cantidad": cantidad, "costo_unitario": costo, "valor": valor})
+    return filas
+
+
+def valorizar(metodo=PROMEDIO, hasta=None, producto_ids=None, procesos=1):
+    """
+    Valorización del inventario a `hasta`: filas por producto ordenadas por SKU.
+    Con procesos > 1 los productos se reparten en bloques entre un pool de procesos.
+    """
+    hasta = hasta or timezone.now()
+    qs = Producto.objects.order_by("id")
+    if producto_ids is not None:
+        qs = qs.filter(pk__in=producto_ids)
+    ids = list(qs.values_list("id", flat=True))
+    bloques = [ids[i:i + BLOQUE_PRODUCTOS] for i in range(0, len(ids), BLOQUE_PRODUCTOS)]
+
+    filas = []
+    if procesos > 1 and len(bloques) > 1:
+        with crear_pool(procesos) as pool:
+            for parcial in pool.map(valorizar_bloque, bloques, [metodo] * len(bloques), [hasta] * len(bloques)):
+                filas.extend(parcial)
+    else:
+        for bloque in bloques:
+            filas.extend(valorizar_bloque(bloque, metodo, hasta))
+    filas.sort(key=lambda f: f["sku"])
+    return filas
+
@@ -0,0 +1,168 @@
+"""
+Benchmark: aplicación de stock con bloqueos (cada request aplica su movimiento) vs.
+cola de stock (cada request encola y espera; un worker por partición aplica en serie).
+
+    python manage.py bench_cola --operaciones 2000 --escritores 8 32 --bodegas 4
+
+Cada escritor es un hilo con su propia conexión que registra salidas de 1 unidad sobre
+unos pocos productos calientes de cada bodega, como requests de despacho. Se mide el
+throughput y la latencia de cada salida hasta que el stock quedó aplicado (en modo
+cola: encolar + esperar la confirmación). Los workers de la cola también son hilos.
+Los datos sintéticos se crean con COMMIT (los hilos deben verlos) y se borran al final.
+En SQLite la base completa tiene un solo escritor: los números sólo son
+representativos en MySQL.
+"""
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from apps.products.models import Categoria, Producto
+from apps.transactional import cola, stock
+from apps.transactional.models import (Bodega, ColaStock, MovimientoDiario, MovimientoInventario, Stock,
+                                       StockResumen)
+
+UNO = Decimal("1")
+PRODUCTOS_POR_BODEGA = 4
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = "Compara salidas/s y latencia p99 aplicando stock con bloqueos vs. con la cola de stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operaciones", type=int, default=2000, help="Salidas por corrida (default 2000).")
+        parser.add_argument("--escritores", type=int, nargs="+", default=[8, 32])
+        parser.add_argument("--bodegas", type=int, default=4, help="Bodegas con productos calientes (default 4).")
+        parser.add_argument("--tamano", type=int, default=cola.TAMANO,
+                            help=f"Lotes encolados por transacción del worker (default {cola.TAMANO}).")
+
+    def handle(self, *args, **opts):
+        categoria = Categoria.objects.create(nombre="BENCH COLA")
+        bodegas = [Bodega.objects.create(nombre=f"BENCH COLA {i}") for i in range(opts["bodegas"])]
+        self._colas = []
+        try:
+            inicial = Decimal(opts["operaciones"] * 2 * len(opts["escritores"]))
+            pares = self._productos(categoria, bodegas, inicial)
+            self.stdout.write(f"{'escritores':>10} {'modo':>8} {'salidas/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+                              f"{'errores':>8}")
+            for n in opts["escritores"]:
+                for modo in ("bloqueo", "cola"):
+                    seg, latencias, errores = self._correr(modo, pares, n, opts["operaciones"], opts["tamano"])
+                    self.stdout.write(
+                        f"{n:>10} {modo:>8} {len(latencias) / seg:>10.0f} {_percentil(latencias, 50) * 1000:>8.1f} "
+                        f"{_percentil(latencias, 99) * 1000:>8.1f} {errores:>8}"
+                    )
+            self._verificar(pares, inicial)
+        finally:
+            productos = Producto.objects.filter(categoria=categoria)
+            ColaStock.objects.filter(pk__in=self._colas).delete()
+            MovimientoDiario.objects.filter(producto__in=productos).delete()
+            MovimientoInventario.objects.filter(producto__in=productos).delete()
+            Stock.objects.filter(bodega__in=bodegas).delete()
+            StockResumen.objects.filter(bodega__in=bodegas).delete()
+            productos.delete()
+            for b in bodegas:
+                b.delete()
+            categoria.delete()
+            self.stdout.write("Datos sintéticos borrados.")
+
+    def _productos(self, categoria, bodegas, inicial):
+        pares = []
+        for b in bodegas:
+            for k in range(PRODUCTOS_POR_BODEGA):
+                producto = Producto.objects.create(
+                    sku=f"BCO-{b.pk}-{k}", nombre="Bench cola", categoria=categoria,
+                    costo_estandar=UNO, precio_venta=UNO,
+                )
+                Stock(producto=producto, bodega=b, cantidad=inicial).save()
+                stock.compactar(producto.pk)  # deja StockResumen y stock_total al día
+                pares.append((producto, b))
+        return pares
+
+    def _salida(self, producto, bodega):
+        return MovimientoInventario(tipo=MovimientoInventario.TIPO_SALIDA, producto=producto, bodega_origen=bodega,
+                                    cantidad=UNO)
+
+    def _correr(self, modo, pares, n, operaciones, tamano):
+        cuotas = [operaciones // n + (1 if i < operaciones % n else 0) for i in range(n)]
+        latencias, errores = [[] for _ in range(n)], [0] * n
+        barrera = threading.Barrier(n + 1)
+        fin = threading.Event()
+        colas = [[] for _ in range(n)]
+
+        def escritor(i):
+            rnd = random.Random(i)
+            try:
+                barrera.wait()
+                for _ in range(cuotas[i]):
+                    producto, bodega = rnd.choice(pares)
+                    t0 = time.perf_counter()
+                    try:
+                        if modo == "bloqueo":
+                            with transaction.atomic():
+                                mov = self._salida(producto, bodega)
+                                mov.save()
+                                mov.aplicar_a_stock()
+                        else:
+                            item = cola.encolar([self._salida(producto, bodega)], [0])
+                            colas[i].append(item.pk)
+                            item = cola.esperar(item.pk, 60)
+                            if item.estado != ColaStock.ESTADO_APLICADO or not item.resultado.get("creados"):
+                                errores[i] += 1
+                                continue
+                        latencias[i].append(time.perf_counter() - t0)
+                    except DatabaseError:
+                        errores[i] += 1  # lock wait timeout / deadlock / "database is locked"
+            finally:
+                connection.close()
+
+        def worker(particion):
+            try:
+                while not fin.is_set():
+                    try:
+                        if not cola.procesar(particion, tamano):
+                            time.sleep(0.002)
+                    except DatabaseError:
+                        time.sleep(0.01)  # "database is locked" en SQLite
+            finally:
+                connection.close()
+
+        workers = []
+        if modo == "cola":
+            workers = [threading.Thread(target=worker, args=(p,)) for p in range(settings.STOCK_COLA_PARTICIONES)]
+            for w in workers:
+                w.start()
+        hilos = [threading.Thread(target=escritor, args=(i,)) for i in range(n)]
+        for h in hilos:
+            h.start()
+        barrera.wait()
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - t0
+        fin.set()
+        for w in workers:
+            w.join()
+        self._colas.extend(pk for c in colas for pk in c)
+        return segundos, [x for lat in latencias for x in lat], sum(errores)
+
+    def _verificar(self, pares, inicial):
+        """Cada salida registrada descontó exactamente una unidad, en Stock y en stock_total."""
+        for producto, bodega in pares:
+            producto.refresh_from_db()
+            esperado = inicial - MovimientoInventario.objects.filter(producto=producto).count()
+            fila = Stock.objects.get(producto=producto, bodega=bodega, fragmento=0)
+            if fila.cantidad != esperado or producto.stock_total != esperado:
+                self.stderr.write(f"  {producto.sku}: Stock={fila.cantidad}, stock_total={producto.stock_total}, "
+                                  f"esperado {esperado}")
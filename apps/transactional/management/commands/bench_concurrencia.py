@@ -0,0 +1,104 @@
+"""
+Benchmark: salidas concurrentes sobre un mismo producto×bodega, con stock normal
+(una fila caliente) y con stock fragmentado (Producto.stock_fragmentado).
+
+    python manage.py bench_concurrencia --operaciones 2000 --escritores 1 8 32
+
+Cada escritor es un hilo con su propia conexión y su propia transacción por salida,
+como un request. Los datos sintéticos se crean con COMMIT (los hilos deben verlos) y
+se borran al final. En SQLite la base completa tiene un solo escritor: los números
+sólo son representativos en MySQL.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from apps.products.models import Categoria, Producto
+from apps.transactional import stock
+from apps.transactional.models import Bodega, MovimientoInventario, Stock, StockResumen
+
+UNO = Decimal("1")
+
+
+class Command(BaseCommand):
+    help = "Mide salidas/s concurrentes con stock normal vs fragmentado (datos sintéticos, se borran al final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operaciones", type=int, default=2000, help="Salidas por corrida (default 2000).")
+        parser.add_argument("--escritores", type=int, nargs="+", default=[1, 8, 32])
+
+    def handle(self, *args, **opts):
+        categoria = Categoria.objects.create(nombre="BENCH CONCURRENCIA")
+        bodega = Bodega.objects.create(nombre="BENCH CONCURRENCIA")
+        try:
+            self.stdout.write(f"{'escritores':>10} {'modo':>12} {'salidas/s':>10} {'errores':>8}")
+            for n in opts["escritores"]:
+                for fragmentado in (False, True):
+                    producto = self._producto(categoria, bodega, n, fragmentado, opts["operaciones"])
+                    seg, ok, errores = self._correr(producto, bodega, n, opts["operaciones"])
+                    modo = "fragmentado" if fragmentado else "normal"
+                    self.stdout.write(f"{n:>10} {modo:>12} {ok / seg:>10.0f} {errores:>8}")
+                    self._verificar(producto, opts["operaciones"] * 2, ok)
+        finally:
+            productos = Producto.objects.filter(categoria=categoria)
+            MovimientoInventario.objects.filter(producto__in=productos).delete()
+            Stock.objects.filter(bodega=bodega).delete()
+            StockResumen.objects.filter(bodega=bodega).delete()
+            productos.delete()
+            bodega.delete()
+            categoria.delete()
+            self.stdout.write("Datos sintéticos borrados.")
+
+    def _producto(self, categoria, bodega, n, fragmentado, operaciones):
+        producto = Producto.objects.create(
+            sku=f"BCN-{n}-{'F' if fragmentado else 'N'}", nombre="Bench concurrencia", categoria=categoria,
+            costo_estandar=UNO, precio_venta=UNO, stock_fragmentado=fragmentado,
+        )
+        # Saldo inicial: el doble de lo que se va a sacar, repartido entre las sub-filas
+        partes = Stock.fragmentos() if fragmentado else 1
+        for k in range(partes):
+            Stock(producto=producto, bodega=bodega, fragmento=k,
+                  cantidad=Decimal(operaciones * 2) / partes).save()
+        if not fragmentado:
+            stock.compactar(producto.pk)  # deja StockResumen y stock_total al día
+        return producto
+
+    def _correr(self, producto, bodega, n, operaciones):
+        cuotas = [operaciones // n + (1 if i < operaciones % n else 0) for i in range(n)]
+        ok, errores = [0] * n, [0] * n
+        barrera = threading.Barrier(n + 1)
+
+        def escritor(i):
+            try:
+                barrera.wait()
+                for _ in range(cuotas[i]):
+                    try:
+                        with transaction.atomic():
+                            mov = MovimientoInventario(tipo=MovimientoInventario.TIPO_SALIDA, producto=producto,
+                                                       bodega_origen=bodega, cantidad=UNO)
+                            mov.save()
+                            mov.aplicar_a_stock()
+                        ok[i] += 1
+                    except DatabaseError:
+                        errores[i] += 1  # lock wait timeout / deadlock / "database is locked"
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=escritor, args=(i,)) for i in range(n)]
+        for h in hilos:
+            h.start()
+        barrera.wait()
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.join()
+        return time.perf_counter() - t0, sum(ok), sum(errores)
+
+    def _verificar(self, producto, inicial, ok):
+        stock.compactar(producto.pk)
+        producto.refresh_from_db()
+        esperado = Decimal(inicial - ok)
+        if producto.stock_total != esperado or Stock.objects.filter(producto=producto, fragmento__gt=0).exists():
+            self.stderr.write(f"  {producto.sku}: stock_total={producto.stock_total}, esperado {esperado}")
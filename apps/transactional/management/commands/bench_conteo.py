@@ -0,0 +1,94 @@
+"""
+Benchmark de un conteo cíclico completo (conteos.py) con N líneas.
+
+    python manage.py bench_conteo --lineas 20000
+
+Crea N lotes con stock en una bodega, arma el CSV del conteo (con diferencias en una
+de cada `--cada` líneas, la mitad sobrantes y la mitad faltantes) y mide cada paso:
+abrir (congelar el esperado), leer el archivo, cargar, calcular diferencias y cerrar
+(registrar los ajustes). Todo corre dentro de una transacción que se deshace al final.
+"""
+import csv
+import io
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.products.models import Categoria, Producto
+from apps.transactional import conteos
+from apps.transactional.models import Bodega, Stock
+
+PRODUCTOS = 2000
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide abrir/cargar/cerrar un conteo cíclico de N líneas (datos sintéticos, con rollback)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", type=int, default=20000)
+        parser.add_argument("--cada", type=int, default=10, help="Una línea con diferencia cada N (default 10).")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._ejecutar(opts["lineas"], max(1, opts["cada"]))
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos descartados (rollback).")
+
+    def _paso(self, titulo, funcion, *args, **kwargs):
+        with CaptureQueriesContext(connection) as q:
+            t0 = time.perf_counter()
+            resultado = funcion(*args, **kwargs)
+            segundos = time.perf_counter() - t0
+        self.stdout.write(f"  {titulo:<12} {segundos * 1000:9.1f} ms  ({len(q.captured_queries)} consultas)")
+        return resultado, segundos
+
+    def _ejecutar(self, n, cada):
+        categoria = Categoria.objects.create(nombre="BENCH CONTEO")
+        bodega = Bodega.objects.create(nombre="BENCH CONTEO")
+        n_productos = min(PRODUCTOS, n)
+        Producto.objects.bulk_create([
+            Producto(sku=f"BCN-{i:05d}", nombre=f"Bench conteo {i}", categoria=categoria,
+                     costo_estandar=Decimal("1"), precio_venta=Decimal("1"))
+            for i in range(n_productos)
+        ])
+        productos = list(Producto.objects.filter(categoria=categoria).order_by("sku"))
+        lotes = [(productos[i % n_productos], f"L{i // n_productos:05d}") for i in range(n)]
+        Stock.objects.bulk_create([
+            Stock(clave=Stock.calcular_clave(p.pk, bodega.pk, lote, None, None), producto=p, bodega=bodega,
+                  lote=lote, cantidad=Decimal("100"))
+            for p, lote in lotes
+        ], batch_size=2000)
+
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        escritor.writerow(["sku", "lote", "cantidad"])
+        for i, (p, lote) in enumerate(lotes):
+            contado = Decimal("100")
+            if i % cada == 0:
+                contado += Decimal("3") if (i // cada) % 2 else Decimal("-3")
+            escritor.writerow([p.sku, lote, contado])
+        archivo = salida.getvalue().encode("utf-8")
+        self.stdout.write(f"{n} líneas, {len(archivo) // 1024} KB de CSV, {n_productos} productos")
+
+        total = 0.0
+        conteo, s = self._paso("abrir", conteos.abrir, bodega, categoria=categoria)
+        total += s
+        filas, s = self._paso("leer CSV", conteos.leer_archivo, archivo, "conteo.csv")
+        total += s
+        (_, _, errores), s = self._paso("cargar", conteos.cargar, conteo.pk, filas)
+        total += s
+        difs, s = self._paso("diferencias", lambda: list(conteos.diferencias(conteo).values_list("id", "diferencia")))
+        total += s
+        ajustes, s = self._paso("cerrar", conteos.cerrar, conteo.pk)
+        total += s
+        self.stdout.write(f"  {'total':<12} {total * 1000:9.1f} ms  — {len(difs)} diferencias, "
+                          f"{len(ajustes)} ajustes, {len(errores)} errores")
@@ -0,0 +1,85 @@
+"""
+Benchmark de la asignación FEFO (fefo.py) sobre un producto con miles de lotes.
+
+    python manage.py bench_fefo --lotes 5000
+
+Compara el recorrido por índice (sólo lee y bloquea los lotes que consume) con la
+alternativa ingenua de cargar todos los lotes del producto y ordenarlos en Python.
+Todo corre dentro de una transacción que se deshace al final.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.products.models import Categoria, Producto
+from apps.transactional import fefo
+from apps.transactional.models import Bodega, Stock
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide la asignación FEFO con miles de lotes (datos sintéticos, con rollback)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lotes", type=int, default=5000)
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._ejecutar(opts["lotes"], opts["repeticiones"])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos descartados (rollback).")
+
+    def _ejecutar(self, n, repeticiones):
+        categoria = Categoria.objects.create(nombre="BENCH FEFO")
+        bodega = Bodega.objects.create(nombre="BENCH FEFO")
+        producto = Producto.objects.create(sku="BENCH-FEFO", nombre="Bench FEFO", categoria=categoria,
+                                           costo_estandar=Decimal("1"), precio_venta=Decimal("1"), perecible=True)
+        hoy = timezone.localdate()
+        filas = []
+        for i in range(n):
+            lote, venc = f"L{i:06d}", hoy + timedelta(days=(i * 7919) % 720)  # vencimientos desordenados
+            filas.append(Stock(clave=Stock.calcular_clave(producto.pk, bodega.pk, lote, None, venc),
+                               producto=producto, bodega=bodega, lote=lote, fecha_vencimiento=venc,
+                               cantidad=Decimal("1000")))
+        Stock.objects.bulk_create(filas, batch_size=1000)
+        self.stdout.write(f"{n} lotes")
+
+        for lotes_por_salida in (1, 10, 100):
+            cantidad = Decimal(1000 * lotes_por_salida - 500)
+            with CaptureQueriesContext(connection) as q:
+                t0 = time.perf_counter()
+                for _ in range(repeticiones):
+                    fefo.registrar(producto, bodega, cantidad)
+                t_indice = (time.perf_counter() - t0) / repeticiones
+            consultas = len(q.captured_queries) / repeticiones
+
+            t0 = time.perf_counter()
+            for _ in range(repeticiones):
+                self._ingenuo(producto, bodega, cantidad)
+            t_ingenuo = (time.perf_counter() - t0) / repeticiones
+
+            self.stdout.write(
+                f"  salida de ~{lotes_por_salida:>3} lote(s): índice {t_indice * 1000:7.2f} ms "
+                f"({consultas:.0f} consultas) | todo en memoria {t_ingenuo * 1000:7.2f} ms"
+            )
+
+    def _ingenuo(self, producto, bodega, cantidad):
+        # Referencia: bloquea y lee todos los lotes, ordena en Python (sólo lectura, no descuenta)
+        filas = list(Stock.objects.select_for_update().filter(producto=producto, bodega=bodega, cantidad__gt=0))
+        filas.sort(key=lambda s: (s.fecha_vencimiento is None, s.fecha_vencimiento, s.clave))
+        restante = cantidad
+        for stk in filas:
+            restante -= min(stk.cantidad, restante)
+            if not restante:
+                break
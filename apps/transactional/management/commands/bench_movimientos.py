@@ -0,0 +1,83 @@
+"""
+Benchmark: registrar N movimientos uno a uno (save + aplicar_a_stock por línea)
+contra el registro en lote (stock.aplicar_movimientos).
+
+    python manage.py bench_movimientos --lineas 300
+
+Todo corre dentro de una transacción que se deshace al final. Por eso el camino
+"uno a uno" usa savepoints en vez de COMMIT reales; en producción la diferencia
+es mayor (un fsync y un round trip HTTP por línea).
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.products.models import Categoria, Producto
+from apps.transactional.models import Bodega, MovimientoInventario
+from apps.transactional.stock import aplicar_movimientos
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compara el registro de movimientos uno a uno vs en lote (datos sintéticos, con rollback)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lineas", type=int, default=300)
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._ejecutar(opts["lineas"])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Datos sintéticos descartados (rollback).")
+
+    def _productos(self, prefijo, n, categoria):
+        Producto.objects.bulk_create([
+            Producto(sku=f"{prefijo}-{i:05d}", nombre=f"Bench {prefijo} {i}", categoria=categoria,
+                     costo_estandar=Decimal("1"), precio_venta=Decimal("1"))
+            for i in range(n)
+        ])
+        return list(Producto.objects.filter(sku__startswith=f"{prefijo}-").order_by("sku"))
+
+    def _movimientos(self, productos, bodega):
+        movs = []
+        for i, p in enumerate(productos):
+            movs.append(MovimientoInventario(
+                tipo=MovimientoInventario.TIPO_INGRESO, producto=p, bodega_destino=bodega,
+                cantidad=Decimal("10"), lote=f"L{i % 7}",
+            ))
+        return movs
+
+    def _ejecutar(self, n):
+        categoria = Categoria.objects.create(nombre="BENCH MOVIMIENTOS")
+        bodega = Bodega.objects.create(nombre="BENCH BODEGA")
+        uno = self._movimientos(self._productos("BMU", n, categoria), bodega)
+        lote = self._movimientos(self._productos("BML", n, categoria), bodega)
+
+        with CaptureQueriesContext(connection) as q1:
+            t0 = time.perf_counter()
+            for mov in uno:
+                with transaction.atomic():
+                    mov.save()
+                    mov.aplicar_a_stock()
+            t_uno = time.perf_counter() - t0
+
+        with CaptureQueriesContext(connection) as q2:
+            t0 = time.perf_counter()
+            guardados, errores = aplicar_movimientos(lote)
+            t_lote = time.perf_counter() - t0
+
+        if errores:
+            self.stderr.write(f"Errores inesperados en el lote: {errores}")
+        self.stdout.write(f"{n} líneas")
+        self.stdout.write(f"  uno a uno : {t_uno * 1000:9.1f} ms  {len(q1.captured_queries):6d} consultas")
+        self.stdout.write(f"  en lote   : {t_lote * 1000:9.1f} ms  {len(q2.captured_queries):6d} consultas")
+        if t_lote:
+            self.stdout.write(self.style.SUCCESS(f"  aceleración: x{t_uno / t_lote:.1f}"))
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.transactional import cierres
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda el cierre de stock (producto×bodega×lote) al final del día indicado "
+        "(por defecto ayer). Pensado para cron de madrugada; si el cierre ya existe no hace nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", help="Día a cerrar, AAAA-MM-DD (default: ayer).")
+
+    def handle(self, *args, **opts):
+        if opts["fecha"]:
+            try:
+                dia = date.fromisoformat(opts["fecha"])
+            except ValueError:
+                raise CommandError("Fecha inválida, use AAAA-MM-DD.")
+        else:
+            dia = timezone.localdate() - timedelta(days=1)
+        if dia >= timezone.localdate():
+            raise CommandError("Sólo se pueden cerrar días ya terminados.")
+
+        try:
+            cierre = cierres.cerrar(cierres.fin_del_dia(dia))
+        except ValidationError:
+            self.stdout.write(f"El cierre del {dia} ya existe.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Cierre del {dia}: {cierre.lineas} línea(s), {cierre.movimientos} movimiento(s) reproducidos."
+        ))
@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.transactional import diario, stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Junta las sub-filas de Stock de los productos con stock fragmentado en su fila "
+        "principal y recalcula StockResumen / Producto.stock_total y sus movimientos diarios "
+        "desde ayer. Ejecutar también tras desmarcar stock_fragmentado en un producto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=float, default=0,
+                            help="Segundos entre pasadas; 0 (default) hace una sola pasada.")
+
+    def handle(self, *args, **opts):
+        while True:
+            close_old_connections()
+            productos = stock.pendientes_compactar()
+            borradas = sum(stock.compactar(pid) for pid in productos)  # una transacción por producto
+            if productos:
+                # Sus movimientos no se suman a MovimientoDiario al registrarse (sería otra fila caliente)
+                diario.refrescar(desde=timezone.localdate() - timedelta(days=1), producto_ids=productos)
+            self.stdout.write(f"{len(productos)} producto(s) compactados, {borradas} sub-fila(s) juntadas.")
+            if opts["intervalo"] <= 0:
+                break
+            time.sleep(opts["intervalo"])
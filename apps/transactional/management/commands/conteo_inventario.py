@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.models import Categoria
+from apps.transactional import conteos
+from apps.transactional.models import Bodega, ConteoInventario
+
+
+class Command(BaseCommand):
+    help = (
+        "Conteo cíclico de una bodega: abrir (congela el stock esperado), cargar un CSV/XLSX con lo "
+        "contado, ver las diferencias y cerrar (registra los AJUSTEs en una sola transacción)."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="accion", required=True)
+        abrir = sub.add_parser("abrir", help="Abre un conteo y congela el stock esperado.")
+        abrir.add_argument("--bodega", required=True, help="ID o nombre de la bodega.")
+        abrir.add_argument("--categoria", type=int, help="Sólo los productos de esta categoría (ID).")
+        abrir.add_argument("--observacion", default="")
+
+        cargar = sub.add_parser("cargar", help="Carga las cantidades contadas desde CSV o XLSX.")
+        cargar.add_argument("conteo", type=int)
+        cargar.add_argument("archivo")
+        cargar.add_argument("--parcial", action="store_true", help="Carga las filas válidas aunque haya errores.")
+
+        diferencias = sub.add_parser("diferencias", help="Muestra las diferencias (contado - esperado).")
+        diferencias.add_argument("conteo", type=int)
+        diferencias.add_argument("--no-contadas-en-cero", action="store_true")
+        diferencias.add_argument("--limite", type=int, default=50)
+
+        cerrar = sub.add_parser("cerrar", help="Registra los ajustes y cierra el conteo.")
+        cerrar.add_argument("conteo", type=int)
+        cerrar.add_argument("--no-contadas-en-cero", action="store_true",
+                            help="Conteo completo: lo que no se contó se da de baja.")
+
+    def handle(self, *args, **opts):
+        try:
+            getattr(self, f"_{opts['accion']}")(opts)
+        except ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+
+    def _conteo(self, conteo_id):
+        try:
+            return ConteoInventario.objects.select_related("bodega").get(pk=conteo_id)
+        except ConteoInventario.DoesNotExist:
+            raise CommandError(f"No existe el conteo #{conteo_id}.")
+
+    def _abrir(self, opts):
+        ref = opts["bodega"].strip()
+        bodega = (Bodega.objects.filter(pk=int(ref)).first() if ref.isdigit()
+                  else Bodega.objects.filter(nombre__iexact=ref).first())
+        if not bodega:
+            raise CommandError("Bodega no encontrada.")
+        categoria = None
+        if opts["categoria"]:
+            categoria = Categoria.objects.filter(pk=opts["categoria"]).first()
+            if not categoria:
+                raise CommandError("Categoría no encontrada.")
+        conteo = conteos.abrir(bodega, categoria=categoria, observacion=opts["observacion"])
+        self.stdout.write(self.style.SUCCESS(f"Conteo #{conteo.pk} abierto en {bodega}: {conteo.lineas} línea(s)."))
+
+    def _cargar(self, opts):
+        conteo = self._conteo(opts["conteo"])
+        ruta = Path(opts["archivo"])
+        if not ruta.is_file():
+            raise CommandError(f"No existe el archivo {ruta}.")
+        filas = conteos.leer_archivo(ruta.read_bytes(), ruta.name)
+        cargadas, nuevas, errores = conteos.cargar(conteo.pk, filas, parcial=opts["parcial"])
+        for n, mensaje in sorted(errores.items())[:conteos.MAX_ERRORES]:
+            self.stderr.write(f"  fila {n}: {mensaje}")
+        if errores and not opts["parcial"]:
+            raise CommandError(f"{len(errores)} fila(s) con errores; no se cargó nada (use --parcial).")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(filas)} fila(s): {cargadas} línea(s) actualizadas, {nuevas} nuevas, {len(errores)} con errores."
+        ))
+
+    def _diferencias(self, opts):
+        conteo = self._conteo(opts["conteo"])
+        qs = conteos.diferencias(conteo, opts["no_contadas_en_cero"]).values_list(
+            "producto__sku", "lote", "serie", "fecha_vencimiento", "esperado", "contado", "diferencia")
+        filas = sorted(qs, key=lambda f: abs(f[6]), reverse=True)
+        self.stdout.write(f"{conteo}: {conteo.lineas} línea(s), {conteo.contadas} contada(s), "
+                          f"{len(filas)} con diferencia.")
+        for sku, lote, serie, venc, esperado, contado, diferencia in filas[:opts["limite"]]:
+            self.stdout.write(f"  {sku:<20} {lote or '-':<12} {serie or '-':<12} {venc or '-'!s:<10} "
+                              f"esperado {esperado:>12} contado {contado if contado is not None else '-'!s:>12} "
+                              f"diferencia {diferencia:>+12}")
+
+    def _cerrar(self, opts):
+        conteo = self._conteo(opts["conteo"])
+        ajustes = conteos.cerrar(conteo.pk, no_contadas_en_cero=opts["no_contadas_en_cero"])
+        self.stdout.write(self.style.SUCCESS(f"Conteo #{conteo.pk} cerrado: {len(ajustes)} ajuste(s) registrados."))
@@ -0,0 +1,55 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.transactional import exportaciones
+from lilis_erp.procesos import crear_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de exportaciones en segundo plano: toma trabajos PENDIENTE de la tabla "
+        "TrabajoExportacion y construye los archivos en un pool de procesos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=2, help="Procesos en paralelo (default 2).")
+        parser.add_argument("--intervalo", type=float, default=2.0,
+                            help="Segundos de espera cuando no hay trabajos (default 2).")
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Procesa lo pendiente y termina (útil en cron).")
+
+    def handle(self, *args, **opts):
+        procesos = max(1, opts["procesos"])
+        recuperados = exportaciones.recuperar_colgados()
+        if recuperados:
+            self.stdout.write(f"{recuperados} trabajo(s) colgados devueltos a la cola.")
+
+        ultima_purga = 0.0
+        with crear_pool(procesos) as pool:
+            en_curso = set()
+            while True:
+                close_old_connections()
+                if time.monotonic() - ultima_purga > 3600:
+                    exportaciones.purgar()
+                    ultima_purga = time.monotonic()
+
+                for trabajo_id in exportaciones.reclamar(procesos - len(en_curso)):
+                    en_curso.add(pool.submit(exportaciones.procesar_trabajo, trabajo_id))
+
+                if not en_curso:
+                    if opts["una_vez"]:
+                        break
+                    time.sleep(opts["intervalo"])
+                    continue
+
+                hechos, en_curso = wait(en_curso, timeout=opts["intervalo"], return_when=FIRST_COMPLETED)
+                en_curso = set(en_curso)
+                for fut in hechos:
+                    try:
+                        trabajo_id, estado = fut.result()
+                        self.stdout.write(f"Trabajo #{trabajo_id}: {estado}")
+                    except Exception as e:
+                        self.stderr.write(f"Fallo en proceso de exportación: {e}")
@@ -0,0 +1,46 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.transactional import pronostico
+
+
+class Command(BaseCommand):
+    help = (
+        "Pronostica la demanda diaria de cada producto desde sus SALIDAs (MovimientoDiario) y calcula "
+        "stock de seguridad y punto de reorden con el lead time del proveedor. Con --aplicar actualiza "
+        "Producto.punto_reorden."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metodo", choices=["promedio", "exponencial"], default="exponencial")
+        parser.add_argument("--dias", type=int, default=pronostico.VENTANA,
+                            help=f"Días de historial (default {pronostico.VENTANA}).")
+        parser.add_argument("--alfa", type=float, default=pronostico.ALFA,
+                            help=f"Alfa del suavizamiento exponencial (default {pronostico.ALFA}).")
+        parser.add_argument("--nivel-servicio", type=float, default=pronostico.NIVEL_SERVICIO,
+                            help=f"Probabilidad de no quebrar stock en el lead time (default {pronostico.NIVEL_SERVICIO}).")
+        parser.add_argument("--procesos", type=int, default=4, help="Procesos en paralelo (default 4).")
+        parser.add_argument("--forzar", action="store_true", help="Recalcula también lo ya calculado hoy.")
+        parser.add_argument("--aplicar", action="store_true",
+                            help="Copia el punto de reorden sugerido a los productos con demanda.")
+
+    def handle(self, *args, **opts):
+        if opts["dias"] < 1:
+            raise CommandError("--dias debe ser mayor que 0.")
+        metodo = pronostico.PROMEDIO if opts["metodo"] == "promedio" else pronostico.EXPONENCIAL
+
+        t0 = time.perf_counter()
+        try:
+            calculados, omitidos = pronostico.calcular(
+                metodo, dias=opts["dias"], alfa=opts["alfa"], nivel_servicio=opts["nivel_servicio"],
+                procesos=max(1, opts["procesos"]), forzar=opts["forzar"],
+            )
+        except (ImproperlyConfigured, ValueError) as e:
+            raise CommandError(str(e))
+        mensaje = (f"{calculados} producto(s) pronosticados, {omitidos} ya calculados hoy "
+                   f"({metodo}, {time.perf_counter() - t0:.1f} s).")
+        if opts["aplicar"]:
+            mensaje += f" Punto de reorden actualizado en {pronostico.aplicar()} producto(s)."
+        self.stdout.write(self.style.SUCCESS(mensaje))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.transactional.models import ClaveIdempotencia
+
+LOTE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las claves de idempotencia (respuestas guardadas de peticiones con Idempotency-Key) "
+        "más antiguas que IDEMPOTENCIA_HORAS. Pensado para cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=settings.IDEMPOTENCIA_HORAS,
+                            help=f"Antigüedad mínima a borrar (default {settings.IDEMPOTENCIA_HORAS}).")
+
+    def handle(self, *args, **opts):
+        limite = timezone.now() - timedelta(hours=opts["horas"])
+        viejas = ClaveIdempotencia.objects.filter(creado_en__lt=limite)
+        total = 0
+        # Por lotes de ids: cada DELETE es corto y no bloquea la tabla mientras llegan peticiones
+        while True:
+            ids = list(viejas.values_list("id", flat=True)[:LOTE])
+            if not ids:
+                break
+            total += ClaveIdempotencia.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{total} clave(s) de idempotencia borradas."))
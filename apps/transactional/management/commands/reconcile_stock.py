@@ -0,0 +1,61 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.transactional import conciliacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Concilia Stock contra los movimientos (saldo esperado por producto×bodega×lote) por rangos "
+        "de productos en paralelo. Con --corregir registra AJUSTEs para que el libro explique el stock actual."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=4, help="Procesos en paralelo (default 4).")
+        parser.add_argument("--rango", type=int, default=conciliacion.RANGO,
+                            help=f"Productos por rango (default {conciliacion.RANGO}).")
+        parser.add_argument("--csv", help="Ruta del archivo CSV con todas las diferencias.")
+        parser.add_argument("--limite", type=int, default=50, help="Diferencias a mostrar en pantalla (default 50).")
+        parser.add_argument("--corregir", action="store_true",
+                            help="Registra un AJUSTE por diferencia (no modifica Stock).")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        fh = open(opts["csv"], "w", encoding="utf-8", newline="") if opts["csv"] else None
+        escritor = csv.writer(fh) if fh else None
+        if escritor:
+            escritor.writerow(["producto_id", "bodega_id", "lote", "serie", "fecha_vencimiento", "esperado", "stock", "diferencia"])
+
+        total, ajustes, pendientes = 0, 0, []
+        try:
+            for (p, b, lote, serie, venc), esperado, stock in conciliacion.conciliar(
+                    max(1, opts["procesos"]), max(1, opts["rango"])):
+                total += 1
+                if total <= opts["limite"]:
+                    self.stdout.write(f"producto={p} bodega={b} lote={lote or '-'} serie={serie or '-'} "
+                                      f"vence={venc or '-'}: movimientos={esperado} stock={stock}")
+                if escritor:
+                    escritor.writerow([p, b, lote, serie, venc or "", esperado, stock, stock - esperado])
+                if opts["corregir"]:
+                    pendientes.append(((p, b, lote, serie, venc), esperado, stock))
+                    if len(pendientes) >= conciliacion.LOTE:
+                        ajustes += conciliacion.corregir(pendientes)
+                        pendientes = []
+            if pendientes:
+                ajustes += conciliacion.corregir(pendientes)
+        finally:
+            if fh:
+                fh.close()
+
+        segundos = time.perf_counter() - t0
+        if total > opts["limite"]:
+            self.stdout.write(f"... {total - opts['limite']} diferencia(s) más.")
+        if opts["corregir"]:
+            self.stdout.write(self.style.SUCCESS(f"{total} diferencia(s), {ajustes} AJUSTE(s) registrados ({segundos:.1f} s)."))
+        elif total:
+            raise CommandError(f"{total} diferencia(s) entre Stock y movimientos ({segundos:.1f} s). "
+                               "Usa --corregir para registrar los ajustes.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Stock conciliado con los movimientos ({segundos:.1f} s)."))
@@ -0,0 +1,29 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.transactional import diario
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye MovimientoDiario (KPIs del dashboard) desde los movimientos. "
+        "Sin --desde recorre todo el historial (carga inicial)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Primer día a reconstruir, AAAA-MM-DD (default: todo).")
+
+    def handle(self, *args, **opts):
+        desde = None
+        if opts["desde"]:
+            try:
+                desde = date.fromisoformat(opts["desde"])
+            except ValueError:
+                raise CommandError("Fecha inválida, use AAAA-MM-DD.")
+        t0 = time.perf_counter()
+        n = diario.refrescar(desde=desde)
+        self.stdout.write(self.style.SUCCESS(
+            f"Movimientos diarios reconstruidos: {n} movimiento(s) en {time.perf_counter() - t0:.1f} s."
+        ))
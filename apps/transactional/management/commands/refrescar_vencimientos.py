@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.transactional import vencimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye StockVencimiento (reporte de vencimientos) desde Stock, "
+        "valorizado al costo estándar vigente. Pensado para cron nocturno."
+    )
+
+    def handle(self, *args, **opts):
+        filas = vencimientos.refrescar()
+        self.stdout.write(self.style.SUCCESS(f"Reporte de vencimientos refrescado: {filas} fila(s)."))
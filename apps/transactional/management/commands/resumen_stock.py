@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from apps.products import alertas
+from apps.products.models import Producto
+from apps.transactional.models import Stock, StockResumen
+
+CERO = Decimal("0")
+LOTE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye (o verifica con --verificar) los totales desnormalizados de stock: "
+        "StockResumen por producto×bodega y Producto.stock_total."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verificar", action="store_true",
+                            help="Sólo compara contra Stock y reporta diferencias; no escribe nada.")
+
+    def handle(self, *args, **opts):
+        esperado_bodega = {}
+        esperado_producto = {}
+        filas = (Stock.objects.values_list("producto_id", "bodega_id")
+                 .annotate(total=Sum("cantidad")).order_by())
+        for producto_id, bodega_id, total in filas.iterator(chunk_size=LOTE):
+            total = total or CERO
+            esperado_bodega[(producto_id, bodega_id)] = total
+            esperado_producto[producto_id] = esperado_producto.get(producto_id, CERO) + total
+
+        if opts["verificar"]:
+            self._verificar(esperado_bodega, esperado_producto)
+        else:
+            self._reconstruir(esperado_bodega, esperado_producto)
+
+    def _verificar(self, esperado_bodega, esperado_producto):
+        diferencias = 0
+        # Con stock fragmentado el resumen sólo se pone al día en `compactar_stock`
+        fragmentados = set(Producto.objects.filter(stock_fragmentado=True).values_list("pk", flat=True))
+        pendientes = set()
+        actual_bodega = {
+            (p, b): c for p, b, c in
+            StockResumen.objects.values_list("producto_id", "bodega_id", "cantidad").iterator(chunk_size=LOTE)
+        }
+        for clave in set(esperado_bodega) | set(actual_bodega):
+            esperado = esperado_bodega.get(clave, CERO)
+            actual = actual_bodega.get(clave, CERO)
+            if esperado != actual:
+                if clave[0] in fragmentados:
+                    pendientes.add(clave[0])
+                    continue
+                diferencias += 1
+                self.stdout.write(f"producto={clave[0]} bodega={clave[1]}: resumen={actual} stock={esperado}")
+
+        for producto_id, actual in Producto.objects.values_list("id", "stock_total").iterator(chunk_size=LOTE):
+            esperado = esperado_producto.get(producto_id, CERO)
+            if esperado != actual:
+                if producto_id in fragmentados:
+                    pendientes.add(producto_id)
+                    continue
+                diferencias += 1
+                self.stdout.write(f"producto={producto_id}: stock_total={actual} stock={esperado}")
+
+        if pendientes:
+            self.stdout.write(f"{len(pendientes)} producto(s) con stock fragmentado pendientes de `compactar_stock`.")
+
+        if diferencias:
+            raise CommandError(f"{diferencias} diferencia(s) encontradas. Ejecuta `manage.py resumen_stock` para corregir.")
+        self.stdout.write(self.style.SUCCESS("Resumen de stock consistente."))
+
+    @transaction.atomic
+    def _reconstruir(self, esperado_bodega, esperado_producto):
+        StockResumen.objects.all().delete()
+        StockResumen.objects.bulk_create(
+            (StockResumen(producto_id=p, bodega_id=b, cantidad=c) for (p, b), c in esperado_bodega.items()),
+            batch_size=LOTE,
+        )
+
+        cambios = []
+        for producto_id, actual in Producto.objects.values_list("id", "stock_total").iterator(chunk_size=LOTE):
+            esperado = esperado_producto.get(producto_id, CERO)
+            if esperado != actual:
+                cambios.append(Producto(id=producto_id, stock_total=esperado))
+        Producto.objects.bulk_update(cambios, ["stock_total"], batch_size=LOTE)
+        alertas.invalidar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido: {len(esperado_bodega)} fila(s) producto×bodega, "
+            f"{len(cambios)} producto(s) corregidos."
+        ))
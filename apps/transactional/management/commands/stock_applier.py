@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from apps.transactional import cola
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de stock (STOCK_COLA): aplica en serie los movimientos encolados de una "
+        "partición de bodegas. Debe correr exactamente un worker por partición."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--particion", type=int, required=True,
+                            help=f"Partición a atender, 0..STOCK_COLA_PARTICIONES-1 ({settings.STOCK_COLA_PARTICIONES}).")
+        parser.add_argument("--tamano", type=int, default=cola.TAMANO,
+                            help=f"Lotes encolados por transacción (default {cola.TAMANO}).")
+        parser.add_argument("--intervalo", type=float, default=0.05,
+                            help="Segundos de espera cuando la cola está vacía (default 0.05).")
+        parser.add_argument("--una-vez", action="store_true", help="Procesa lo pendiente y termina.")
+
+    def handle(self, *args, **opts):
+        if not 0 <= opts["particion"] < settings.STOCK_COLA_PARTICIONES:
+            raise CommandError(f"--particion debe estar entre 0 y {settings.STOCK_COLA_PARTICIONES - 1}.")
+        tamano = max(1, opts["tamano"])
+        total, ultima_purga = 0, 0.0
+        while True:
+            close_old_connections()
+            if time.monotonic() - ultima_purga > 3600:
+                cola.purgar()
+                ultima_purga = time.monotonic()
+
+            n = cola.procesar(opts["particion"], tamano)
+            total += n
+            if n:
+                continue
+            if opts["una_vez"]:
+                break
+            time.sleep(opts["intervalo"])
+        self.stdout.write(self.style.SUCCESS(f"{total} lote(s) aplicados en la partición {opts['particion']}."))
@@ -0,0 +1,45 @@
+import csv
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.transactional import cierres, kardex
+
+
+class Command(BaseCommand):
+    help = (
+        "Valoriza el inventario por producto (costo promedio o FIFO) recorriendo el kardex en un "
+        "pool de procesos. Deja guardados los cierres de kardex de los meses terminados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metodo", choices=["promedio", "fifo"], default="promedio")
+        parser.add_argument("--fecha", help="Valorizar al final de este día, AAAA-MM-DD (default: ahora).")
+        parser.add_argument("--procesos", type=int, default=4, help="Procesos en paralelo (default 4).")
+        parser.add_argument("--csv", help="Ruta del archivo CSV con el detalle por producto.")
+
+    def handle(self, *args, **opts):
+        hasta = None
+        if opts["fecha"]:
+            try:
+                hasta = cierres.fin_del_dia(date.fromisoformat(opts["fecha"]))
+            except ValueError:
+                raise CommandError("Fecha inválida, use AAAA-MM-DD.")
+        metodo = kardex.FIFO if opts["metodo"] == "fifo" else kardex.PROMEDIO
+
+        t0 = time.perf_counter()
+        filas = kardex.valorizar(metodo, hasta=hasta, procesos=max(1, opts["procesos"]))
+        segundos = time.perf_counter() - t0
+
+        if opts["csv"]:
+            campos = ["sku", "nombre", "cantidad", "costo_unitario", "valor"]
+            with open(opts["csv"], "w", encoding="utf-8", newline="") as fh:
+                escritor = csv.DictWriter(fh, fieldnames=campos, extrasaction="ignore")
+                escritor.writeheader()
+                escritor.writerows(filas)
+        total = sum((f["valor"] for f in filas), Decimal("0"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(filas)} producto(s) con saldo, valor total {total:.2f} ({metodo}, {segundos:.1f} s)."
+        ))
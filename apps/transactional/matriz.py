@@ -0,0 +1,77 @@
+"""
+Matriz de stock: productos en filas, bodegas en columnas.
+
+Se arma con una sola consulta de agregación condicional sobre StockResumen (los
+totales producto×bodega ya materializados, sin recorrer los lotes de Stock):
+
+    SELECT producto.id, sku, nombre,
+           SUM(CASE WHEN resumen.bodega_id = 1 THEN resumen.cantidad END) AS bodega_1, ...
+    FROM producto LEFT JOIN stock_resumen ... GROUP BY producto.id
+
+La página se pide por keyset sobre el SKU (lilis_erp.paginacion.PaginadorCursor) y
+la exportación recorre el mismo queryset por trozos (lilis_erp.exportar).
+
+Los productos con stock_fragmentado muestran lo que dejó el último compactar_stock.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.products import busqueda
+from lilis_erp.exportar import Columna
+
+from .models import Bodega, Producto
+
+MAX_POR_PAGINA = 500
+_CERO = Value(Decimal("0"), output_field=DecimalField(max_digits=14, decimal_places=3))
+
+
+def columna(bodega_id):
+    return f"bodega_{bodega_id}"
+
+
+def _suma(condicion):
+    return Coalesce(Sum("stock_resumen__cantidad", filter=condicion), _CERO)
+
+
+def bodegas(ids=None):
+    """Bodegas de la matriz (todas o las de `ids`), en orden de nombre."""
+    qs = Bodega.objects.order_by("nombre")
+    return list(qs.filter(pk__in=ids) if ids else qs)
+
+
+def queryset(lista_bodegas, q="", categoria_id=None, con_stock=False, inactivos=False):
+    """
+    Productos anotados con una columna por bodega (columna(id)) y `total` (suma de esas
+    bodegas). `con_stock` deja sólo los que tienen stock en alguna de ellas.
+    """
+    ids = [b.pk for b in lista_bodegas]
+    anotaciones = {columna(b): _suma(Q(stock_resumen__bodega_id=b)) for b in ids}
+    qs = Producto.objects.all() if inactivos else Producto.objects.filter(activo=True)
+    if categoria_id:
+        qs = qs.filter(categoria_id=categoria_id)
+    qs = busqueda.filtrar(qs, q)
+    qs = qs.only("id", "sku", "nombre").annotate(**anotaciones, total=_suma(Q(stock_resumen__bodega_id__in=ids)))
+    if con_stock:
+        qs = qs.filter(total__gt=0)
+    return qs
+
+
+def fila(producto, lista_bodegas):
+    return {
+        "id": producto.pk,
+        "sku": producto.sku,
+        "nombre": producto.nombre,
+        "cantidades": [getattr(producto, columna(b.pk)) for b in lista_bodegas],
+        "total": producto.total,
+    }
+
+
+def columnas_export(lista_bodegas):
+    return [
+        Columna("SKU", "sku"),
+        Columna("Producto", "nombre"),
+        *(Columna(b.nombre, columna(b.pk)) for b in lista_bodegas),
+        Columna("Total", "total"),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def poblar_resumen(apps, schema_editor):
+    Stock = apps.get_model("transactional", "Stock")
+    StockResumen = apps.get_model("transactional", "StockResumen")
+    Producto = apps.get_model("products", "Producto")
+
+    totales = {}
+    filas = Stock.objects.values_list("producto_id", "bodega_id").annotate(total=Sum("cantidad")).order_by()
+    resumen = []
+    for producto_id, bodega_id, total in filas:
+        resumen.append(StockResumen(producto_id=producto_id, bodega_id=bodega_id, cantidad=total or 0))
+        totales[producto_id] = totales.get(producto_id, 0) + (total or 0)
+    StockResumen.objects.bulk_create(resumen, batch_size=2000)
+
+    for producto_id, total in totales.items():
+        Producto.objects.filter(pk=producto_id).update(stock_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_producto_stock_total'),
+        ('transactional', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Cantidad')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_resumen', to='transactional.bodega', verbose_name='Bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_resumen', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen de stock',
+                'verbose_name_plural': 'Resúmenes de stock',
+                'indexes': [models.Index(fields=['bodega', 'producto'], name='transaction_bodega__975ec5_idx')],
+                'unique_together': {('producto', 'bodega')},
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
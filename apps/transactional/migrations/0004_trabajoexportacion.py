@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactional', '0003_stockresumen'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=40, verbose_name='Tipo')),
+                ('formato', models.CharField(default='xlsx', max_length=8, verbose_name='Formato')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=12, verbose_name='Estado')),
+                ('archivo', models.CharField(blank=True, max_length=255, verbose_name='Archivo')),
+                ('nombre_descarga', models.CharField(blank=True, max_length=191, verbose_name='Nombre de descarga')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Creado en')),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado en')),
+                ('terminado_en', models.DateTimeField(blank=True, null=True, verbose_name='Terminado en')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de exportación',
+                'verbose_name_plural': 'Trabajos de exportación',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['estado', 'id'], name='transaction_estado_e7c985_idx'), models.Index(fields=['huella', 'estado', 'terminado_en'], name='transaction_huella_22f232_idx')],
+            },
+        ),
+    ]
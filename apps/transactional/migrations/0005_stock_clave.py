@@ -0,0 +1,62 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def calcular_clave(producto_id, bodega_id, lote, serie, fecha_vencimiento):
+    crudo = "|".join([
+        str(producto_id), str(bodega_id),
+        (lote or "").strip(), (serie or "").strip(),
+        fecha_vencimiento.isoformat() if fecha_vencimiento else "",
+    ])
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def rellenar_clave(apps, schema_editor):
+    """
+    Calcula la clave de cada fila. Las filas duplicadas (mismo producto/bodega/lote/serie/
+    vencimiento con NULL o vacío, que el unique_together no detectaba) se fusionan en la
+    más antigua sumando sus cantidades. El StockResumen no cambia: el total por
+    producto×bodega es el mismo.
+    """
+    Stock = apps.get_model("transactional", "Stock")
+    vistas = {}
+    actualizar, borrar = [], []
+    filas = Stock.objects.order_by("id").only(
+        "id", "producto_id", "bodega_id", "lote", "serie", "fecha_vencimiento", "cantidad"
+    )
+    for stk in filas.iterator(chunk_size=2000):
+        clave = calcular_clave(stk.producto_id, stk.bodega_id, stk.lote, stk.serie, stk.fecha_vencimiento)
+        if clave in vistas:
+            vistas[clave].cantidad += stk.cantidad
+            borrar.append(stk.pk)
+            continue
+        stk.clave = clave
+        vistas[clave] = stk
+        actualizar.append(stk)
+
+    if borrar:
+        for i in range(0, len(borrar), 2000):
+            Stock.objects.filter(pk__in=borrar[i:i + 2000]).delete()
+    Stock.objects.bulk_update(actualizar, ["clave", "cantidad"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactional", "0004_trabajoexportacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stock",
+            name="clave",
+            field=models.CharField(editable=False, max_length=64, null=True, verbose_name="Clave"),
+        ),
+        migrations.RunPython(rellenar_clave, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="stock",
+            name="clave",
+            field=models.CharField(editable=False, max_length=64, unique=True, verbose_name="Clave"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0005_stock_clave'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='stock',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='fragmento',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Fragmento'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stock',
+            unique_together={('producto', 'bodega', 'lote', 'serie', 'fecha_vencimiento', 'fragmento')},
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0006_stock_fragmento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['producto', 'bodega', 'fecha_vencimiento', 'clave'], name='transaction_product_9a4904_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='stock',
+            name='transaction_product_a2afbf_idx',
+        ),
+    ]
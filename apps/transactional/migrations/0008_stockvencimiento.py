@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def rellenar(apps, schema_editor):
+    Stock = apps.get_model("transactional", "Stock")
+    StockVencimiento = apps.get_model("transactional", "StockVencimiento")
+    valor = ExpressionWrapper(F("cantidad") * Coalesce(F("producto__costo_estandar"), Value(0)),
+                              output_field=DecimalField(max_digits=18, decimal_places=4))
+    filas = (Stock.objects.filter(fecha_vencimiento__isnull=False, cantidad__gt=0)
+             .values_list("bodega_id", "producto__categoria_id", "fecha_vencimiento")
+             .annotate(total=Sum("cantidad"), valor=Sum(valor)).order_by())
+    StockVencimiento.objects.bulk_create(
+        [StockVencimiento(bodega_id=b, categoria_id=c, fecha_vencimiento=f, cantidad=t, valor=v or 0)
+         for b, c, f, t, v in filas],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0007_stock_indice_fefo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockVencimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_vencimiento', models.DateField(verbose_name='Fecha de vencimiento')),
+                ('cantidad', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Cantidad')),
+                ('valor', models.DecimalField(decimal_places=4, default=0, max_digits=18, verbose_name='Valor')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vencimientos', to='transactional.bodega', verbose_name='Bodega')),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vencimientos', to='products.categoria', verbose_name='Categoría')),
+            ],
+            options={
+                'verbose_name': 'Stock por vencimiento',
+                'verbose_name_plural': 'Stock por vencimiento',
+                'indexes': [models.Index(fields=['fecha_vencimiento'], name='transaction_fecha_v_097069_idx')],
+                'unique_together': {('bodega', 'categoria', 'fecha_vencimiento')},
+            },
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('suppliers', '0003_proveedor_rut_normalizado'),
+        ('transactional', '0008_stockvencimiento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_corte', models.DateTimeField(unique=True, verbose_name='Fecha de corte')),
+                ('lineas', models.PositiveIntegerField(default=0, verbose_name='Líneas')),
+                ('movimientos', models.PositiveIntegerField(default=0, verbose_name='Movimientos reproducidos')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Creado en')),
+            ],
+            options={
+                'verbose_name': 'Cierre de stock',
+                'verbose_name_plural': 'Cierres de stock',
+                'ordering': ['-fecha_corte'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CierreStockLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(blank=True, max_length=100, verbose_name='Lote')),
+                ('serie', models.CharField(blank=True, max_length=100, verbose_name='Serie')),
+                ('fecha_vencimiento', models.DateField(blank=True, null=True, verbose_name='Fecha de vencimiento')),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Cantidad')),
+            ],
+            options={
+                'verbose_name': 'Línea de cierre de stock',
+                'verbose_name_plural': 'Líneas de cierre de stock',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['fecha'], name='transaction_fecha_e042de_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha'], name='transaction_product_b1151c_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='movimientoinventario',
+            name='transaction_product_66825e_idx',
+        ),
+        migrations.AddField(
+            model_name='cierrestocklinea',
+            name='bodega',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transactional.bodega', verbose_name='Bodega'),
+        ),
+        migrations.AddField(
+            model_name='cierrestocklinea',
+            name='cierre',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalle', to='transactional.cierrestock', verbose_name='Cierre'),
+        ),
+        migrations.AddField(
+            model_name='cierrestocklinea',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.producto', verbose_name='Producto'),
+        ),
+        migrations.AddIndex(
+            model_name='cierrestocklinea',
+            index=models.Index(fields=['cierre', 'producto', 'bodega'], name='transaction_cierre__6bf454_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cierrestocklinea',
+            index=models.Index(fields=['cierre', 'bodega'], name='transaction_cierre__b664eb_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:54
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0009_cierrestock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Costo unitario'),
+        ),
+        migrations.CreateModel(
+            name='KardexCierre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(choices=[('PROMEDIO', 'Costo promedio ponderado'), ('FIFO', 'FIFO')], max_length=10, verbose_name='Método')),
+                ('corte', models.DateTimeField(verbose_name='Corte')),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Cantidad')),
+                ('valor', models.DecimalField(decimal_places=4, max_digits=18, verbose_name='Valor')),
+                ('capas', models.JSONField(blank=True, default=list, verbose_name='Capas FIFO')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kardex_cierres', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Cierre de kardex',
+                'verbose_name_plural': 'Cierres de kardex',
+                'unique_together': {('producto', 'metodo', 'corte')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0010_kardex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('SALIDA', 'Salida'), ('AJUSTE', 'Ajuste'), ('DEVOLUCION', 'Devolución'), ('TRANSFERENCIA', 'Transferencia')], max_length=20, verbose_name='Tipo')),
+                ('entradas', models.DecimalField(decimal_places=3, default=0, max_digits=16, verbose_name='Entradas')),
+                ('salidas', models.DecimalField(decimal_places=3, default=0, max_digits=16, verbose_name='Salidas')),
+                ('movimientos', models.IntegerField(default=0, verbose_name='Movimientos')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_diarios', to='transactional.bodega', verbose_name='Bodega')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_diarios', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Movimientos del día',
+                'verbose_name_plural': 'Movimientos por día',
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='transaction_product_d29513_idx')],
+                'unique_together': {('fecha', 'tipo', 'bodega', 'producto')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0011_movimientodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoDemanda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(choices=[('PROMEDIO', 'Promedio móvil'), ('EXPONENCIAL', 'Suavizamiento exponencial')], max_length=12, verbose_name='Método')),
+                ('ventana_dias', models.PositiveIntegerField(verbose_name='Ventana (días)')),
+                ('alfa', models.DecimalField(blank=True, decimal_places=3, max_digits=4, null=True, verbose_name='Alfa')),
+                ('nivel_servicio', models.DecimalField(decimal_places=3, max_digits=4, verbose_name='Nivel de servicio')),
+                ('demanda_diaria', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Demanda diaria')),
+                ('desviacion_diaria', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Desviación diaria')),
+                ('lead_time_dias', models.PositiveIntegerField(verbose_name='Lead time (días)')),
+                ('stock_seguridad', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Stock de seguridad')),
+                ('punto_reorden', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Punto de reorden sugerido')),
+                ('calculado_en', models.DateTimeField(verbose_name='Calculado en')),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Pronóstico de demanda',
+                'verbose_name_plural': 'Pronósticos de demanda',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactional', '0012_pronosticodemanda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True, verbose_name='Clave')),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella del cuerpo')),
+                ('estado', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código HTTP')),
+                ('tipo_contenido', models.CharField(blank=True, max_length=100, verbose_name='Content-Type')),
+                ('contenido', models.TextField(blank=True, verbose_name='Respuesta')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creado en')),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+            },
+        ),
+    ]
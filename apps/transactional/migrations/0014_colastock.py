@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactional', '0013_claveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('particion', models.PositiveSmallIntegerField(verbose_name='Partición')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APLICADO', 'Aplicado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=10, verbose_name='Estado')),
+                ('movimientos', models.JSONField(default=list, verbose_name='Movimientos')),
+                ('lineas', models.JSONField(default=list, verbose_name='Líneas')),
+                ('parcial', models.BooleanField(default=False, verbose_name='Parcial')),
+                ('resultado', models.JSONField(blank=True, default=dict, verbose_name='Resultado')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Creado en')),
+                ('aplicado_en', models.DateTimeField(blank=True, null=True, verbose_name='Aplicado en')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Movimientos en cola',
+                'verbose_name_plural': 'Cola de stock',
+                'indexes': [models.Index(fields=['particion', 'estado', 'id'], name='transaction_partici_c7e3b6_idx'), models.Index(fields=['estado', 'aplicado_en'], name='transaction_estado_a2ab74_idx')],
+            },
+        ),
+    ]
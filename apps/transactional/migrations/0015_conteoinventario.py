@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_producto_stock_fragmentado'),
+        ('transactional', '0014_colastock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('ABIERTO', 'Abierto'), ('CERRADO', 'Cerrado'), ('ANULADO', 'Anulado')], default='ABIERTO', max_length=10, verbose_name='Estado')),
+                ('observacion', models.TextField(blank=True, verbose_name='Observación')),
+                ('lineas', models.PositiveIntegerField(default=0, verbose_name='Líneas')),
+                ('contadas', models.PositiveIntegerField(default=0, verbose_name='Líneas contadas')),
+                ('ajustes', models.PositiveIntegerField(default=0, verbose_name='Ajustes registrados')),
+                ('creado_en', models.DateTimeField(auto_now_add=True, verbose_name='Creado en (stock congelado)')),
+                ('cerrado_en', models.DateTimeField(blank=True, null=True, verbose_name='Cerrado en')),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='conteos', to='transactional.bodega', verbose_name='Bodega')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='products.categoria', verbose_name='Categoría')),
+                ('cerrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Cerrado por')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Creado por')),
+            ],
+            options={
+                'verbose_name': 'Conteo de inventario',
+                'verbose_name_plural': 'Conteos de inventario',
+                'ordering': ['-creado_en'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConteoLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote', models.CharField(blank=True, max_length=100, verbose_name='Lote')),
+                ('serie', models.CharField(blank=True, max_length=100, verbose_name='Serie')),
+                ('fecha_vencimiento', models.DateField(blank=True, null=True, verbose_name='Fecha de vencimiento')),
+                ('esperado', models.DecimalField(decimal_places=3, default=0, max_digits=14, verbose_name='Esperado')),
+                ('contado', models.DecimalField(blank=True, decimal_places=3, max_digits=14, null=True, verbose_name='Contado')),
+                ('conteo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalle', to='transactional.conteoinventario', verbose_name='Conteo')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Línea de conteo',
+                'verbose_name_plural': 'Líneas de conteo',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='conteoinventario',
+            index=models.Index(fields=['bodega', 'estado'], name='transaction_bodega__ee0c5e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conteolinea',
+            index=models.Index(fields=['conteo', 'producto'], name='transaction_conteo__f3a456_idx'),
+        ),
+    ]
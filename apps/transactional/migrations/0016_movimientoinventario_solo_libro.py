@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+def marcar_conciliaciones(apps, schema_editor):
+    """Los AJUSTEs ya registrados por reconcile_stock --corregir (observación por defecto)."""
+    MovimientoInventario = apps.get_model("transactional", "MovimientoInventario")
+    MovimientoInventario.objects.filter(tipo="AJUSTE", observacion="Conciliación de stock").update(solo_libro=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactional', '0015_conteoinventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='solo_libro',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Sólo libro'),
+        ),
+        migrations.RunPython(marcar_conciliaciones, migrations.RunPython.noop),
+    ]
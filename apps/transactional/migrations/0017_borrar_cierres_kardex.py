@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def borrar_cierres(apps, schema_editor):
+    """
+    Los cierres guardados al terminar cada consulta podían incluir movimientos del mes en
+    curso. Son sólo caché: se vacían y el kardex los vuelve a generar.
+    """
+    apps.get_model("transactional", "KardexCierre").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactional', '0016_movimientoinventario_solo_libro'),
+    ]
+
+    operations = [
+        migrations.RunPython(borrar_cierres, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,17 @@
+import hashlib
+import random
+
 from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.utils import timezone
-from apps.products.models import Producto
+from apps.products import alertas
+from apps.products.models import Categoria, Producto
 from apps.suppliers.models import Proveedor
+from lilis_erp.reintentos import reintentar_bloqueos
+from lilis_erp.upsert import upsert_sumando
 
 
 class Bodega(models.Model):
@@ -23,19 +30,26 @@ class Bodega(models.Model):
 
 
 class Stock(models.Model):
+    # Hash de (producto, bodega, lote, serie, vencimiento) normalizados. El unique_together
+    # no protege las filas con lote/serie NULL (NULL != NULL); esta columna sí.
+    clave = models.CharField("Clave", max_length=64, unique=True, editable=False)
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stocks", verbose_name="Producto")
     bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="stocks", verbose_name="Bodega")
     lote = models.CharField("Lote", max_length=100, blank=True, null=True)
     serie = models.CharField("Serie", max_length=100, blank=True, null=True)
     fecha_vencimiento = models.DateField("Fecha de vencimiento", blank=True, null=True)
     cantidad = models.DecimalField("Cantidad", max_digits=14, decimal_places=3, default=0)
+    # 0 = fila principal. Los productos con stock_fragmentado reparten su stock en
+    # sub-filas 0..STOCK_FRAGMENTOS-1; el stock real es la suma de todas.
+    fragmento = models.PositiveSmallIntegerField("Fragmento", default=0)
 
     class Meta:
         verbose_name = "Stock"
         verbose_name_plural = "Stocks"
-        unique_together = ("producto", "bodega", "lote", "serie", "fecha_vencimiento")
+        unique_together = ("producto", "bodega", "lote", "serie", "fecha_vencimiento", "fragmento")
         indexes = [
-            models.Index(fields=["producto", "bodega"]),
+            # Recorrido FEFO (fefo.py); su prefijo cubre también las consultas por producto×bodega
+            models.Index(fields=["producto", "bodega", "fecha_vencimiento", "clave"]),
             models.Index(fields=["lote"]),
             models.Index(fields=["serie"]),
             models.Index(fields=["fecha_vencimiento"]),
@@ -48,6 +62,168 @@ class Stock(models.Model):
         ref = self.lote or self.serie or "-"
         return f"{self.producto} @ {self.bodega} = {self.cantidad} [{ref}]"
 
+    def save(self, *args, **kwargs):
+        self.clave = self.calcular_clave(self.producto_id, self.bodega_id, self.lote, self.serie,
+                                         self.fecha_vencimiento, self.fragmento)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def calcular_clave(producto_id, bodega_id, lote, serie, fecha_vencimiento, fragmento=0):
+        """sha256 de la tupla normalizada; lote/serie vacíos y NULL son la misma clave."""
+        partes = [
+            str(producto_id), str(bodega_id),
+            (lote or "").strip(), (serie or "").strip(),
+            fecha_vencimiento.isoformat() if fecha_vencimiento else "",
+        ]
+        if fragmento:
+            partes.append(f"f{fragmento}")  # la fila principal conserva la clave de siempre
+        return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def fragmentos():
+        return max(1, getattr(settings, "STOCK_FRAGMENTOS", 8))
+
+    @classmethod
+    def claves_fragmentos(cls, producto_id, bodega_id, lote, serie, fecha_vencimiento):
+        return [cls.calcular_clave(producto_id, bodega_id, lote, serie, fecha_vencimiento, k)
+                for k in range(cls.fragmentos())]
+
+    @classmethod
+    def sumar(cls, producto_id, bodega_id, lote, serie, fecha_vencimiento, delta, fragmentado=False):
+        """
+        Suma `delta` (>= 0) creando la fila si no existe: un solo INSERT ... ON DUPLICATE KEY UPDATE.
+        Con `fragmentado` cae en una sub-fila al azar (escritores concurrentes no chocan).
+        """
+        fragmento = random.randrange(cls.fragmentos()) if fragmentado else 0
+        upsert_sumando(cls, [{
+            "clave": cls.calcular_clave(producto_id, bodega_id, lote, serie, fecha_vencimiento, fragmento),
+            "producto_id": producto_id, "bodega_id": bodega_id,
+            "lote": lote, "serie": serie, "fecha_vencimiento": fecha_vencimiento,
+            "fragmento": fragmento, "cantidad": delta,
+        }], conflicto="clave", sumar=["cantidad"])
+
+    @classmethod
+    def descontar(cls, producto_id, bodega_id, lote, serie, fecha_vencimiento, delta, fragmentado=False):
+        """
+        Resta `delta` sólo si alcanza (UPDATE ... WHERE cantidad >= delta).
+        Devuelve False si no hay fila o el saldo es insuficiente; no lee antes de escribir.
+
+        Con `fragmentado` intenta primero una sub-fila al azar; si ésa no alcanza, bloquea
+        todas las sub-filas (en orden de clave) y reparte el descuento. Ninguna queda en
+        negativo, así que el total tampoco.
+        """
+        if not fragmentado:
+            clave = cls.calcular_clave(producto_id, bodega_id, lote, serie, fecha_vencimiento)
+            return bool(cls.objects.filter(clave=clave, cantidad__gte=delta).update(cantidad=F("cantidad") - delta))
+
+        claves = cls.claves_fragmentos(producto_id, bodega_id, lote, serie, fecha_vencimiento)
+        if cls.objects.filter(clave=random.choice(claves), cantidad__gte=delta).update(cantidad=F("cantidad") - delta):
+            return True
+        filas = list(cls.objects.select_for_update().filter(clave__in=claves).order_by("clave"))
+        if sum(f.cantidad for f in filas) < delta:
+            return False
+        restante = delta
+        for fila in sorted(filas, key=lambda f: f.cantidad, reverse=True):
+            tomado = min(fila.cantidad, restante)
+            fila.cantidad -= tomado
+            restante -= tomado
+            if not restante:
+                break
+        cls.objects.bulk_update(filas, ["cantidad"])
+        return True
+
+
+class StockResumen(models.Model):
+    """
+    Total desnormalizado por producto×bodega (suma de Stock sin distinguir lote/serie).
+    Se actualiza en la misma transacción que el Stock; `manage.py resumen_stock` lo reconstruye.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stock_resumen", verbose_name="Producto")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="stock_resumen", verbose_name="Bodega")
+    cantidad = models.DecimalField("Cantidad", max_digits=14, decimal_places=3, default=0)
+
+    class Meta:
+        verbose_name = "Resumen de stock"
+        verbose_name_plural = "Resúmenes de stock"
+        unique_together = ("producto", "bodega")
+        indexes = [
+            models.Index(fields=["bodega", "producto"]),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} @ {self.bodega} = {self.cantidad}"
+
+    @classmethod
+    def registrar(cls, producto_id, bodega_id, delta):
+        """Suma `delta` al resumen producto×bodega y al total del producto."""
+        cls.registrar_lote({(producto_id, bodega_id): delta})
+
+    @classmethod
+    def registrar_lote(cls, deltas):
+        """
+        Versión en lote de `registrar`: deltas = {(producto_id, bodega_id): delta}.
+        Un solo upsert sumando (crea los resúmenes que falten), sin SELECT ... FOR UPDATE previo.
+        """
+        deltas = {par: d for par, d in deltas.items() if d}
+        if not deltas:
+            return
+        upsert_sumando(cls, [
+            {"producto_id": p, "bodega_id": b, "cantidad": d} for (p, b), d in sorted(deltas.items())
+        ], conflicto=("producto", "bodega"), sumar=["cantidad"])
+
+        por_producto = {}
+        for (producto_id, _), d in deltas.items():
+            por_producto[producto_id] = por_producto.get(producto_id, 0) + d
+        Producto.objects.bulk_update(
+            [Producto(pk=pid, stock_total=F("stock_total") + d) for pid, d in sorted(por_producto.items()) if d],
+            ["stock_total"],
+        )
+        alertas.invalidar()
+
+
+class StockVencimiento(models.Model):
+    """
+    Stock con vencimiento agregado por bodega × categoría × fecha, valorizado a
+    Producto.costo_estandar. Alimenta el reporte de vencimientos (vencimientos.py): los
+    tramos (vencido, ≤7, ≤30, ≤90 días) se suman sobre esta tabla chica al consultar.
+    aplicar_a_stock le suma los deltas; `manage.py refrescar_vencimientos` la reconstruye
+    cada noche (toma los cambios de costo y los productos con stock fragmentado).
+    """
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="vencimientos", verbose_name="Bodega")
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="vencimientos", verbose_name="Categoría")
+    fecha_vencimiento = models.DateField("Fecha de vencimiento")
+    cantidad = models.DecimalField("Cantidad", max_digits=14, decimal_places=3, default=0)
+    valor = models.DecimalField("Valor", max_digits=18, decimal_places=4, default=0)
+
+    class Meta:
+        verbose_name = "Stock por vencimiento"
+        verbose_name_plural = "Stock por vencimiento"
+        unique_together = ("bodega", "categoria", "fecha_vencimiento")
+        indexes = [
+            models.Index(fields=["fecha_vencimiento"]),
+        ]
+
+    def __str__(self):
+        return f"{self.bodega} / {self.categoria} vence {self.fecha_vencimiento}: {self.cantidad}"
+
+    @classmethod
+    def registrar_lote(cls, deltas):
+        """
+        deltas = [(producto, bodega_id, fecha_vencimiento, delta)], con un solo upsert.
+        Se ignoran los sin vencimiento y los productos con stock fragmentado (los toma el refresco).
+        """
+        agrupados = {}
+        for producto, bodega_id, fecha, delta in deltas:
+            if not fecha or not delta or producto.stock_fragmentado:
+                continue
+            par = (bodega_id, producto.categoria_id, fecha)
+            cantidad, valor = agrupados.get(par, (0, 0))
+            agrupados[par] = (cantidad + delta, valor + delta * (producto.costo_estandar or 0))
+        upsert_sumando(cls, [
+            {"bodega_id": b, "categoria_id": c, "fecha_vencimiento": f, "cantidad": cantidad, "valor": valor}
+            for (b, c, f), (cantidad, valor) in sorted(agrupados.items())
+        ], conflicto=("bodega", "categoria", "fecha_vencimiento"), sumar=["cantidad", "valor"])
+
 
 class MovimientoInventario(models.Model):
     TIPO_INGRESO = "INGRESO"
@@ -76,8 +252,16 @@ class MovimientoInventario(models.Model):
     serie = models.CharField("Serie", max_length=100, blank=True, null=True)
     fecha_vencimiento = models.DateField("Fecha de vencimiento", blank=True, null=True)
 
+    # Costo de los ingresos; si no se indica se toma el costo estándar vigente al registrar.
+    # Las devoluciones y ajustes sin costo entran al costo vigente del kardex (kardex.py).
+    costo_unitario = models.DecimalField("Costo unitario", max_digits=12, decimal_places=4, null=True, blank=True,
+                                         validators=[MinValueValidator(0)])
+
     observacion = models.TextField("Observación", blank=True)
     creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Creado por")
+    # AJUSTE de conciliación (conciliacion.corregir): completa el libro sin haber pasado por
+    # Stock, así que no tiene efecto que revertir; no se edita ni se elimina.
+    solo_libro = models.BooleanField("Sólo libro", default=False, editable=False)
 
     class Meta:
         ordering = ["-fecha"]
@@ -85,7 +269,9 @@ class MovimientoInventario(models.Model):
         verbose_name_plural = "Movimientos de inventario"
         indexes = [
             models.Index(fields=["tipo", "fecha"]),
-            models.Index(fields=["producto"]),
+            # Reproducción de movimientos desde un cierre (cierres.py), en orden de fecha
+            models.Index(fields=["fecha"]),
+            models.Index(fields=["producto", "fecha"]),
             models.Index(fields=["bodega_origen"]),
             models.Index(fields=["bodega_destino"]),
             models.Index(fields=["lote"]),
@@ -95,6 +281,14 @@ class MovimientoInventario(models.Model):
     def __str__(self):
         return f"{self.tipo} {self.producto} {self.cantidad}"
 
+    def fijar_costo(self):
+        if self.costo_unitario is None and self.tipo == self.TIPO_INGRESO:
+            self.costo_unitario = self.producto.costo_estandar
+
+    def save(self, *args, **kwargs):
+        self.fijar_costo()
+        super().save(*args, **kwargs)
+
     # Validaciones de negocio (coherencia)
     def clean(self):
         if self.tipo in (self.TIPO_INGRESO, self.TIPO_DEVOLUCION) and not self.bodega_destino:
@@ -112,42 +306,456 @@ class MovimientoInventario(models.Model):
         if self.bodega_origen and self.bodega_destino and self.bodega_origen_id == self.bodega_destino_id and self.tipo == self.TIPO_TRANSFERENCIA:
             raise ValidationError("La transferencia debe ser entre bodegas distintas.")
 
+    MENSAJES_INSUFICIENTE = {
+        TIPO_SALIDA: "Stock insuficiente para realizar la salida.",
+        TIPO_AJUSTE: "El ajuste no puede dejar el stock en negativo.",
+        TIPO_TRANSFERENCIA: "Stock insuficiente en bodega de origen.",
+    }
+    MENSAJE_REVERSION = "No se puede modificar el movimiento: el stock que aportó ya no está disponible."
+    MENSAJE_SOLO_LIBRO = "El movimiento es un ajuste de conciliación (sólo libro): no se puede modificar ni eliminar."
+
+    def efectos(self):
+        """[(bodega_id, delta)] que el movimiento aplica sobre Stock."""
+        c = self.cantidad
+        if self.tipo in (self.TIPO_INGRESO, self.TIPO_DEVOLUCION):
+            return [(self.bodega_destino_id, c)]
+        if self.tipo == self.TIPO_SALIDA:
+            return [(self.bodega_origen_id, -c)]
+        if self.tipo == self.TIPO_AJUSTE:
+            return [(self.bodega_destino_id or self.bodega_origen_id, c)]
+        if self.tipo == self.TIPO_TRANSFERENCIA:
+            return [(self.bodega_origen_id, -c), (self.bodega_destino_id, c)]
+        return []
+
+    def _cambios(self, signo=1):
+        """[(clave de Stock, delta)] del movimiento; signo=-1 da los que lo revierten."""
+        return [((self.producto_id, b, self.lote, self.serie, self.fecha_vencimiento), signo * d)
+                for b, d in self.efectos()]
+
+    @staticmethod
+    def _aplicar_cambios(cambios, productos, mensaje):
+        """
+        Aplica los deltas netos por clave de Stock. Cada cambio es un solo statement sobre
+        la fila (Stock.sumar / Stock.descontar): sin SELECT ... FOR UPDATE ni
+        read-modify-write. Las filas se tocan en orden de clave y los resúmenes en orden de
+        producto×bodega: dos movimientos opuestos (A->B y B->A) no se bloquean mutuamente.
+
+        Productos con stock_fragmentado: se escribe en una sub-fila al azar y no se toca
+        StockResumen (sería de nuevo una sola fila caliente); `compactar_stock` lo recalcula.
+        """
+        netos = {}
+        for k, d in cambios:
+            netos[k] = netos.get(k, 0) + d
+        netos = sorted(((k, d) for k, d in netos.items() if d),
+                       key=lambda kd: Stock.calcular_clave(*kd[0]))
+        for k, d in netos:
+            fragmentado = productos[k[0]].stock_fragmentado
+            if d > 0:
+                Stock.sumar(*k, d, fragmentado=fragmentado)
+            elif not Stock.descontar(*k, -d, fragmentado=fragmentado):
+                raise ValidationError(mensaje)
+
+        normales = [(k, d) for k, d in netos if not productos[k[0]].stock_fragmentado]
+        por_par = {}
+        for k, d in normales:
+            por_par[(k[0], k[1])] = por_par.get((k[0], k[1]), 0) + d
+        StockResumen.registrar_lote(por_par)
+        StockVencimiento.registrar_lote((productos[k[0]], k[1], k[4], d) for k, d in normales)
+
+    @reintentar_bloqueos
+    @transaction.atomic
+    def registrar(self):
+        """
+        Guarda el movimiento nuevo y lo aplica a Stock en la misma transacción: si aplicar
+        falla no queda el movimiento sin stock, y el reintento vuelve a insertarlo.
+        """
+        self.pk = None
+        self.save()
+        self.aplicar_a_stock()
+        return self
+
+    @reintentar_bloqueos
     @transaction.atomic
     def aplicar_a_stock(self):
-        """Aplica el movimiento al stock con transacción y bloqueo de filas."""
-        def clave(bod):
-            return dict(producto=self.producto, bodega=bod, lote=self.lote, serie=self.serie, fecha_vencimiento=self.fecha_vencimiento)
+        """Aplica el movimiento al stock y lo suma al resumen diario."""
+        self._aplicar_cambios(self._cambios(), {self.producto_id: self.producto},
+                              self.MENSAJES_INSUFICIENTE.get(self.tipo, "Stock insuficiente."))
+        if not self.producto.stock_fragmentado:  # lo toma compactar_stock
+            MovimientoDiario.registrar_lote([self])
 
-        if self.tipo in (self.TIPO_INGRESO, self.TIPO_DEVOLUCION):
-            stk, _ = Stock.objects.select_for_update().get_or_create(**clave(self.bodega_destino))
-            stk.cantidad = (stk.cantidad or 0) + self.cantidad
-            stk.save()
-            return
+    @reintentar_bloqueos
+    @transaction.atomic
+    def guardar_cambios(self):
+        """
+        Guarda el movimiento editado corrigiendo Stock en la misma transacción: se revierte
+        el efecto de la versión guardada y se aplica el de la nueva, como un único delta
+        neto por fila (editar la cantidad de 10 a 12 es un +2 sobre una fila).
+        La fila del movimiento se bloquea para que dos ediciones no reviertan la misma versión.
+        """
+        anterior = MovimientoInventario.objects.select_for_update().select_related("producto").get(pk=self.pk)
+        if anterior.solo_libro:
+            raise ValidationError(self.MENSAJE_SOLO_LIBRO)
+        productos = {anterior.producto_id: anterior.producto, self.producto_id: self.producto}
+        self._aplicar_cambios(anterior._cambios(-1) + self._cambios(), productos, self.MENSAJE_REVERSION)
+        self.save()
+        for mov, signo in ((anterior, -1), (self, 1)):
+            if not mov.producto.stock_fragmentado:  # lo toma compactar_stock
+                MovimientoDiario.registrar_lote([mov], signo)
 
-        if self.tipo == self.TIPO_SALIDA:
-            stk = Stock.objects.select_for_update().get_or_create(**clave(self.bodega_origen))[0]
-            if stk.cantidad < self.cantidad:
-                raise ValidationError("Stock insuficiente para realizar la salida.")
-            stk.cantidad -= self.cantidad
-            stk.save()
-            return
+    @reintentar_bloqueos
+    @transaction.atomic
+    def eliminar(self):
+        """Elimina el movimiento revirtiendo su efecto sobre Stock."""
+        actual = MovimientoInventario.objects.select_for_update().select_related("producto").get(pk=self.pk)
+        if actual.solo_libro:
+            raise ValidationError(self.MENSAJE_SOLO_LIBRO)
+        self._aplicar_cambios(actual._cambios(-1), {actual.producto_id: actual.producto}, self.MENSAJE_REVERSION)
+        if not actual.producto.stock_fragmentado:
+            MovimientoDiario.registrar_lote([actual], signo=-1)
+        self.delete()
 
-        if self.tipo == self.TIPO_AJUSTE:
-            bod = self.bodega_destino or self.bodega_origen
-            stk, _ = Stock.objects.select_for_update().get_or_create(**clave(bod))
-            nuevo = (stk.cantidad or 0) + self.cantidad
-            if nuevo < 0:
-                raise ValidationError("El ajuste no puede dejar el stock en negativo.")
-            stk.cantidad = nuevo
-            stk.save()
-            return
 
-        if self.tipo == self.TIPO_TRANSFERENCIA:
-            origen = Stock.objects.select_for_update().get_or_create(**clave(self.bodega_origen))[0]
-            if origen.cantidad < self.cantidad:
-                raise ValidationError("Stock insuficiente en bodega de origen.")
-            destino, _ = Stock.objects.select_for_update().get_or_create(**clave(self.bodega_destino))
-            origen.cantidad -= self.cantidad
-            destino.cantidad = (destino.cantidad or 0) + self.cantidad
-            origen.save(); destino.save()
-            return
+class TrabajoExportacion(models.Model):
+    """
+    Cola (tabla) de exportaciones en segundo plano. La vista encola, el comando
+    `manage.py exportaciones_worker` construye el archivo y la vista de descarga lo sirve.
+    """
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_PROCESANDO = "PROCESANDO"
+    ESTADO_LISTO = "LISTO"
+    ESTADO_ERROR = "ERROR"
+    ESTADOS = (
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_PROCESANDO, "Procesando"),
+        (ESTADO_LISTO, "Listo"),
+        (ESTADO_ERROR, "Error"),
+    )
+
+    tipo = models.CharField("Tipo", max_length=40)
+    formato = models.CharField("Formato", max_length=8, default="xlsx")
+    parametros = models.JSONField("Parámetros", default=dict, blank=True)
+    # sha256 de (tipo, formato, parámetros): mismos parámetros -> se reutiliza el archivo
+    huella = models.CharField("Huella", max_length=64)
+    estado = models.CharField("Estado", max_length=12, choices=ESTADOS, default=ESTADO_PENDIENTE)
+    archivo = models.CharField("Archivo", max_length=255, blank=True)
+    nombre_descarga = models.CharField("Nombre de descarga", max_length=191, blank=True)
+    error = models.TextField("Error", blank=True)
+
+    solicitado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                       verbose_name="Solicitado por")
+    creado_en = models.DateTimeField("Creado en", auto_now_add=True)
+    iniciado_en = models.DateTimeField("Iniciado en", null=True, blank=True)
+    terminado_en = models.DateTimeField("Terminado en", null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        verbose_name = "Trabajo de exportación"
+        verbose_name_plural = "Trabajos de exportación"
+        indexes = [
+            models.Index(fields=["estado", "id"]),
+            models.Index(fields=["huella", "estado", "terminado_en"]),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}.{self.formato} #{self.pk} [{self.estado}]"
+
+
+class CierreStock(models.Model):
+    """
+    Foto del stock por producto×bodega×lote al `fecha_corte` (cierre de período).
+    La escribe `manage.py cerrar_stock`; cierres.stock_al() parte del cierre anterior más
+    cercano y reproduce sólo los movimientos posteriores. Crear, editar o borrar un
+    movimiento con fecha <= fecha_corte lo elimina (invalidar_desde, signals.py).
+    """
+    fecha_corte = models.DateTimeField("Fecha de corte", unique=True)
+    lineas = models.PositiveIntegerField("Líneas", default=0)
+    movimientos = models.PositiveIntegerField("Movimientos reproducidos", default=0)
+    creado_en = models.DateTimeField("Creado en", auto_now_add=True)
+
+    class Meta:
+        ordering = ["-fecha_corte"]
+        verbose_name = "Cierre de stock"
+        verbose_name_plural = "Cierres de stock"
+
+    def __str__(self):
+        return f"Cierre al {timezone.localtime(self.fecha_corte):%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def invalidar_desde(cls, fecha):
+        """
+        Borra los cierres con corte >= `fecha` (y sus líneas): un movimiento de esa fecha
+        se creó, editó o eliminó. Primero una lectura simple, así el caso normal (ningún
+        cierre posterior) no toma bloqueos sobre la tabla.
+        """
+        cierres = cls.objects.filter(fecha_corte__gte=fecha)
+        if cierres.exists():
+            CierreStockLinea.objects.filter(cierre__in=cierres).delete()
+            cierres.delete()
+
+
+class CierreStockLinea(models.Model):
+    cierre = models.ForeignKey(CierreStock, on_delete=models.CASCADE, related_name="detalle", verbose_name="Cierre")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+", verbose_name="Producto")
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="+", verbose_name="Bodega")
+    lote = models.CharField("Lote", max_length=100, blank=True)
+    serie = models.CharField("Serie", max_length=100, blank=True)
+    fecha_vencimiento = models.DateField("Fecha de vencimiento", blank=True, null=True)
+    cantidad = models.DecimalField("Cantidad", max_digits=14, decimal_places=3)
+
+    class Meta:
+        verbose_name = "Línea de cierre de stock"
+        verbose_name_plural = "Líneas de cierre de stock"
+        indexes = [
+            models.Index(fields=["cierre", "producto", "bodega"]),
+            models.Index(fields=["cierre", "bodega"]),
+        ]
+
+
+class KardexCierre(models.Model):
+    """
+    Estado del kardex de un producto al cierre de un mes ya terminado (cantidad, valor y,
+    para FIFO, las capas de costo). kardex.py parte del último cierre válido en vez de
+    recorrer todos los movimientos; editar o borrar un movimiento elimina los cierres
+    desde su fecha (signals.py), que se vuelven a calcular en la próxima consulta.
+    """
+    METODO_PROMEDIO = "PROMEDIO"
+    METODO_FIFO = "FIFO"
+    METODOS = (
+        (METODO_PROMEDIO, "Costo promedio ponderado"),
+        (METODO_FIFO, "FIFO"),
+    )
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="kardex_cierres", verbose_name="Producto")
+    metodo = models.CharField("Método", max_length=10, choices=METODOS)
+    corte = models.DateTimeField("Corte")
+    cantidad = models.DecimalField("Cantidad", max_digits=14, decimal_places=3)
+    valor = models.DecimalField("Valor", max_digits=18, decimal_places=4)
+    capas = models.JSONField("Capas FIFO", default=list, blank=True)
+
+    class Meta:
+        verbose_name = "Cierre de kardex"
+        verbose_name_plural = "Cierres de kardex"
+        unique_together = ("producto", "metodo", "corte")
+
+    def __str__(self):
+        return f"{self.producto} {self.metodo} al {self.corte:%Y-%m}"
+
+
+class MovimientoDiario(models.Model):
+    """
+    Movimientos agregados por día × tipo × bodega × producto: unidades que entran y salen
+    de la bodega y cuántos movimientos hubo. Alimenta los KPIs del dashboard (diario.py).
+    Se suma en la misma transacción que el movimiento (`registrar_lote`);
+    `manage.py refrescar_movimientos_diarios` la reconstruye.
+
+    `movimientos` se cuenta en la primera bodega del movimiento (el origen en las
+    transferencias): la suma por día y tipo no cuenta dos veces una transferencia.
+    """
+    fecha = models.DateField("Fecha")
+    tipo = models.CharField("Tipo", max_length=20, choices=MovimientoInventario.TIPOS)
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name="movimientos_diarios", verbose_name="Bodega")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="movimientos_diarios", verbose_name="Producto")
+    entradas = models.DecimalField("Entradas", max_digits=16, decimal_places=3, default=0)
+    salidas = models.DecimalField("Salidas", max_digits=16, decimal_places=3, default=0)
+    movimientos = models.IntegerField("Movimientos", default=0)
+
+    class Meta:
+        verbose_name = "Movimientos del día"
+        verbose_name_plural = "Movimientos por día"
+        unique_together = ("fecha", "tipo", "bodega", "producto")
+        indexes = [
+            models.Index(fields=["producto", "fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.producto} @ {self.bodega}: +{self.entradas} -{self.salidas}"
+
+    @classmethod
+    def registrar_lote(cls, movimientos, signo=1):
+        """
+        Suma `movimientos` al resumen diario con un solo upsert; signo=-1 los descuenta
+        (edición y eliminación). Los movimientos aún sin fecha cuentan en el día de hoy.
+        """
+        agrupados = {}
+        for mov in movimientos:
+            dia = timezone.localdate(mov.fecha) if mov.fecha else timezone.localdate()
+            cuenta = signo
+            for bodega_id, delta in mov.efectos():
+                if bodega_id is None or not delta:
+                    continue
+                k = (dia, mov.tipo, bodega_id, mov.producto_id)
+                entradas, salidas, n = agrupados.get(k, (0, 0, 0))
+                agrupados[k] = (entradas + signo * max(delta, 0), salidas + signo * max(-delta, 0), n + cuenta)
+                cuenta = 0
+        upsert_sumando(cls, [
+            {"fecha": f, "tipo": t, "bodega_id": b, "producto_id": p, "entradas": e, "salidas": s, "movimientos": n}
+            for (f, t, b, p), (e, s, n) in sorted(agrupados.items())
+        ], conflicto=("fecha", "tipo", "bodega", "producto"), sumar=["entradas", "salidas", "movimientos"])
+
+
+class PronosticoDemanda(models.Model):
+    """
+    Último pronóstico de demanda de un producto (pronostico.py): demanda diaria según las
+    SALIDAs de MovimientoDiario, su desviación, el lead time del proveedor elegido y el
+    stock de seguridad y punto de reorden que resultan. Es la caché del cálculo: un
+    producto ya calculado hoy con los mismos parámetros no se vuelve a calcular.
+    """
+    METODO_PROMEDIO = "PROMEDIO"
+    METODO_EXPONENCIAL = "EXPONENCIAL"
+    METODOS = (
+        (METODO_PROMEDIO, "Promedio móvil"),
+        (METODO_EXPONENCIAL, "Suavizamiento exponencial"),
+    )
+
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name="pronostico", verbose_name="Producto")
+    metodo = models.CharField("Método", max_length=12, choices=METODOS)
+    ventana_dias = models.PositiveIntegerField("Ventana (días)")
+    alfa = models.DecimalField("Alfa", max_digits=4, decimal_places=3, null=True, blank=True)
+    nivel_servicio = models.DecimalField("Nivel de servicio", max_digits=4, decimal_places=3)
+    demanda_diaria = models.DecimalField("Demanda diaria", max_digits=14, decimal_places=3)
+    desviacion_diaria = models.DecimalField("Desviación diaria", max_digits=14, decimal_places=3)
+    lead_time_dias = models.PositiveIntegerField("Lead time (días)")
+    stock_seguridad = models.DecimalField("Stock de seguridad", max_digits=14, decimal_places=3)
+    punto_reorden = models.DecimalField("Punto de reorden sugerido", max_digits=14, decimal_places=3)
+    calculado_en = models.DateTimeField("Calculado en")
+
+    class Meta:
+        verbose_name = "Pronóstico de demanda"
+        verbose_name_plural = "Pronósticos de demanda"
+
+    def __str__(self):
+        return f"{self.producto}: {self.demanda_diaria}/día, reorden {self.punto_reorden}"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada de una petición con cabecera Idempotency-Key (lilis_erp/idempotencia.py).
+    `clave` es el hash de (usuario, ruta, clave del cliente): un reintento se resuelve con
+    un INSERT sobre el índice único y, si choca, la lectura de esta fila.
+    `estado` es NULL mientras la primera petición se procesa. `manage.py purgar_idempotencia`
+    borra las claves más antiguas que IDEMPOTENCIA_HORAS.
+    """
+    clave = models.CharField("Clave", max_length=64, unique=True)
+    huella = models.CharField("Huella del cuerpo", max_length=64)
+    estado = models.PositiveSmallIntegerField("Código HTTP", null=True, blank=True)
+    tipo_contenido = models.CharField("Content-Type", max_length=100, blank=True)
+    contenido = models.TextField("Respuesta", blank=True)
+    creado_en = models.DateTimeField("Creado en", auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Clave de idempotencia"
+        verbose_name_plural = "Claves de idempotencia"
+
+    def __str__(self):
+        return f"{self.clave[:12]}… ({self.estado or 'en proceso'})"
+
+
+class ColaStock(models.Model):
+    """
+    Cola (tabla) de movimientos por aplicar cuando STOCK_COLA está activo (cola.py).
+    Cada registro es un lote de movimientos ya validados, con la misma semántica que
+    stock.aplicar_movimientos (`parcial`) y con todas sus bodegas en una misma partición
+    (bodega % STOCK_COLA_PARTICIONES). `manage.py stock_applier --particion N` aplica los
+    pendientes de su partición en orden y de a varios por transacción; el resto de las
+    escrituras de stock no pasa por la cola (ver el alcance en cola.py).
+    """
+    ESTADO_PENDIENTE = "PENDIENTE"
+    ESTADO_APLICADO = "APLICADO"
+    ESTADO_ERROR = "ERROR"
+    ESTADOS = (
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_APLICADO, "Aplicado"),
+        (ESTADO_ERROR, "Error"),
+    )
+
+    particion = models.PositiveSmallIntegerField("Partición")
+    estado = models.CharField("Estado", max_length=10, choices=ESTADOS, default=ESTADO_PENDIENTE)
+    movimientos = models.JSONField("Movimientos", default=list)
+    # Línea del pedido original de cada movimiento (para informar los errores)
+    lineas = models.JSONField("Líneas", default=list)
+    parcial = models.BooleanField("Parcial", default=False)
+    # {"creados": n, "ids": [...], "errores": {línea: mensaje}} o {"error": "..."}
+    resultado = models.JSONField("Resultado", default=dict, blank=True)
+
+    solicitado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                       verbose_name="Solicitado por")
+    creado_en = models.DateTimeField("Creado en", auto_now_add=True)
+    aplicado_en = models.DateTimeField("Aplicado en", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Movimientos en cola"
+        verbose_name_plural = "Cola de stock"
+        indexes = [
+            models.Index(fields=["particion", "estado", "id"]),
+            models.Index(fields=["estado", "aplicado_en"]),
+        ]
+
+    def __str__(self):
+        return f"Cola #{self.pk} p{self.particion} [{self.estado}]"
+
+
+class ConteoInventario(models.Model):
+    """
+    Conteo cíclico de una bodega (conteos.py). Al abrirlo se congela el stock esperado por
+    lote en ConteoLinea; las cantidades contadas se cargan desde CSV/XLSX y al cerrarlo
+    las diferencias (contado - esperado) se registran como AJUSTEs en una sola transacción.
+    """
+    ESTADO_ABIERTO = "ABIERTO"
+    ESTADO_CERRADO = "CERRADO"
+    ESTADO_ANULADO = "ANULADO"
+    ESTADOS = (
+        (ESTADO_ABIERTO, "Abierto"),
+        (ESTADO_CERRADO, "Cerrado"),
+        (ESTADO_ANULADO, "Anulado"),
+    )
+
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, related_name="conteos", verbose_name="Bodega")
+    # Conteo parcial: sólo los productos de una categoría
+    categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, null=True, blank=True, related_name="+",
+                                  verbose_name="Categoría")
+    estado = models.CharField("Estado", max_length=10, choices=ESTADOS, default=ESTADO_ABIERTO)
+    observacion = models.TextField("Observación", blank=True)
+
+    lineas = models.PositiveIntegerField("Líneas", default=0)
+    contadas = models.PositiveIntegerField("Líneas contadas", default=0)
+    ajustes = models.PositiveIntegerField("Ajustes registrados", default=0)
+
+    creado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="+", verbose_name="Creado por")
+    creado_en = models.DateTimeField("Creado en (stock congelado)", auto_now_add=True)
+    cerrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name="+", verbose_name="Cerrado por")
+    cerrado_en = models.DateTimeField("Cerrado en", null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        verbose_name = "Conteo de inventario"
+        verbose_name_plural = "Conteos de inventario"
+        indexes = [
+            models.Index(fields=["bodega", "estado"]),
+        ]
+
+    def __str__(self):
+        return f"Conteo #{self.pk} {self.bodega} [{self.estado}]"
+
+
+class ConteoLinea(models.Model):
+    """Stock esperado (congelado al abrir) y contado de un lote en un conteo."""
+    conteo = models.ForeignKey(ConteoInventario, on_delete=models.CASCADE, related_name="detalle",
+                               verbose_name="Conteo")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+", verbose_name="Producto")
+    lote = models.CharField("Lote", max_length=100, blank=True)
+    serie = models.CharField("Serie", max_length=100, blank=True)
+    fecha_vencimiento = models.DateField("Fecha de vencimiento", blank=True, null=True)
+    esperado = models.DecimalField("Esperado", max_digits=14, decimal_places=3, default=0)
+    contado = models.DecimalField("Contado", max_digits=14, decimal_places=3, null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Línea de conteo"
+        verbose_name_plural = "Líneas de conteo"
+        indexes = [
+            models.Index(fields=["conteo", "producto"]),
+        ]
+
+    def __str__(self):
+        return f"{self.producto} {self.lote or ''}: {self.esperado} / {self.contado}"
@@ -0,0 +1,193 @@
+"""
+Pronóstico de demanda y punto de reorden dinámico (`manage.py pronosticar_demanda`).
+
+La demanda de un producto son sus SALIDAs por día, leídas de MovimientoDiario (un
+registro por día y bodega, no uno por movimiento). Por bloque de productos se arma
+una matriz producto × día con NumPy y sobre ella se calcula:
+
+- demanda diaria: promedio móvil de la ventana o suavizamiento exponencial (alfa),
+- desviación diaria de la ventana,
+- lead time (L): el del proveedor que elegiría reorden.py, o LEAD_TIME_DEFECTO,
+- stock de seguridad = z × desviación × √L (z según el nivel de servicio),
+- punto de reorden = demanda × L + stock de seguridad.
+
+La ventana termina ayer (el día en curso está incompleto). Los productos con stock
+fragmentado se ven en MovimientoDiario después de compactar_stock.
+
+Los bloques se reparten en un pool de procesos (lilis_erp.procesos) y el resultado se
+guarda en PronosticoDemanda, que sirve de caché: calcular() omite los productos ya
+calculados hoy con los mismos parámetros. aplicar() copia el punto de reorden sugerido
+a Producto.punto_reorden.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from statistics import NormalDist
+
+from django.db import connections, router, transaction
+from django.db.models import FloatField, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from apps.products import alertas
+from apps.products.models import Producto
+from apps.suppliers import reorden
+from lilis_erp.procesos import crear_pool
+
+from .models import MovimientoDiario, MovimientoInventario, PronosticoDemanda
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PROMEDIO = PronosticoDemanda.METODO_PROMEDIO
+EXPONENCIAL = PronosticoDemanda.METODO_EXPONENCIAL
+VENTANA = 90
+ALFA = 0.3
+NIVEL_SERVICIO = 0.95
+LEAD_TIME_DEFECTO = 7
+BLOQUE_PRODUCTOS = 500
+LOTE = 1000
+_CAMPOS = ("metodo", "ventana_dias", "alfa", "nivel_servicio", "demanda_diaria", "desviacion_diaria",
+           "lead_time_dias", "stock_seguridad", "punto_reorden", "calculado_en")
+
+
+def _decimal(x, decimales=3):
+    return Decimal(f"{x:.{decimales}f}")
+
+
+def _matriz(producto_ids, desde, dias):
+    """Salidas por producto (filas, en el orden de `producto_ids`) y día (columnas)."""
+    ids = np.array(producto_ids, dtype=np.int64)
+    salidas = np.zeros((len(ids), dias))
+    filas = list(
+        MovimientoDiario.objects
+        .filter(producto_id__in=producto_ids, tipo=MovimientoInventario.TIPO_SALIDA,
+                fecha__gte=desde, fecha__lt=desde + timedelta(days=dias))
+        .values_list("producto_id", "fecha")
+        .annotate(total=Cast(Sum("salidas"), FloatField()))
+        .order_by()
+    )
+    if filas:
+        producto, fecha, total = zip(*filas)
+        fila = np.searchsorted(ids, np.array(producto, dtype=np.int64))
+        columna = np.array([(f - desde).days for f in fecha], dtype=np.int64)
+        np.add.at(salidas, (fila, columna), np.array(total, dtype=np.float64))
+    return ids, salidas
+
+
+def _demanda(salidas, metodo, alfa):
+    if metodo == PROMEDIO:
+        return salidas.mean(axis=1)
+    # Se parte del promedio de la ventana: con demanda esporádica el primer día
+    # no es un buen nivel inicial.
+    nivel = salidas.mean(axis=1)
+    for dia in salidas.T:
+        nivel = alfa * dia + (1 - alfa) * nivel
+    return nivel
+
+
+def pronosticar_bloque(producto_ids, metodo, dias, alfa, nivel_servicio, hoy):
+    """[dict] con el pronóstico de cada producto del bloque. Corre dentro de un proceso del pool."""
+    producto_ids = sorted(producto_ids)
+    ids, salidas = _matriz(producto_ids, hoy - timedelta(days=dias), dias)
+
+    demanda = _demanda(salidas, metodo, alfa)
+    desviacion = salidas.std(axis=1, ddof=1) if dias > 1 else np.zeros(len(ids))
+
+    lead = np.full(len(ids), LEAD_TIME_DEFECTO, dtype=np.int64)
+    o_producto, _, _, _, o_lead = reorden.ofertas(producto_ids)
+    if len(o_producto):
+        pos = np.minimum(np.searchsorted(o_producto, ids), len(o_producto) - 1)
+        con_oferta = o_producto[pos] == ids
+        lead[con_oferta] = o_lead[pos[con_oferta]]
+
+    z = NormalDist().inv_cdf(nivel_servicio)
+    seguridad = z * desviacion * np.sqrt(lead)
+    punto = demanda * lead + seguridad
+
+    return [
+        {"producto_id": p, "demanda_diaria": _decimal(d), "desviacion_diaria": _decimal(s),
+         "lead_time_dias": lt, "stock_seguridad": _decimal(ss), "punto_reorden": _decimal(pr)}
+        for p, d, s, lt, ss, pr in zip(ids.tolist(), demanda.tolist(), desviacion.tolist(), lead.tolist(),
+                                       seguridad.tolist(), punto.tolist())
+    ]
+
+
+def calcular(metodo=EXPONENCIAL, dias=VENTANA, alfa=ALFA, nivel_servicio=NIVEL_SERVICIO, producto_ids=None,
+             procesos=1, forzar=False):
+    """
+    Pronostica los productos activos (o `producto_ids`) y guarda PronosticoDemanda.
+    Devuelve (calculados, omitidos por estar en caché).
+    """
+    reorden.requiere_numpy()
+    if not 0 < nivel_servicio < 1:
+        raise ValueError("El nivel de servicio debe estar entre 0 y 1.")
+    if not 0 < alfa <= 1:
+        raise ValueError("Alfa debe estar entre 0 y 1.")
+    ahora = timezone.now()
+    hoy = timezone.localdate(ahora)
+    parametros = {
+        "metodo": metodo, "ventana_dias": dias, "alfa": _decimal(alfa) if metodo == EXPONENCIAL else None,
+        "nivel_servicio": _decimal(nivel_servicio),
+    }
+
+    qs = Producto.objects.filter(activo=True)
+    if producto_ids is not None:
+        qs = qs.filter(pk__in=producto_ids)
+    ids = list(qs.order_by("id").values_list("id", flat=True))
+    omitidos = 0
+    if not forzar:
+        vigentes = set(
+            PronosticoDemanda.objects
+            .filter(producto_id__in=ids, calculado_en__gte=timezone.make_aware(datetime.combine(hoy, time.min)),
+                    **parametros)
+            .values_list("producto_id", flat=True)
+        ) if ids else set()
+        omitidos = len(vigentes)
+        ids = [i for i in ids if i not in vigentes]
+    bloques = [ids[i:i + BLOQUE_PRODUCTOS] for i in range(0, len(ids), BLOQUE_PRODUCTOS)]
+
+    args = (metodo, dias, alfa, nivel_servicio, hoy)
+    filas = []
+    if procesos > 1 and len(bloques) > 1:
+        with crear_pool(procesos) as pool:
+            for parcial in pool.map(pronosticar_bloque, bloques, *([a] * len(bloques) for a in args)):
+                filas.extend(parcial)
+    else:
+        for bloque in bloques:
+            filas.extend(pronosticar_bloque(bloque, *args))
+
+    # MySQL no acepta ON DUPLICATE KEY con columnas de conflicto (usa cualquier índice único:
+    # aquí sólo puede chocar producto); SQLite/PostgreSQL exigen indicarlas.
+    conexion = connections[router.db_for_write(PronosticoDemanda)]
+    unicos = ["producto"] if conexion.features.supports_update_conflicts_with_target else None
+    PronosticoDemanda.objects.bulk_create(
+        [PronosticoDemanda(**f, **parametros, calculado_en=ahora) for f in filas],
+        update_conflicts=True, unique_fields=unicos, update_fields=list(_CAMPOS), batch_size=LOTE,
+    )
+    return len(filas), omitidos
+
+
+@transaction.atomic
+def aplicar(producto_ids=None):
+    """
+    Copia el punto de reorden sugerido a Producto.punto_reorden (nunca bajo stock_minimo)
+    en los productos activos con demanda en la ventana. Devuelve cuántos cambiaron.
+    """
+    qs = (PronosticoDemanda.objects.filter(producto__activo=True, demanda_diaria__gt=0)
+          .select_related("producto").only("punto_reorden", "producto__id", "producto__stock_minimo",
+                                           "producto__punto_reorden"))
+    if producto_ids is not None:
+        qs = qs.filter(producto_id__in=producto_ids)
+    cambiados = []
+    for pronostico in qs.iterator(chunk_size=LOTE):
+        producto = pronostico.producto
+        nuevo = max(pronostico.punto_reorden, producto.stock_minimo or Decimal("0"))
+        if producto.punto_reorden != nuevo:
+            producto.punto_reorden = nuevo
+            cambiados.append(producto)
+    Producto.objects.bulk_update(cambiados, ["punto_reorden"], batch_size=LOTE)
+    if cambiados:
+        alertas.invalidar()  # bulk_update no dispara la señal de Producto
+    return len(cambiados)
@@ -0,0 +1,169 @@
+"""
+Registro de movimientos en lote (POST /transacciones/lote/).
+
+`preparar_lineas` convierte el JSON recibido en MovimientoInventario sin guardar,
+resolviendo productos, bodegas y proveedores con una consulta por tipo de objeto
+(IN ...) en vez de una por línea; `stock.aplicar_movimientos` los aplica.
+
+Cada línea acepta:
+    tipo               "INGRESO" | "SALIDA" | "AJUSTE" | "DEVOLUCION" | "TRANSFERENCIA" (o su etiqueta)
+    producto           SKU o ID
+    bodega_origen      ID o nombre (salidas / transferencias)
+    bodega_destino     ID o nombre (ingresos / devoluciones / transferencias)
+    proveedor          RUT o razón social (opcional)
+    cantidad           número > 0
+    lote, serie, fecha_vencimiento (AAAA-MM-DD), observacion
+    costo_unitario     opcional (ingresos; por defecto el costo estándar del producto)
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+
+from apps.suppliers.models import normalizar_rut, parece_rut
+from lilis_erp.texto import normalizar_texto
+
+from .models import Bodega, MovimientoInventario, Producto, Proveedor
+
+MAX_LINEAS = 1000
+CANTIDAD_MINIMA = Decimal("0.001")
+
+_TIPOS = {normalizar_texto(codigo): codigo for codigo, _ in MovimientoInventario.TIPOS}
+_TIPOS.update({normalizar_texto(etiqueta): codigo for codigo, etiqueta in MovimientoInventario.TIPOS})
+
+
+def _texto(linea, campo):
+    return str(linea.get(campo) or "").strip()
+
+
+def _productos(lineas):
+    refs = {_texto(l, "producto") for l in lineas} - {""}
+    skus = {r.upper() for r in refs}
+    ids = {int(r) for r in refs if r.isdigit()}
+    por_sku, por_id = {}, {}
+    for p in Producto.objects.filter(sku__in=skus):
+        por_sku[p.sku] = p
+    faltan = ids - {p.pk for p in por_sku.values()}
+    for p in Producto.objects.filter(pk__in=faltan):
+        por_id[p.pk] = p
+    for p in por_sku.values():
+        por_id.setdefault(p.pk, p)
+
+    def resolver(ref):
+        return por_sku.get(ref.upper()) or (por_id.get(int(ref)) if ref.isdigit() else None)
+    return resolver
+
+
+def _bodegas():
+    # Tabla pequeña: se carga entera una vez
+    por_id, por_nombre = {}, {}
+    for b in Bodega.objects.all():
+        por_id[b.pk] = b
+        por_nombre[normalizar_texto(b.nombre)] = b
+
+    def resolver(ref):
+        if not ref:
+            return None
+        return (por_id.get(int(ref)) if ref.isdigit() else None) or por_nombre.get(normalizar_texto(ref))
+    return resolver
+
+
+def _proveedores(lineas):
+    refs = {_texto(l, "proveedor") for l in lineas} - {""}
+    ruts = {normalizar_rut(r) for r in refs if parece_rut(r)}
+    nombres = {normalizar_texto(r) for r in refs if not parece_rut(r)}
+    por_rut = {p.rut_normalizado: p for p in Proveedor.objects.filter(rut_normalizado__in=ruts)} if ruts else {}
+    por_nombre = {}
+    if nombres:
+        for p in Proveedor.objects.filter(razon_social_norm__in=nombres).order_by("id"):
+            por_nombre.setdefault(p.razon_social_norm, p)
+
+    def resolver(ref):
+        return por_rut.get(normalizar_rut(ref)) if parece_rut(ref) else por_nombre.get(normalizar_texto(ref))
+    return resolver
+
+
+def preparar_lineas(lineas, usuario=None):
+    """
+    Devuelve (movimientos, indices, errores):
+    - movimientos: MovimientoInventario sin guardar, ya validados con clean()
+    - indices: número de línea (0..N-1) de cada movimiento
+    - errores: {número de línea: {campo: mensaje}} de las líneas descartadas
+    """
+    producto_de = _productos(lineas)
+    bodega_de = _bodegas()
+    proveedor_de = _proveedores(lineas)
+    creado_por = usuario if getattr(usuario, "is_authenticated", False) else None
+
+    movimientos, indices, errores = [], [], {}
+    for i, linea in enumerate(lineas):
+        if not isinstance(linea, dict):
+            errores[i] = {"__all__": "Línea inválida."}
+            continue
+        err = {}
+
+        tipo = _TIPOS.get(normalizar_texto(_texto(linea, "tipo")))
+        if not tipo:
+            err["tipo"] = "Tipo inválido."
+
+        producto = producto_de(_texto(linea, "producto")) if _texto(linea, "producto") else None
+        if not producto:
+            err["producto"] = "Producto no encontrado."
+
+        origen_ref, destino_ref = _texto(linea, "bodega_origen"), _texto(linea, "bodega_destino")
+        origen, destino = bodega_de(origen_ref), bodega_de(destino_ref)
+        if origen_ref and not origen:
+            err["bodega_origen"] = "Bodega no encontrada."
+        if destino_ref and not destino:
+            err["bodega_destino"] = "Bodega no encontrada."
+
+        proveedor = None
+        if _texto(linea, "proveedor"):
+            proveedor = proveedor_de(_texto(linea, "proveedor"))
+            if not proveedor:
+                err["proveedor"] = "Proveedor no encontrado."
+
+        try:
+            cantidad = Decimal(_texto(linea, "cantidad").replace(",", "."))
+            if not cantidad.is_finite() or cantidad < CANTIDAD_MINIMA:
+                err["cantidad"] = "La cantidad debe ser mayor a cero."
+        except InvalidOperation:
+            cantidad = None
+            err["cantidad"] = "Cantidad inválida."
+
+        costo = None
+        if _texto(linea, "costo_unitario"):
+            try:
+                costo = Decimal(_texto(linea, "costo_unitario").replace(",", "."))
+                if not costo.is_finite() or costo < 0:
+                    err["costo_unitario"] = "Costo inválido."
+            except InvalidOperation:
+                err["costo_unitario"] = "Costo inválido."
+
+        vencimiento = None
+        if _texto(linea, "fecha_vencimiento"):
+            try:
+                vencimiento = date.fromisoformat(_texto(linea, "fecha_vencimiento"))
+            except ValueError:
+                err["fecha_vencimiento"] = "Fecha inválida (use AAAA-MM-DD)."
+
+        if err:
+            errores[i] = err
+            continue
+
+        mov = MovimientoInventario(
+            tipo=tipo, producto=producto, proveedor=proveedor,
+            bodega_origen=origen, bodega_destino=destino, cantidad=cantidad,
+            lote=_texto(linea, "lote") or None, serie=_texto(linea, "serie") or None,
+            fecha_vencimiento=vencimiento, costo_unitario=costo, observacion=_texto(linea, "observacion"),
+            creado_por=creado_por,
+        )
+        mov.fijar_costo()  # bulk_create no pasa por save()
+        try:
+            mov.clean()
+        except ValidationError as e:
+            errores[i] = {"__all__": " ".join(e.messages)}
+            continue
+        movimientos.append(mov)
+        indices.append(i)
+    return movimientos, indices, errores
@@ -0,0 +1,53 @@
+"""
+Invalida los cierres de kardex (KardexCierre) cuando cambia la historia de un producto:
+movimiento editado o eliminado, o costo estándar modificado (lo usan los ingresos
+antiguos sin costo_unitario). Los movimientos nuevos tienen fecha actual, posterior a
+todo cierre, así que no invalidan nada.
+
+Los cierres de stock (CierreStock) se invalidan igual desde la fecha del movimiento,
+también al crearlo (un corte igual o posterior ya no lo incluye). Los caminos en lote
+que no disparan señales (stock.aplicar_movimientos, fefo, conciliacion.corregir)
+llaman a CierreStock.invalidar_desde por su cuenta.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.products.models import Producto
+
+from .models import CierreStock, KardexCierre, MovimientoInventario
+
+
+@receiver(pre_save, sender=MovimientoInventario, dispatch_uid="kardex_movimiento_editado")
+def movimiento_editado(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    anterior = MovimientoInventario.objects.filter(pk=instance.pk).values("producto_id", "fecha").first()
+    if anterior:
+        KardexCierre.objects.filter(producto_id=anterior["producto_id"], corte__gte=anterior["fecha"]).delete()
+        CierreStock.invalidar_desde(anterior["fecha"])
+
+
+@receiver(post_save, sender=MovimientoInventario, dispatch_uid="kardex_movimiento_guardado")
+def movimiento_guardado(sender, instance, raw=False, created=False, **kwargs):
+    if raw:
+        return
+    CierreStock.invalidar_desde(instance.fecha)
+    if not created:
+        KardexCierre.objects.filter(producto_id=instance.producto_id, corte__gte=instance.fecha).delete()
+
+
+@receiver(post_delete, sender=MovimientoInventario, dispatch_uid="kardex_movimiento_eliminado")
+def movimiento_eliminado(sender, instance, **kwargs):
+    KardexCierre.objects.filter(producto_id=instance.producto_id, corte__gte=instance.fecha).delete()
+    CierreStock.invalidar_desde(instance.fecha)
+
+
+@receiver(pre_save, sender=Producto, dispatch_uid="kardex_costo_estandar")
+def costo_estandar_cambiado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "costo_estandar" not in update_fields:
+        return
+    anterior = Producto.objects.filter(pk=instance.pk).values_list("costo_estandar", flat=True).first()
+    if anterior != instance.costo_estandar:
+        KardexCierre.objects.filter(producto_id=instance.pk).delete()
@@ -0,0 +1,221 @@
+"""
+Aplicación de movimientos al stock en lote.
+
+`MovimientoInventario.aplicar_a_stock` resuelve un movimiento por transacción
+(select_for_update + get_or_create por fila). Aquí se aplica una lista completa:
+
+1. Se calculan los deltas de cada movimiento sobre sus claves de Stock
+   (producto, bodega, lote, serie, vencimiento).
+2. Las claves (Stock.clave) se ordenan y se bloquean en ese orden fijo (dos lotes
+   concurrentes que tocan las mismas filas las piden en el mismo orden: no hay
+   deadlock cruzado).
+3. Los saldos se validan línea a línea en memoria y se escriben con bulk_create /
+   bulk_update, igual que los movimientos y los resúmenes (StockResumen).
+
+Productos con stock_fragmentado: ya que el lote bloquea igual, sus sub-filas se
+bloquean junto con la principal y se juntan en ella (una compactación parcial).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from apps.products import alertas
+from apps.products.models import Producto
+from lilis_erp.reintentos import reintentar_bloqueos
+
+from .models import CierreStock, MovimientoDiario, MovimientoInventario, Stock, StockResumen, StockVencimiento
+
+CERO = Decimal("0")
+LOTE = 500
+
+MENSAJES_INSUFICIENTE = MovimientoInventario.MENSAJES_INSUFICIENTE
+
+
+# -------------------------- Claves y deltas --------------------------
+
+def clave_stock(producto_id, bodega_id, lote, serie, fecha_vencimiento):
+    return (producto_id, bodega_id, lote, serie, fecha_vencimiento)
+
+
+def deltas(mov):
+    """[(clave, delta)] que el movimiento aplica sobre Stock (MovimientoInventario.efectos)."""
+    return [(clave_stock(mov.producto_id, b, mov.lote, mov.serie, mov.fecha_vencimiento), d)
+            for b, d in mov.efectos()]
+
+
+# -------------------------- Bloqueo ordenado --------------------------
+
+def _consulta_bloqueo(hashes):
+    # SELECT ... FOR UPDATE sobre el índice único de Stock.clave, recorrido en orden:
+    # las filas se bloquean siempre en la misma secuencia.
+    return Stock.objects.select_for_update().filter(clave__in=hashes).order_by("clave")
+
+
+def bloquear(claves, fragmentados=frozenset()):
+    """
+    Bloquea (y crea en 0 las que falten) las filas de Stock de `claves`.
+    Devuelve {Stock.clave: Stock}. Debe llamarse dentro de una transacción.
+    Para los productos en `fragmentados` las sub-filas se suman a la principal y se borran.
+    """
+    tuplas = {}
+    for c in claves:
+        tuplas.setdefault(Stock.calcular_clave(*c), c)
+    sub = {}  # hash de sub-fila -> hash de la principal
+    for h, c in tuplas.items():
+        if c[0] in fragmentados:
+            sub.update((hs, h) for hs in Stock.claves_fragmentos(*c)[1:])
+    hashes = sorted([*tuplas, *sub])
+    filas = {stk.clave: stk for stk in _consulta_bloqueo(hashes)}
+
+    juntar = [filas.pop(hs) for hs in sub if hs in filas]
+    if juntar:
+        for stk in juntar:
+            principal = sub[stk.clave]
+            if principal in filas:
+                filas[principal].cantidad += stk.cantidad
+            else:
+                filas[principal] = stk  # se reescribe como principal más abajo
+        Stock.objects.filter(pk__in=[stk.pk for stk in juntar]).delete()
+        principales = []
+        for h in sorted({sub[stk.clave] for stk in juntar}):
+            stk = filas[h]
+            if stk.clave != h:
+                stk.pk, stk.clave, stk.fragmento = None, h, 0
+                stk.save()
+            else:
+                principales.append(stk)
+        Stock.objects.bulk_update(principales, ["cantidad"], batch_size=LOTE)
+
+    faltan = [h for h in sorted(tuplas) if h not in filas]
+    if faltan:
+        # ignore_conflicts: si otra transacción la creó recién, se usa la suya
+        Stock.objects.bulk_create(
+            [Stock(clave=h, producto_id=tuplas[h][0], bodega_id=tuplas[h][1], lote=tuplas[h][2],
+                   serie=tuplas[h][3], fecha_vencimiento=tuplas[h][4], cantidad=CERO)
+             for h in faltan],
+            batch_size=LOTE, ignore_conflicts=True,
+        )
+        filas.update({stk.clave: stk for stk in _consulta_bloqueo(faltan)})
+    return filas
+
+
+# -------------------------- Aplicación en lote --------------------------
+
+@reintentar_bloqueos
+@transaction.atomic
+def aplicar_movimientos(movimientos, parcial=False):
+    """
+    Aplica y guarda `movimientos` (instancias sin guardar, ya validadas con clean()).
+
+    Las líneas se evalúan en orden contra el saldo acumulado. Devuelve
+    (guardados, errores) con errores = {índice: mensaje}.
+    - parcial=False: si alguna línea falla no se escribe nada.
+    - parcial=True: se guardan las líneas válidas y se informan las demás.
+    """
+    plan = [(i, mov, [(Stock.calcular_clave(*c), c, d) for c, d in deltas(mov)])
+            for i, mov in enumerate(movimientos)]
+    fragmentados = frozenset(Producto.objects.filter(
+        pk__in={mov.producto_id for mov in movimientos}, stock_fragmentado=True,
+    ).values_list("pk", flat=True))
+    filas = bloquear((c for _, _, ds in plan for _, c, _ in ds), fragmentados)
+    saldo = {h: stk.cantidad or CERO for h, stk in filas.items()}
+
+    guardar, errores = [], {}
+    for i, mov, ds in plan:
+        nuevo = {}
+        for h, _, d in ds:
+            valor = nuevo.get(h, saldo[h]) + d
+            if valor < 0:
+                errores[i] = MENSAJES_INSUFICIENTE.get(mov.tipo, "Stock insuficiente.")
+                break
+            nuevo[h] = valor
+        else:
+            saldo.update(nuevo)
+            guardar.append((mov, ds))
+
+    if errores and not parcial:
+        transaction.set_rollback(True)  # descarta también las filas de Stock creadas en 0
+        return [], errores
+
+    cambiadas = []
+    for h, stk in filas.items():
+        if saldo[h] != stk.cantidad:
+            stk.cantidad = saldo[h]
+            cambiadas.append(stk)
+    Stock.objects.bulk_update(cambiadas, ["cantidad"], batch_size=LOTE)
+
+    guardados = MovimientoInventario.objects.bulk_create([mov for mov, _ in guardar], batch_size=LOTE)
+    if guardados:  # bulk_create no dispara las señales de signals.py
+        CierreStock.invalidar_desde(min(mov.fecha for mov in guardados))
+
+    por_par = defaultdict(lambda: CERO)
+    for _, ds in guardar:
+        for _, c, d in ds:
+            if c[0] not in fragmentados:  # su resumen lo recalcula compactar_stock
+                por_par[(c[0], c[1])] += d
+    StockResumen.registrar_lote(por_par)
+    StockVencimiento.registrar_lote(
+        (mov.producto, c[1], mov.fecha_vencimiento, d) for mov, ds in guardar for _, c, d in ds
+    )
+    MovimientoDiario.registrar_lote(mov for mov in guardados if mov.producto_id not in fragmentados)
+    return guardados, errores
+
+
+# -------------------------- Compactación de sub-filas --------------------------
+
+def pendientes_compactar():
+    """Productos a compactar: los marcados stock_fragmentado y los que aún tienen sub-filas."""
+    marcados = Producto.objects.filter(stock_fragmentado=True).values_list("pk", flat=True)
+    con_sub = Stock.objects.filter(fragmento__gt=0).values_list("producto_id", flat=True).distinct()
+    return sorted(set(marcados) | set(con_sub))
+
+
+@reintentar_bloqueos
+@transaction.atomic
+def compactar(producto_id):
+    """
+    Junta las sub-filas de Stock del producto en su fila principal y deja StockResumen y
+    Producto.stock_total con el total exacto (en el camino fragmentado no se actualizan).
+    Devuelve cuántas sub-filas se borraron.
+    """
+    filas = list(Stock.objects.select_for_update().filter(producto_id=producto_id).order_by("clave"))
+    principales = {stk.clave: stk for stk in filas if not stk.fragmento}
+    borrar, cambiadas, nuevas = [], {}, {}
+    for stk in filas:
+        if not stk.fragmento:
+            continue
+        borrar.append(stk.pk)
+        if not stk.cantidad:
+            continue
+        h = Stock.calcular_clave(stk.producto_id, stk.bodega_id, stk.lote, stk.serie, stk.fecha_vencimiento)
+        if h in principales:
+            principales[h].cantidad += stk.cantidad
+            cambiadas[h] = principales[h]
+        elif h in nuevas:
+            nuevas[h].cantidad += stk.cantidad
+        else:
+            nuevas[h] = Stock(clave=h, producto_id=stk.producto_id, bodega_id=stk.bodega_id, lote=stk.lote,
+                              serie=stk.serie, fecha_vencimiento=stk.fecha_vencimiento, cantidad=stk.cantidad)
+    if borrar:
+        Stock.objects.filter(pk__in=borrar).delete()
+    Stock.objects.bulk_update(list(cambiadas.values()), ["cantidad"], batch_size=LOTE)
+    Stock.objects.bulk_create(list(nuevas.values()), batch_size=LOTE)
+
+    totales = dict(
+        Stock.objects.filter(producto_id=producto_id)
+        .values_list("bodega_id").annotate(total=Sum("cantidad")).order_by()
+    )
+    resumenes = {r.bodega_id: r for r in StockResumen.objects.select_for_update().filter(producto_id=producto_id)}
+    for bodega_id, r in resumenes.items():
+        r.cantidad = totales.get(bodega_id) or CERO
+    StockResumen.objects.bulk_update(list(resumenes.values()), ["cantidad"], batch_size=LOTE)
+    StockResumen.objects.bulk_create(
+        [StockResumen(producto_id=producto_id, bodega_id=b, cantidad=c)
+         for b, c in totales.items() if b not in resumenes and c],
+        batch_size=LOTE,
+    )
+    Producto.objects.filter(pk=producto_id).update(stock_total=sum(totales.values(), CERO))
+    alertas.invalidar()
+    return len(borrar)
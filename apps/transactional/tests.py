@@ -1,3 +1,200 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.products.models import Categoria, Producto
+
+from . import conciliacion, kardex
+from .models import Bodega, KardexCierre, MovimientoInventario, Stock, StockResumen
+from .stock import aplicar_movimientos
+
+M = MovimientoInventario
+
+
+class BaseStockTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="Dulces")
+        cls.producto = Producto.objects.create(sku="DUL-001", nombre="Calugas", categoria=cls.categoria,
+                                               costo_estandar=Decimal("10"), precio_venta=Decimal("10"))
+        cls.b1 = Bodega.objects.create(nombre="Central")
+        cls.b2 = Bodega.objects.create(nombre="Sala de ventas")
+
+    def stock(self, bodega):
+        filas = Stock.objects.filter(producto=self.producto, bodega=bodega)
+        return sum((f.cantidad for f in filas), Decimal("0"))
+
+    def resumen(self, bodega):
+        fila = StockResumen.objects.filter(producto=self.producto, bodega=bodega).first()
+        return fila.cantidad if fila else Decimal("0")
+
+    def stock_total(self):
+        return Producto.objects.get(pk=self.producto.pk).stock_total
+
+    def mov(self, tipo, cantidad, origen=None, destino=None, **extra):
+        return M(tipo=tipo, producto=self.producto, cantidad=Decimal(cantidad),
+                 bodega_origen=origen, bodega_destino=destino, **extra)
+
+
+class AplicarMovimientosTests(BaseStockTest):
+    def test_totales_por_bodega_y_producto(self):
+        guardados, errores = aplicar_movimientos([
+            self.mov(M.TIPO_INGRESO, 10, destino=self.b1),
+            self.mov(M.TIPO_INGRESO, 4, destino=self.b2),
+            self.mov(M.TIPO_TRANSFERENCIA, 3, origen=self.b1, destino=self.b2),
+            self.mov(M.TIPO_SALIDA, 2, origen=self.b2),
+        ])
+        self.assertEqual((len(guardados), errores), (4, {}))
+        self.assertEqual((self.stock(self.b1), self.stock(self.b2)), (Decimal("7"), Decimal("5")))
+        self.assertEqual((self.resumen(self.b1), self.resumen(self.b2)), (Decimal("7"), Decimal("5")))
+        self.assertEqual(self.stock_total(), Decimal("12"))
+
+    def test_todo_o_nada(self):
+        guardados, errores = aplicar_movimientos([
+            self.mov(M.TIPO_INGRESO, 5, destino=self.b1),
+            self.mov(M.TIPO_SALIDA, 8, origen=self.b1),
+        ])
+        self.assertEqual(guardados, [])
+        self.assertEqual(list(errores), [1])
+        self.assertFalse(M.objects.exists())
+        self.assertEqual((self.stock(self.b1), self.stock_total()), (Decimal("0"), Decimal("0")))
+
+    def test_parcial_guarda_las_validas(self):
+        guardados, errores = aplicar_movimientos([
+            self.mov(M.TIPO_INGRESO, 5, destino=self.b1),
+            self.mov(M.TIPO_SALIDA, 8, origen=self.b1),
+            self.mov(M.TIPO_SALIDA, 2, origen=self.b1),
+        ], parcial=True)
+        self.assertEqual((len(guardados), list(errores)), (2, [1]))
+        self.assertEqual((self.stock(self.b1), self.resumen(self.b1), self.stock_total()),
+                         (Decimal("3"), Decimal("3"), Decimal("3")))
+
+
+class EdicionMovimientoTests(BaseStockTest):
+    def test_guardar_cambios_aplica_la_diferencia(self):
+        ingreso = self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        ingreso.cantidad = Decimal("12")
+        ingreso.guardar_cambios()
+        self.assertEqual((self.stock(self.b1), self.resumen(self.b1), self.stock_total()),
+                         (Decimal("12"), Decimal("12"), Decimal("12")))
+
+        ingreso.bodega_destino = self.b2
+        ingreso.guardar_cambios()
+        self.assertEqual((self.stock(self.b1), self.stock(self.b2)), (Decimal("0"), Decimal("12")))
+        self.assertEqual(self.stock_total(), Decimal("12"))
+
+    def test_eliminar_revierte_el_stock(self):
+        self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        salida = self.mov(M.TIPO_SALIDA, 4, origen=self.b1).registrar()
+        salida.eliminar()
+        self.assertFalse(M.objects.filter(pk=salida.pk).exists())
+        self.assertEqual((self.stock(self.b1), self.resumen(self.b1), self.stock_total()),
+                         (Decimal("10"), Decimal("10"), Decimal("10")))
+
+    def test_no_revierte_stock_ya_consumido(self):
+        ingreso = self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        self.mov(M.TIPO_SALIDA, 8, origen=self.b1).registrar()
+
+        ingreso.cantidad = Decimal("5")
+        with self.assertRaisesMessage(ValidationError, M.MENSAJE_REVERSION):
+            ingreso.guardar_cambios()
+        with self.assertRaisesMessage(ValidationError, M.MENSAJE_REVERSION):
+            ingreso.eliminar()
+        self.assertEqual(M.objects.get(pk=ingreso.pk).cantidad, Decimal("10"))
+        self.assertEqual((self.stock(self.b1), self.stock_total()), (Decimal("2"), Decimal("2")))
+
+    def test_ajuste_negativo(self):
+        self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        ajuste = self.mov(M.TIPO_AJUSTE, -3, destino=self.b1).registrar()
+        ajuste.cantidad = Decimal("-5")
+        ajuste.guardar_cambios()
+        self.assertEqual((self.stock(self.b1), self.stock_total()), (Decimal("5"), Decimal("5")))
+
+
+class KardexTests(BaseStockTest):
+    def registrar_en(self, fecha, tipo, cantidad, **extra):
+        mov = self.mov(tipo, cantidad, **extra).registrar()
+        M.objects.filter(pk=mov.pk).update(fecha=fecha)
+        return mov
+
+    def setUp(self):
+        inicio_mes = kardex._inicio_de_mes(timezone.now())
+        self.mes_pasado = inicio_mes - timedelta(days=20)
+        self.registrar_en(self.mes_pasado, M.TIPO_INGRESO, 10, destino=self.b1, costo_unitario=Decimal("100"))
+        self.registrar_en(self.mes_pasado + timedelta(hours=1), M.TIPO_SALIDA, 4, origen=self.b1)
+        self.registrar_en(timezone.now() - timedelta(seconds=1), M.TIPO_INGRESO, 5, destino=self.b1,
+                          costo_unitario=Decimal("130"))
+
+    def test_saldo_a_traves_del_fin_de_mes(self):
+        for metodo in (kardex.PROMEDIO, kardex.FIFO):
+            with self.subTest(metodo=metodo):
+                # La segunda consulta parte del cierre que dejó la primera: no debe sumar dos veces
+                for _ in range(2):
+                    self.assertEqual(kardex.Kardex(self.producto, metodo).saldo()[:2],
+                                     (Decimal("11"), Decimal("1250")))
+
+                cierre = KardexCierre.objects.get(producto=self.producto, metodo=metodo)
+                self.assertEqual(cierre.corte, kardex._fin_de_mes_anterior(timezone.now()))
+                self.assertEqual((cierre.cantidad, cierre.valor), (Decimal("6"), Decimal("600")))
+
+    def test_sin_movimientos_de_meses_anteriores(self):
+        producto = Producto.objects.create(sku="DUL-002", nombre="Alfajores", categoria=self.categoria,
+                                           costo_estandar=Decimal("10"), precio_venta=Decimal("10"))
+        M(tipo=M.TIPO_INGRESO, producto=producto, cantidad=Decimal("5"), bodega_destino=self.b1).registrar()
+        for _ in range(2):
+            self.assertEqual(kardex.Kardex(producto).saldo()[0], Decimal("5"))
+        self.assertFalse(KardexCierre.objects.filter(producto=producto).exists())
+
+    def test_saldo_al_fin_del_mes_pasado(self):
+        hasta = kardex._fin_de_mes_anterior(timezone.now())
+        kardex.Kardex(self.producto).saldo()
+        self.assertEqual(kardex.Kardex(self.producto, hasta=hasta).saldo()[:2], (Decimal("6"), Decimal("600")))
+
+    def test_fifo_consume_la_capa_mas_antigua(self):
+        self.mov(M.TIPO_SALIDA, 8, origen=self.b1).registrar()
+        k = kardex.Kardex(self.producto, kardex.FIFO)
+        filas = list(k.filas())
+        self.assertEqual(filas[-1]["valor"], Decimal("-860"))  # 6 a 100 + 2 a 130
+        self.assertEqual([[Decimal(c), Decimal(costo)] for c, costo in k.estado.capas()], [[Decimal("3"), Decimal("130")]])
+
+
+class ConciliacionTests(BaseStockTest):
+    def reconcile(self, *args):
+        salida = StringIO()
+        call_command("reconcile_stock", "--procesos", "1", *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_corregir_deja_el_libro_conciliado(self):
+        self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        self.assertIn("conciliado", self.reconcile())
+
+        Stock.objects.filter(producto=self.producto, bodega=self.b1).update(cantidad=Decimal("7"))
+        with self.assertRaisesMessage(CommandError, "1 diferencia(s)"):
+            self.reconcile()
+
+        self.assertIn("1 AJUSTE(s)", self.reconcile("--corregir"))
+        ajuste = M.objects.get(solo_libro=True)
+        self.assertEqual((ajuste.tipo, ajuste.cantidad, ajuste.bodega_destino), (M.TIPO_AJUSTE, Decimal("-3"), self.b1))
+        self.assertEqual(self.stock(self.b1), Decimal("7"))  # el stock físico no se toca
+        self.assertIn("conciliado", self.reconcile())
+
+        with self.assertRaisesMessage(ValidationError, M.MENSAJE_SOLO_LIBRO):
+            ajuste.eliminar()
+
+    def test_corregir_descarta_diferencias_que_ya_no_existen(self):
+        self.mov(M.TIPO_INGRESO, 10, destino=self.b1).registrar()
+        Stock.objects.filter(producto=self.producto, bodega=self.b1).update(cantidad=Decimal("7"))
+        diferencias = list(conciliacion.conciliar())
+        self.assertEqual([(e, s) for _, e, s in diferencias], [(Decimal("10"), Decimal("7"))])
 
-# Create your tests here.
+        # Un movimiento entre la lectura y la corrección no cambia stock - esperado
+        self.mov(M.TIPO_SALIDA, 2, origen=self.b1).registrar()
+        self.assertEqual(conciliacion.corregir(diferencias), 1)
+        self.assertEqual(M.objects.get(solo_libro=True).cantidad, Decimal("-3"))
+        self.assertEqual(conciliacion.corregir(diferencias), 0)  # ya conciliado
@@ -6,6 +6,23 @@ app_name = 'transactional'
 urlpatterns = [
     path('', views.gestion_transacciones, name='list'),
     path('crear/', views.crear_transaccion, name='crear'),
+    path('lote/', views.crear_transacciones_lote, name='crear_lote'),
+    path('fefo/', views.crear_salida_fefo, name='crear_fefo'),
+    path('cola/<int:cola_id>/', views.cola_estado, name='cola_estado'),
+    path('conteos/', views.abrir_conteo, name='abrir_conteo'),
+    path('conteos/<int:conteo_id>/', views.conteo_detalle, name='conteo'),
+    path('conteos/<int:conteo_id>/cargar/', views.cargar_conteo, name='cargar_conteo'),
+    path('conteos/<int:conteo_id>/cerrar/', views.cerrar_conteo, name='cerrar_conteo'),
+    path('vencimientos/', views.reporte_vencimientos, name='vencimientos'),
+    path('vencimientos/datos/', views.vencimientos_datos, name='vencimientos_datos'),
+    path('stock-matriz/', views.matriz_stock, name='matriz_stock'),
+    path('stock-matriz/datos/', views.matriz_stock_datos, name='matriz_stock_datos'),
+    path('stock-a-fecha/', views.stock_a_fecha, name='stock_a_fecha'),
+    path('kardex/', views.kardex_producto, name='kardex'),
+    path('valorizacion/', views.valorizacion_inventario, name='valorizacion'),
     path('editar/<int:mov_id>/', views.editar_transaccion, name='editar'),
     path('eliminar/<int:mov_id>/', views.eliminar_transaccion, name='eliminar'),
+    path('exportar/', views.export_xlsx, name='exportar'),
+    path('exportaciones/<int:job_id>/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportaciones/<int:job_id>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
 ]
\ No newline at end of file
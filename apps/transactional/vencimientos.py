@@ -0,0 +1,88 @@
+"""
+Reporte de stock vencido / por vencer.
+
+Se lee de StockVencimiento (bodega × categoría × fecha), no de Stock: el tamaño de
+esa tabla depende de cuántas fechas distintas hay, no de cuántos lotes. Los tramos
+se calculan al consultar, así que no hay que moverlos de un tramo a otro cada día.
+
+- StockVencimiento.registrar_lote: deltas desde aplicar_a_stock / aplicar_movimientos / fefo.
+- refrescar(): reconstrucción completa desde Stock (`manage.py refrescar_vencimientos`).
+- reporte():   tramos por bodega y categoría.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Stock, StockVencimiento
+
+CERO = Decimal("0")
+LOTE = 1000
+
+# (código, etiqueta, días desde, días hasta) relativos a hoy; None = sin límite
+TRAMOS = (
+    ("vencido", "Vencido", None, -1),
+    ("d7", "≤ 7 días", 0, 7),
+    ("d30", "≤ 30 días", 8, 30),
+    ("d90", "≤ 90 días", 31, 90),
+)
+
+
+@transaction.atomic
+def refrescar():
+    """Reconstruye StockVencimiento desde Stock. Devuelve la cantidad de filas."""
+    valor = ExpressionWrapper(F("cantidad") * Coalesce(F("producto__costo_estandar"), Value(CERO)),
+                              output_field=DecimalField(max_digits=18, decimal_places=4))
+    filas = (Stock.objects.filter(fecha_vencimiento__isnull=False, cantidad__gt=0)
+             .values_list("bodega_id", "producto__categoria_id", "fecha_vencimiento")
+             .annotate(total=Sum("cantidad"), valor=Sum(valor)).order_by())
+    StockVencimiento.objects.all().delete()
+    nuevas = [
+        StockVencimiento(bodega_id=b, categoria_id=c, fecha_vencimiento=f, cantidad=total, valor=v or CERO)
+        for b, c, f, total, v in filas.iterator(chunk_size=LOTE)
+    ]
+    StockVencimiento.objects.bulk_create(nuevas, batch_size=LOTE)
+    return len(nuevas)
+
+
+def reporte(hoy=None):
+    """
+    Filas por bodega × categoría con cantidad y valor de cada tramo:
+    {"hoy", "tramos": [{codigo, etiqueta, cantidad, valor}] (totales), "filas": [...]}
+    """
+    hoy = hoy or timezone.localdate()
+    hasta = max(fin for _, _, _, fin in TRAMOS)
+    sumas = {}
+    for codigo, _, desde, fin in TRAMOS:
+        rango = Q(fecha_vencimiento__lte=hoy + timedelta(days=fin))
+        if desde is not None:
+            rango &= Q(fecha_vencimiento__gte=hoy + timedelta(days=desde))
+        sumas[f"{codigo}_cantidad"] = Sum("cantidad", filter=rango, default=CERO)
+        sumas[f"{codigo}_valor"] = Sum("valor", filter=rango, default=CERO)
+
+    qs = (StockVencimiento.objects.filter(fecha_vencimiento__lte=hoy + timedelta(days=hasta))
+          .exclude(cantidad=0)
+          .values("bodega_id", "bodega__nombre", "categoria_id", "categoria__nombre")
+          .annotate(**sumas).order_by("bodega__nombre", "categoria__nombre"))
+
+    filas, totales = [], {c: {"cantidad": CERO, "valor": CERO} for c, _, _, _ in TRAMOS}
+    for r in qs:
+        tramos = {}
+        for codigo, _, _, _ in TRAMOS:
+            cantidad, valor = r[f"{codigo}_cantidad"], r[f"{codigo}_valor"]
+            tramos[codigo] = {"cantidad": cantidad, "valor": valor}
+            totales[codigo]["cantidad"] += cantidad
+            totales[codigo]["valor"] += valor
+        filas.append({
+            "bodega_id": r["bodega_id"], "bodega": r["bodega__nombre"],
+            "categoria_id": r["categoria_id"], "categoria": r["categoria__nombre"],
+            "tramos": tramos,
+        })
+    return {
+        "hoy": hoy,
+        "tramos": [{"codigo": c, "etiqueta": e, **totales[c]} for c, e, _, _ in TRAMOS],
+        "filas": filas,
+    }
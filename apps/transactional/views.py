@@ -1,25 +1,67 @@
-from datetime import datetime
 import json
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.db import transaction
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
-from django.shortcuts import render
+from django.db.models import F, Q
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.http import require_POST
 
+from lilis_erp.idempotencia import idempotente
+from lilis_erp.reintentos import es_bloqueo, reintentar_bloqueos
 from lilis_erp.roles import require_roles
+from lilis_erp.paginacion import PaginadorCursor, paginar
+from lilis_erp.texto import normalizar_texto, prefijo_q
+from apps.products.models import Categoria
+from apps.suppliers.models import normalizar_rut
+from lilis_erp.exportar import Columna, FORMATOS, fecha, o_defecto, respuesta_exportacion
 
 # Ajusta imports si tu estructura difiere
-from .models import MovimientoInventario, Producto, Proveedor
-
-# Excel
-try:
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    Workbook = None
+from .models import (Bodega, ColaStock, ConteoInventario, ConteoLinea, MovimientoInventario, Producto,
+                     TrabajoExportacion)
+from . import cierres, cola, conteos, exportaciones, fefo, kardex, matriz, vencimientos
+from .registro_lote import MAX_LINEAS, preparar_lineas
+from .stock import aplicar_movimientos
+
+
+# -------------------------- Columnas de exportación --------------------------
+
+COLUMNAS_EXPORT = [
+    Columna("ID", "id"),
+    Columna("Fecha", "fecha", fecha("%Y-%m-%d %H:%M")),
+    Columna("Tipo", "tipo", o_defecto("")),
+    Columna("Producto", "producto__nombre", o_defecto("")),
+    Columna("SKU", "producto__sku", o_defecto("")),
+    Columna("Cantidad", "cantidad"),
+    Columna("Bodega Origen", "bodega_origen__nombre", o_defecto("-")),
+    Columna("Bodega Destino", "bodega_destino__nombre", o_defecto("-")),
+    Columna("Proveedor", "proveedor__razon_social", o_defecto("-")),
+    Columna("Lote", "lote", o_defecto("-")),
+    Columna("Serie", "serie", o_defecto("-")),
+    Columna("Vencimiento", "fecha_vencimiento", fecha("%Y-%m-%d", "-")),
+    Columna("Usuario", "creado_por__username", o_defecto("Sistema")),
+    Columna("Observación", "observacion", o_defecto("")),
+]
+
+# Formato corto del atajo export_xlsx
+COLUMNAS_EXPORT_SIMPLE = [
+    Columna("Fecha", "fecha", fecha("%Y-%m-%d")),
+    Columna("Tipo", "tipo", o_defecto("")),
+    Columna("Producto", "producto__nombre", o_defecto("")),
+    Columna("Proveedor", "proveedor__razon_social", o_defecto("")),
+    Columna("Cantidad", "cantidad"),
+    Columna("Usuario", "creado_por__username", o_defecto("Sistema")),
+    Columna("Lote", "lote", o_defecto("")),
+    Columna("Serie", "serie", o_defecto("")),
+    Columna("Vencimiento", "fecha_vencimiento", fecha("%Y-%m-%d")),
+    Columna("Doc Ref", "observacion", o_defecto("")),
+]
 
 
 # -------------------------- Helper búsqueda --------------------------
@@ -28,10 +70,10 @@ def _build_transaction_q(q: str) -> Q:
     """
     Búsqueda para movimientos de inventario (lo que pediste):
     - cantidad (si es número)
-    - producto.sku, producto.nombre
+    - producto.sku, producto.nombre (por prefijo, sin tildes)
     - tipo
     - bodega_origen.nombre, bodega_destino.nombre
-    - proveedor.razon_social / rut_nif
+    - proveedor.razon_social (por prefijo, sin tildes) / rut (sin importar puntos ni guión)
     - usuario (creado_por.username)
     - lote
     """
@@ -41,12 +83,12 @@ def _build_transaction_q(q: str) -> Q:
 
     expr = (
         Q(producto__sku__icontains=q) |
-        Q(producto__nombre__icontains=q) |
+        prefijo_q("producto__nombre_norm", q) |
         Q(tipo__icontains=q) |
         Q(bodega_origen__nombre__icontains=q) |
         Q(bodega_destino__nombre__icontains=q) |
-        Q(proveedor__razon_social__icontains=q) |
-        Q(proveedor__rut_nif__icontains=q) |
+        prefijo_q("proveedor__razon_social_norm", q) |
+        prefijo_q("proveedor__rut_normalizado", normalizar_rut(q), normalizar=False) |
         Q(creado_por__username__icontains=q) |
         Q(lote__icontains=q)
     )
@@ -69,17 +111,12 @@ def _build_transaction_q(q: str) -> Q:
 
 # ------------------------------ Vistas ------------------------------
 
-@login_required
-@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
-def gestion_transacciones(request):
+def _movimientos_queryset(query, sort_by, ver):
     """
-    Lista, filtra, ordena y exporta movimientos de inventario.
+    Queryset filtrado/ordenado del listado de movimientos. Lo usan la vista y los
+    trabajos de exportación en segundo plano (mismos parámetros -> mismo archivo).
+    Devuelve (qs, sort_by normalizado).
     """
-    query = request.GET.get('q', '')
-    sort_by = request.GET.get('sort', 'sku')  # Por defecto, los más nuevos primero por ID
-    ver = request.GET.get('ver', 'todos')
-    export = request.GET.get('export', '')
-
     valid_sort_fields = ['id', '-id', 'fecha', '-fecha', 'producto__nombre', '-producto__nombre', 'tipo', '-tipo']
     if sort_by not in valid_sort_fields:
         sort_by = '-id'
@@ -109,56 +146,32 @@ def gestion_transacciones(request):
     if query:
         qs = qs.filter(_build_transaction_q(query))
 
-    qs = qs.order_by(sort_by)
-
-    # Export a Excel
-    if export == "xlsx":
-        if Workbook is None:
-            return HttpResponse("Falta dependencia: instala openpyxl (pip install openpyxl)", status=500)
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Movimientos"
-        headers = [
-            "ID", "Fecha", "Tipo", "Producto", "SKU", "Cantidad",
-            "Bodega Origen", "Bodega Destino", "Proveedor",
-            "Lote", "Serie", "Vencimiento", "Usuario", "Observación"
-        ]
-        ws.append(headers)
-
-        for m in qs:
-            ws.append([
-                m.id,
-                m.fecha.strftime('%Y-%m-%d %H:%M') if m.fecha else "",
-                getattr(m, "tipo", ""),
-                getattr(m.producto, "nombre", ""),
-                getattr(m.producto, "sku", ""),
-                m.cantidad,
-                getattr(m.bodega_origen, "nombre", "-") if m.bodega_origen else "-",
-                getattr(m.bodega_destino, "nombre", "-") if m.bodega_destino else "-",
-                getattr(m.proveedor, "razon_social", "-") if m.proveedor else "-",
-                m.lote or "-",
-                getattr(m, "serie", "") or "-",
-                m.fecha_vencimiento.strftime('%Y-%m-%d') if getattr(m, "fecha_vencimiento", None) else "-",
-                getattr(m.creado_por, "username", "Sistema") if m.creado_por else "Sistema",
-                getattr(m, "observacion", "") or ""
-            ])
-
-        for col in ws.columns:
-            max_len = 0
-            col_letter = get_column_letter(col[0].column)
-            for cell in col:
-                max_len = max(max_len, len(str(cell.value)) if cell.value else 0)
-            ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        filename = f"movimientos_inventario_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        wb.save(response)
-        return response
-
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    return qs.order_by(sort_by), sort_by
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def gestion_transacciones(request):
+    """
+    Lista, filtra, ordena y exporta movimientos de inventario.
+    """
+    query = request.GET.get('q', '')
+    sort_by = request.GET.get('sort', 'sku')  # Por defecto, los más nuevos primero por ID
+    ver = request.GET.get('ver', 'todos')
+    export = request.GET.get('export', '')
+
+    qs, sort_by = _movimientos_queryset(query, sort_by, ver)
+
+    # Archivos grandes: se encolan y los construye `manage.py exportaciones_worker`
+    if export in FORMATOS and request.GET.get("async") == "1":
+        return _encolar_respuesta(request, "movimientos", export,
+                                  {"q": query, "sort": sort_by, "ver": ver})
+
+    # Export a Excel / CSV (streaming)
+    if export in FORMATOS:
+        return respuesta_exportacion(qs, COLUMNAS_EXPORT, "movimientos_inventario", formato=export, hoja="Movimientos")
+
+    page_obj = paginar(request, qs, sort_by)
 
     context = {
         "movimientos": page_obj.object_list,
@@ -166,84 +179,261 @@ def gestion_transacciones(request):
         "query": query,
         "sort_by": sort_by,
         "ver": ver,
+        "bodegas": Bodega.objects.order_by("nombre"),
     }
     return render(request, "gestion_transacciones.html", context)
 
 
+# Nombre de los campos de registro_lote -> nombre en el formulario de gestion_transacciones
+_CAMPOS_FORMULARIO = {"producto": "producto_text", "proveedor": "proveedor_text", "fecha_vencimiento": "vencimiento"}
+
+
 @login_required
 @require_roles("ADMIN", "PRODUCCION", "INVENTARIO")
 @require_POST
+@reintentar_bloqueos
+@idempotente
 def crear_transaccion(request):
     """
-    Crea una nueva transacción.
+    Crea un movimiento y lo aplica a Stock en la misma transacción.
+    Body: tipo, producto_text (SKU o nombre) o producto_id, bodega_origen / bodega_destino
+    (ID o nombre, según el tipo), cantidad, proveedor_text, lote, serie, vencimiento,
+    doc_ref, motivo, observaciones. La fecha es la del registro.
     """
     try:
         data = json.loads(request.body.decode("utf-8"))
     except Exception:
         return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
 
     # Validaciones básicas
     errors = {}
-    tipo = (data.get("tipo") or "").strip()
-    fecha_str = (data.get("fecha") or "").strip()
-    cantidad_str = data.get("cantidad")
-    producto_text = (data.get("producto_text") or "").strip()
-    proveedor_text = (data.get("proveedor_text") or "").strip()
+    tipo = str(data.get("tipo") or "").strip()
+    producto_id = str(data.get("producto_id") or "").strip()
+    producto_text = str(data.get("producto_text") or "").strip()
+    proveedor_text = str(data.get("proveedor_text") or "").strip()
 
     if not tipo:
         errors["tipo"] = "Tipo requerido."
-    if not fecha_str:
-        errors["fecha"] = "Fecha requerida."
-    if not producto_text:
+    if not producto_id and not producto_text:
         errors["producto_text"] = "Producto requerido."
-
-    try:
-        cantidad = float(cantidad_str)
-        if cantidad < 0:
-            errors["cantidad"] = "La cantidad debe ser mayor a cero."
-    except Exception:
-        errors["cantidad"] = "Cantidad inválida."
-
     # Validar proveedor para ingresos
-    if tipo == "Ingreso" and not proveedor_text:
+    if normalizar_texto(tipo) == normalizar_texto(MovimientoInventario.TIPO_INGRESO) and not proveedor_text:
         errors["proveedor_text"] = "Proveedor es requerido para ingresos."
-
     if errors:
         return JsonResponse({"ok": False, "errors": errors}, status=400)
 
-    # Buscar producto y proveedor
-    producto = (Producto.objects.filter(sku=producto_text).first() or
-                Producto.objects.filter(nombre__iexact=producto_text).first())
+    # Producto por ID (autocompletado), SKU o nombre
+    producto = (
+        (Producto.objects.filter(pk=producto_id).first() if producto_id.isdigit() else None)
+        or Producto.objects.filter(sku=producto_text.upper()).first()
+        or Producto.objects.filter(nombre__iexact=producto_text).first()
+    )
     if not producto:
         return JsonResponse({"ok": False, "errors": {"producto_text": "Producto no encontrado."}}, status=400)
 
-    proveedor = None
-    if proveedor_text:
-        proveedor = (Proveedor.objects.filter(rut_nif=proveedor_text).first() or
-                     Proveedor.objects.filter(razon_social__iexact=proveedor_text).first())
-        if not proveedor and tipo == "Ingreso":
-            return JsonResponse({"ok": False, "errors": {"proveedor_text": "Proveedor no encontrado."}}, status=400)
+    # Documento y motivo no tienen columna propia: quedan en la observación
+    observacion = " | ".join(
+        f"{etiqueta}{valor}" for etiqueta, valor in (
+            ("Doc: ", str(data.get("doc_ref") or "").strip()),
+            ("Motivo: ", str(data.get("motivo") or "").strip()),
+            ("", str(data.get("observaciones") or "").strip()),
+        ) if valor
+    )
+    linea = {
+        "tipo": tipo, "producto": str(producto.pk), "proveedor": proveedor_text,
+        "bodega_origen": data.get("bodega_origen"), "bodega_destino": data.get("bodega_destino"),
+        "cantidad": data.get("cantidad"), "lote": data.get("lote"), "serie": data.get("serie"),
+        "fecha_vencimiento": data.get("vencimiento"), "observacion": observacion,
+    }
+    # Mismas reglas que /transacciones/lote/ (tipos, bodegas, proveedor, cantidad, clean())
+    movimientos, _, errores = preparar_lineas([linea], request.user)
+    if errores:
+        errors = {_CAMPOS_FORMULARIO.get(k, k): v for k, v in errores[0].items()}
+        return JsonResponse({"ok": False, "errors": errors}, status=400)
+
+    mov = movimientos[0]
+    try:
+        mov.registrar()
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "errors": {"cantidad": " ".join(e.messages)}}, status=400)
+    except Exception as e:
+        if es_bloqueo(e):
+            raise  # lo reintenta reintentar_bloqueos con la transacción completa
+        return JsonResponse({"ok": False, "errors": {"__all__": f"Error inesperado: {e}"}}, status=500)
+    return JsonResponse({"ok": True, "id": mov.pk})
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO")
+@require_POST
+@reintentar_bloqueos
+@idempotente
+def crear_transacciones_lote(request):
+    """
+    Registra N movimientos en una sola transacción (p. ej. una recepción de 300 líneas).
+    Body: {"movimientos": [{...}, ...], "parcial": false}  (campos en registro_lote.py)
+
+    - parcial=false (defecto): todo o nada; si alguna línea falla no se guarda ninguna.
+    - parcial=true: se guardan las líneas válidas y se informan las que fallaron.
+
+    Con STOCK_COLA el lote se encola (cola.py) y se espera a que el worker lo aplique;
+    si no alcanza, responde 202 con estado_url. Un lote con bodegas de varias
+    particiones se aplica directo.
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+
+    lineas = data.get("movimientos") if isinstance(data, dict) else None
+    if not isinstance(lineas, list) or not lineas:
+        return JsonResponse({"ok": False, "error": "Debe enviar una lista 'movimientos'."}, status=400)
+    if len(lineas) > MAX_LINEAS:
+        return JsonResponse({"ok": False, "error": f"Máximo {MAX_LINEAS} movimientos por lote."}, status=400)
+    parcial = bool(data.get("parcial"))
+
+    movimientos, indices, errores = preparar_lineas(lineas, request.user)
+    if errores and not parcial:
+        return JsonResponse({"ok": False, "errores": _errores_lote(errores)}, status=400)
+
+    if cola.activa() and movimientos and cola.particion_de(movimientos) is not None:
+        item = cola.encolar(movimientos, indices, parcial=parcial, usuario=request.user)
+        # Dentro de una transacción (p. ej. con Idempotency-Key) el worker todavía no ve
+        # el registro: se responde 202 y el cliente consulta estado_url.
+        if not transaction.get_connection().in_atomic_block:
+            item = cola.esperar(item.pk, settings.STOCK_COLA_ESPERA_SEGUNDOS)
+        return _respuesta_cola(item, errores)
+
+    try:
+        guardados, errores_stock = aplicar_movimientos(movimientos, parcial=parcial)
+    except Exception as e:
+        if es_bloqueo(e):
+            raise  # lo reintenta reintentar_bloqueos con la transacción completa
+        return JsonResponse({"ok": False, "errors": {"__all__": f"Error inesperado: {e}"}}, status=500)
+
+    for pos, mensaje in errores_stock.items():
+        errores[indices[pos]] = {"cantidad": mensaje}
+    if errores and not guardados:
+        return JsonResponse({"ok": False, "errores": _errores_lote(errores)}, status=400)
+
+    return JsonResponse({
+        "ok": True,
+        "creados": len(guardados),
+        "ids": [m.pk for m in guardados if m.pk],  # MySQL no devuelve ids en bulk_create
+        "errores": _errores_lote(errores),
+    })
+
+
+def _errores_lote(errores):
+    return [{"linea": i + 1, "errors": err} for i, err in sorted(errores.items())]
+
+
+def _respuesta_cola(item, errores=None):
+    """Respuesta de /transacciones/lote/ para un lote encolado (la misma que sin cola, o 202 si sigue pendiente)."""
+    errores = dict(errores or {})
+    if item.estado == ColaStock.ESTADO_PENDIENTE:
+        return JsonResponse({
+            "ok": True, "pendiente": True, "cola_id": item.pk,
+            "estado_url": reverse("transactional:cola_estado", args=[item.pk]),
+            "errores": _errores_lote(errores),
+        }, status=202)
+    if item.estado == ColaStock.ESTADO_ERROR:
+        return JsonResponse({"ok": False, "errors": {"__all__": f"Error inesperado: {item.resultado.get('error')}"}},
+                            status=500)
+    for linea, mensaje in item.resultado.get("errores", {}).items():
+        errores[int(linea)] = {"cantidad": mensaje}
+    if errores and not item.resultado.get("creados"):
+        return JsonResponse({"ok": False, "errores": _errores_lote(errores)}, status=400)
+    return JsonResponse({
+        "ok": True,
+        "creados": item.resultado.get("creados", 0),
+        "ids": item.resultado.get("ids", []),
+        "errores": _errores_lote(errores),
+    })
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO")
+def cola_estado(request, cola_id):
+    """GET /transacciones/cola/<id>/: resultado de un lote encolado (202 mientras esté pendiente)."""
+    return _respuesta_cola(get_object_or_404(ColaStock, id=cola_id))
+
+
+def _bodega_por_ref(ref):
+    if not ref:
+        return None
+    if ref.isdigit():
+        return Bodega.objects.filter(pk=int(ref)).first()
+    return Bodega.objects.filter(nombre__iexact=ref).first()
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS")
+@require_POST
+@reintentar_bloqueos
+@idempotente
+def crear_salida_fefo(request):
+    """
+    Salida o transferencia sin indicar lote: se asigna por vencimiento (fefo.py) y se
+    guarda una línea por lote consumido.
+    Body: {"producto": SKU o ID, "bodega_origen": ID o nombre, "cantidad": n,
+           "bodega_destino": opcional (transferencia), "observacion": ""}
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+
+    errors = {}
+    ref = str(data.get("producto") or "").strip()
+    producto = Producto.objects.filter(sku=ref.upper()).first() if ref else None
+    if not producto and ref.isdigit():
+        producto = Producto.objects.filter(pk=int(ref)).first()
+    if not producto:
+        errors["producto"] = "Producto no encontrado."
+
+    origen = _bodega_por_ref(str(data.get("bodega_origen") or "").strip())
+    if not origen:
+        errors["bodega_origen"] = "Bodega origen no encontrada."
+    ref_destino = str(data.get("bodega_destino") or "").strip()
+    destino = _bodega_por_ref(ref_destino)
+    if ref_destino and not destino:
+        errors["bodega_destino"] = "Bodega destino no encontrada."
 
     try:
-        with transaction.atomic():
-            mov = MovimientoInventario.objects.create(
-                fecha=fecha_str,
-                tipo=tipo,
-                producto=producto,
-                proveedor=proveedor,
-                cantidad=cantidad,
-                lote=data.get("lote", ""),
-                serie=data.get("serie", ""),
-                fecha_vencimiento=data.get("vencimiento") or None,
-                doc_ref=data.get("doc_ref", ""),
-                motivo=data.get("motivo", ""),
-                observacion=data.get("observaciones", ""),
-                creado_por=request.user
-            )
-        return JsonResponse({"ok": True, "id": mov.id})
+        cantidad = Decimal(str(data.get("cantidad")).replace(",", "."))
+        if not cantidad.is_finite() or cantidad <= 0:
+            errors["cantidad"] = "La cantidad debe ser mayor a cero."
+    except (InvalidOperation, ValueError):
+        errors["cantidad"] = "Cantidad inválida."
+
+    if errors:
+        return JsonResponse({"ok": False, "errors": errors}, status=400)
+
+    try:
+        movimientos = fefo.registrar(producto, origen, cantidad, bodega_destino=destino, usuario=request.user,
+                                     observacion=str(data.get("observacion") or "").strip())
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "errors": {"cantidad": " ".join(e.messages)}}, status=400)
     except Exception as e:
+        if es_bloqueo(e):
+            raise
         return JsonResponse({"ok": False, "errors": {"__all__": f"Error inesperado: {e}"}}, status=500)
 
+    return JsonResponse({
+        "ok": True,
+        "lineas": [
+            {"lote": m.lote or "", "serie": m.serie or "",
+             "fecha_vencimiento": m.fecha_vencimiento.isoformat() if m.fecha_vencimiento else None,
+             "cantidad": str(m.cantidad)}
+            for m in movimientos
+        ],
+    })
+
 
 @login_required
 @require_roles("ADMIN", "PRODUCCION", "INVENTARIO")
@@ -266,14 +456,35 @@ def editar_transaccion(request, mov_id):
             }
         })
 
+    if mov.solo_libro:
+        return JsonResponse({"ok": False, "error": MovimientoInventario.MENSAJE_SOLO_LIBRO}, status=400)
     try:
         data = json.loads(request.body.decode("utf-8"))
     except Exception:
         return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
 
-    mov.tipo = data.get("tipo", mov.tipo)
-    mov.cantidad = data.get("cantidad", mov.cantidad)
-    mov.save()
+    tipo = str(data.get("tipo") or mov.tipo).strip().upper()
+    if tipo not in dict(MovimientoInventario.TIPOS):
+        return JsonResponse({"ok": False, "error": "Tipo inválido."}, status=400)
+    try:
+        cantidad = Decimal(str(data.get("cantidad", mov.cantidad)).replace(",", "."))
+    except (InvalidOperation, ValueError):
+        return JsonResponse({"ok": False, "error": "Cantidad inválida."}, status=400)
+    # Un AJUSTE puede ser negativo (conteos y correcciones de stock); el resto, sólo positivo
+    if not cantidad.is_finite() or not cantidad:
+        return JsonResponse({"ok": False, "error": "La cantidad no puede ser cero."}, status=400)
+    if cantidad < 0 and tipo != MovimientoInventario.TIPO_AJUSTE:
+        return JsonResponse({"ok": False, "error": "La cantidad debe ser mayor a cero."}, status=400)
+
+    cambia_tipo = tipo != mov.tipo
+    mov.tipo, mov.cantidad = tipo, cantidad
+    try:
+        if cambia_tipo:
+            mov.clean()  # el nuevo tipo puede exigir otras bodegas
+        # Stock se corrige en la misma transacción: se revierte la versión guardada y se aplica la nueva
+        mov.guardar_cambios()
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "error": " ".join(e.messages)}, status=400)
 
     return JsonResponse({"ok": True})
 
@@ -283,10 +494,12 @@ def editar_transaccion(request, mov_id):
 @require_POST
 def eliminar_transaccion(request, mov_id):
     try:
-        MovimientoInventario.objects.get(id=mov_id).delete()
+        MovimientoInventario.objects.get(id=mov_id).eliminar()  # revierte su efecto sobre Stock
         return JsonResponse({"ok": True})
     except MovimientoInventario.DoesNotExist:
         return JsonResponse({"ok": False, "error": "Movimiento no encontrado"}, status=404)
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "error": " ".join(e.messages)}, status=400)
 
 
 @login_required
@@ -295,36 +508,450 @@ def export_xlsx(request):
     """
     Exporta los movimientos de inventario a Excel (atajo).
     """
-    if Workbook is None:
-        return HttpResponse("La librería 'openpyxl' es necesaria para exportar a Excel. Instálala con: pip install openpyxl", status=500)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Movimientos"
-
-    headers = [
-        "Fecha", "Tipo", "Producto", "Proveedor", "Cantidad",
-        "Usuario", "Lote", "Serie", "Vencimiento", "Doc Ref"
-    ]
-    ws.append(headers)
-
-    movimientos = MovimientoInventario.objects.select_related("producto", "proveedor").order_by("-fecha")
-
-    for m in movimientos:
-        ws.append([
-            m.fecha.strftime("%Y-%m-%d") if m.fecha else "",
-            getattr(m, "tipo", ""),
-            getattr(m.producto, "nombre", ""),
-            getattr(m.proveedor, "razon_social", "") if m.proveedor else "",
-            m.cantidad,
-            getattr(m.creado_por, "username", "Sistema") if m.creado_por else "Sistema",
-            m.lote or "",
-            getattr(m, "serie", "") or "",
-            m.fecha_vencimiento.strftime("%Y-%m-%d") if getattr(m, "fecha_vencimiento", None) else "",
-            getattr(m, "observacion", "") or ""
-        ])
-
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response["Content-Disposition"] = 'attachment; filename="movimientos.xlsx"'
-    wb.save(response)
-    return response
+    formato = (request.GET.get("formato") or "xlsx").strip()
+    if request.GET.get("async") == "1":
+        return _encolar_respuesta(request, "movimientos_simple", formato, {})
+
+    movimientos = MovimientoInventario.objects.order_by("-fecha")
+    return respuesta_exportacion(movimientos, COLUMNAS_EXPORT_SIMPLE, "movimientos", formato=formato, hoja="Movimientos")
+
+
+# ----------------------- Exportaciones en segundo plano -----------------------
+
+def _trabajo_to_dict(trabajo):
+    data = {
+        "ok": True,
+        "job_id": trabajo.id,
+        "estado": trabajo.estado,
+        "estado_url": reverse("transactional:exportacion_estado", args=[trabajo.id]),
+    }
+    if trabajo.estado == TrabajoExportacion.ESTADO_LISTO:
+        data["descarga_url"] = reverse("transactional:exportacion_descargar", args=[trabajo.id])
+    if trabajo.estado == TrabajoExportacion.ESTADO_ERROR:
+        data["error"] = trabajo.error
+    return data
+
+
+def _encolar_respuesta(request, tipo, formato, parametros):
+    try:
+        trabajo, nuevo = exportaciones.encolar(tipo, formato, parametros, request.user)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    data = _trabajo_to_dict(trabajo)
+    data["reutilizado"] = not nuevo
+    return JsonResponse(data, status=202)
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def exportacion_estado(request, job_id):
+    trabajo = get_object_or_404(TrabajoExportacion, id=job_id)
+    return JsonResponse(_trabajo_to_dict(trabajo))
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def exportacion_descargar(request, job_id):
+    trabajo = get_object_or_404(TrabajoExportacion, id=job_id, estado=TrabajoExportacion.ESTADO_LISTO)
+    try:
+        archivo = open(exportaciones.ruta_archivo(trabajo), "rb")
+    except FileNotFoundError:
+        raise Http404("El archivo ya no está disponible; vuelve a exportar.")
+    return FileResponse(archivo, as_attachment=True, filename=trabajo.nombre_descarga)
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS")
+def reporte_vencimientos(request):
+    """Stock vencido / por vencer por bodega y categoría (lee StockVencimiento, ver vencimientos.py)."""
+    return render(request, "reporte_vencimientos.html", {"reporte": vencimientos.reporte()})
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS")
+def vencimientos_datos(request):
+    return JsonResponse({"ok": True, **vencimientos.reporte()})
+
+
+def _parametros_matriz(request):
+    """Filtros de la matriz de stock desde GET (también se guardan en la exportación diferida)."""
+    ids = [int(x) for x in (request.GET.get("bodegas") or "").split(",") if x.strip().isdigit()]
+    categoria = (request.GET.get("categoria") or "").strip()
+    return {
+        "q": (request.GET.get("q") or "").strip(),
+        "categoria": int(categoria) if categoria.isdigit() else None,
+        "bodegas": ids,
+        "con_stock": request.GET.get("con_stock") == "1",
+        "inactivos": request.GET.get("inactivos") == "1",
+    }
+
+
+def matriz_desde_parametros(parametros):
+    """(bodegas, queryset ordenado por SKU) de la matriz para `parametros`."""
+    lista = matriz.bodegas(parametros.get("bodegas"))
+    qs = matriz.queryset(lista, parametros.get("q", ""), parametros.get("categoria"),
+                         con_stock=parametros.get("con_stock", False), inactivos=parametros.get("inactivos", False))
+    return lista, qs.order_by("sku", "pk")
+
+
+def _pagina_matriz(request, parametros):
+    lista, qs = matriz_desde_parametros(parametros)
+    try:
+        por_pagina = min(max(int(request.GET.get("por_pagina") or 50), 1), matriz.MAX_POR_PAGINA)
+    except ValueError:
+        por_pagina = 50
+    pagina = PaginadorCursor(qs, "sku", por_pagina).pagina(request.GET.get("cursor"), request.GET.get("conteo"))
+    return lista, pagina
+
+
+def _filtros_matriz(request):
+    # Query string de los filtros activos, para los enlaces de paginación y exportación
+    filtros = request.GET.copy()
+    for clave in ("cursor", "export", "async", "modo"):
+        filtros.pop(clave, None)
+    return filtros.urlencode()
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def matriz_stock(request):
+    """
+    Stock por producto (filas) y bodega (columnas), paginado por cursor.
+    GET [?q=][&categoria=ID][&bodegas=1,2][&con_stock=1][&inactivos=1][&cursor=][&por_pagina=50]
+    ?export=xlsx|csv descarga la matriz completa (con &async=1, como exportación diferida).
+    """
+    parametros = _parametros_matriz(request)
+    export = request.GET.get("export", "")
+    if export in FORMATOS and request.GET.get("async") == "1":
+        return _encolar_respuesta(request, "matriz_stock", export, parametros)
+    if export in FORMATOS:
+        lista, qs = matriz_desde_parametros(parametros)
+        return respuesta_exportacion(qs, matriz.columnas_export(lista), "stock_por_bodega", formato=export,
+                                     hoja="Stock por bodega")
+
+    lista, pagina = _pagina_matriz(request, parametros)
+    return render(request, "matriz_stock.html", {
+        "bodegas": lista,
+        "filas": [matriz.fila(p, lista) for p in pagina],
+        "page_obj": pagina,
+        "parametros": parametros,
+        "categorias": Categoria.objects.order_by("nombre"),
+        "filtros": _filtros_matriz(request),
+    })
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def matriz_stock_datos(request):
+    """JSON de una página de la matriz (mismos parámetros que matriz_stock)."""
+    lista, pagina = _pagina_matriz(request, _parametros_matriz(request))
+    return JsonResponse({
+        "ok": True,
+        "bodegas": [{"id": b.pk, "nombre": b.nombre} for b in lista],
+        "filas": [matriz.fila(p, lista) for p in pagina],
+        "next_cursor": pagina.next_cursor,
+        "prev_cursor": pagina.prev_cursor,
+        "total": pagina.count,
+        "total_exacto": pagina.count_exacto,
+    })
+
+
+@login_required
+@require_roles("ADMIN", "PRODUCCION", "INVENTARIO", "VENTAS", "COMPRAS")
+def stock_a_fecha(request):
+    """
+    Stock a una fecha (cierres.py). GET ?fecha=AAAA-MM-DD[&producto=SKU|ID][&bodega=ID|nombre][&agrupar=bodega]
+    Por defecto una línea por lote; agrupar=bodega suma por producto×bodega.
+    """
+    try:
+        dia = date.fromisoformat((request.GET.get("fecha") or "").strip())
+    except ValueError:
+        return JsonResponse({"ok": False, "errors": {"fecha": "Fecha requerida (AAAA-MM-DD)."}}, status=400)
+    if dia > timezone.localdate():
+        return JsonResponse({"ok": False, "errors": {"fecha": "La fecha no puede ser futura."}}, status=400)
+
+    producto_ids = bodega_ids = None
+    ref = (request.GET.get("producto") or "").strip()
+    if ref:
+        producto = Producto.objects.filter(sku=ref.upper()).first() or (
+            Producto.objects.filter(pk=int(ref)).first() if ref.isdigit() else None)
+        if not producto:
+            return JsonResponse({"ok": False, "errors": {"producto": "Producto no encontrado."}}, status=400)
+        producto_ids = [producto.pk]
+    ref = (request.GET.get("bodega") or "").strip()
+    if ref:
+        bodega = _bodega_por_ref(ref)
+        if not bodega:
+            return JsonResponse({"ok": False, "errors": {"bodega": "Bodega no encontrada."}}, status=400)
+        bodega_ids = {bodega.pk}
+
+    saldos, cierre, reproducidos = cierres.stock_al(cierres.fin_del_dia(dia), producto_ids, bodega_ids)
+    if request.GET.get("agrupar") == "bodega":
+        agrupado = {}
+        for (p, b, *_), cantidad in saldos.items():
+            agrupado[(p, b)] = agrupado.get((p, b), 0) + cantidad
+        filas = [((p, b), c) for (p, b), c in agrupado.items() if c]
+    else:
+        filas = list(saldos.items())
+
+    productos = dict(Producto.objects.filter(pk__in={k[0] for k, _ in filas}).values_list("pk", "sku"))
+    bodegas = dict(Bodega.objects.values_list("pk", "nombre"))
+    lineas = []
+    for k, cantidad in sorted(filas, key=lambda kv: (productos.get(kv[0][0], ""), bodegas.get(kv[0][1], ""), kv[0][2:])):
+        linea = {"sku": productos.get(k[0]), "producto_id": k[0], "bodega": bodegas.get(k[1]), "bodega_id": k[1],
+                 "cantidad": cantidad}
+        if len(k) > 2:
+            linea.update(lote=k[2], serie=k[3], fecha_vencimiento=k[4])
+        lineas.append(linea)
+
+    return JsonResponse({
+        "ok": True,
+        "fecha": dia,
+        "cierre": cierre.fecha_corte if cierre else None,
+        "movimientos_reproducidos": reproducidos,
+        "lineas": lineas,
+    })
+
+
+_METODOS_KARDEX = {"promedio": kardex.PROMEDIO, "fifo": kardex.FIFO}
+MAX_FILAS_KARDEX = 5000
+
+
+def _parametros_kardex(request):
+    """(metodo, desde, hasta) desde el GET, o un dict de errores."""
+    errors = {}
+    metodo = _METODOS_KARDEX.get((request.GET.get("metodo") or "promedio").strip().lower())
+    if not metodo:
+        errors["metodo"] = "Método inválido (promedio o fifo)."
+    rango = {}
+    for campo in ("desde", "hasta"):
+        valor = (request.GET.get(campo) or "").strip()
+        try:
+            rango[campo] = date.fromisoformat(valor) if valor else None
+        except ValueError:
+            errors[campo] = "Fecha inválida (AAAA-MM-DD)."
+    if errors:
+        return errors
+    desde = timezone.make_aware(datetime.combine(rango["desde"], time.min)) if rango["desde"] else None
+    hasta = cierres.fin_del_dia(rango["hasta"]) if rango["hasta"] else None
+    return metodo, desde, hasta
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO", "COMPRAS")
+def kardex_producto(request):
+    """
+    Kardex de un producto (kardex.py). GET ?producto=SKU|ID[&metodo=promedio|fifo][&desde=AAAA-MM-DD][&hasta=AAAA-MM-DD]
+    """
+    parametros = _parametros_kardex(request)
+    if isinstance(parametros, dict):
+        return JsonResponse({"ok": False, "errors": parametros}, status=400)
+    metodo, desde, hasta = parametros
+
+    ref = (request.GET.get("producto") or "").strip()
+    producto = Producto.objects.filter(sku=ref.upper()).first() if ref else None
+    if not producto and ref.isdigit():
+        producto = Producto.objects.filter(pk=int(ref)).first()
+    if not producto:
+        return JsonResponse({"ok": False, "errors": {"producto": "Producto no encontrado."}}, status=400)
+
+    k = kardex.Kardex(producto, metodo, desde=desde, hasta=hasta)
+    filas, truncado = [], False
+    for fila in k.filas():
+        if len(filas) == MAX_FILAS_KARDEX:
+            truncado = True
+            continue  # se sigue recorriendo para informar el saldo final
+        filas.append(fila)
+    return JsonResponse({
+        "ok": True,
+        "producto": {"id": producto.pk, "sku": producto.sku, "nombre": producto.nombre},
+        "metodo": metodo,
+        "filas": filas,
+        "truncado": truncado,
+        "saldo": {"cantidad": k.estado.cantidad, "valor": k.estado.valor.quantize(kardex.CUATRO),
+                  "costo_unitario": k.estado.costo_unitario},
+    })
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO", "COMPRAS")
+def valorizacion_inventario(request):
+    """
+    Valorización del inventario por producto. GET [?metodo=promedio|fifo][&hasta=AAAA-MM-DD]
+    Para el cálculo completo en paralelo: `manage.py valorizar_inventario --procesos N`.
+    """
+    parametros = _parametros_kardex(request)
+    if isinstance(parametros, dict):
+        return JsonResponse({"ok": False, "errors": parametros}, status=400)
+    metodo, _, hasta = parametros
+    filas = kardex.valorizar(metodo, hasta=hasta)
+    return JsonResponse({
+        "ok": True,
+        "metodo": metodo,
+        "filas": filas,
+        "total": sum((f["valor"] for f in filas), Decimal("0")),
+    })
+
+
+# -------------------------- Conteos cíclicos --------------------------
+
+MAX_DIFERENCIAS = 500
+
+COLUMNAS_CONTEO = [
+    Columna("SKU", "producto__sku"),
+    Columna("Producto", "producto__nombre"),
+    Columna("Lote", "lote", o_defecto("")),
+    Columna("Serie", "serie", o_defecto("")),
+    Columna("Vencimiento", "fecha_vencimiento", fecha("%Y-%m-%d")),
+    Columna("Esperado", "esperado"),
+    Columna("Contado", "contado", o_defecto("")),
+    Columna("Diferencia", "diferencia", o_defecto("")),
+]
+
+
+def _conteo_to_dict(conteo):
+    return {
+        "id": conteo.id,
+        "bodega": conteo.bodega.nombre,
+        "categoria": conteo.categoria.nombre if conteo.categoria_id else None,
+        "estado": conteo.estado,
+        "lineas": conteo.lineas,
+        "contadas": conteo.contadas,
+        "ajustes": conteo.ajustes,
+        "creado_en": conteo.creado_en.isoformat(),
+        "cerrado_en": conteo.cerrado_en.isoformat() if conteo.cerrado_en else None,
+        "url": reverse("transactional:conteo", args=[conteo.id]),
+    }
+
+
+def _conteo_o_404(conteo_id):
+    return get_object_or_404(ConteoInventario.objects.select_related("bodega", "categoria"), pk=conteo_id)
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO")
+@require_POST
+def abrir_conteo(request):
+    """
+    Abre un conteo cíclico y congela el stock esperado.
+    Body: {"bodega": ID o nombre, "categoria": ID opcional, "observacion": ""}
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+
+    bodega = _bodega_por_ref(str(data.get("bodega") or "").strip())
+    if not bodega:
+        return JsonResponse({"ok": False, "errors": {"bodega": "Bodega no encontrada."}}, status=400)
+    categoria = None
+    ref_categoria = str(data.get("categoria") or "").strip()
+    if ref_categoria:
+        categoria = Categoria.objects.filter(pk=int(ref_categoria)).first() if ref_categoria.isdigit() else None
+        if not categoria:
+            return JsonResponse({"ok": False, "errors": {"categoria": "Categoría no encontrada."}}, status=400)
+
+    try:
+        conteo = conteos.abrir(bodega, usuario=request.user, categoria=categoria,
+                               observacion=str(data.get("observacion") or "").strip())
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "error": " ".join(e.messages)}, status=400)
+    return JsonResponse({"ok": True, "conteo": _conteo_to_dict(conteo)})
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO")
+def conteo_detalle(request, conteo_id):
+    """
+    Estado del conteo y sus diferencias (las primeras MAX_DIFERENCIAS, mayores primero).
+    ?export=xlsx|csv descarga todas las líneas (esperado, contado, diferencia).
+    ?no_contadas=cero muestra las líneas sin contar como diferencia (conteo completo).
+    """
+    conteo = _conteo_o_404(conteo_id)
+    export = request.GET.get("export", "")
+    if export in FORMATOS:
+        qs = (ConteoLinea.objects.filter(conteo=conteo).annotate(diferencia=F("contado") - F("esperado"))
+              .order_by("producto__sku", "lote", "serie", "fecha_vencimiento"))
+        return respuesta_exportacion(qs, COLUMNAS_CONTEO, f"conteo_{conteo.pk}", formato=export, hoja="Conteo")
+
+    en_cero = request.GET.get("no_contadas") == "cero"
+    filas = list(
+        conteos.diferencias(conteo, en_cero)
+        .values_list("producto__sku", "lote", "serie", "fecha_vencimiento", "esperado", "contado", "diferencia")
+    )
+    filas.sort(key=lambda f: abs(f[6]), reverse=True)
+    return JsonResponse({
+        "ok": True,
+        "conteo": _conteo_to_dict(conteo),
+        "total_diferencias": len(filas),
+        "sobrantes": sum((f[6] for f in filas if f[6] > 0), Decimal("0")),
+        "faltantes": sum((f[6] for f in filas if f[6] < 0), Decimal("0")),
+        "diferencias": [
+            {"sku": sku, "lote": lote, "serie": serie, "fecha_vencimiento": venc.isoformat() if venc else None,
+             "esperado": esperado, "contado": contado, "diferencia": diferencia}
+            for sku, lote, serie, venc, esperado, contado, diferencia in filas[:MAX_DIFERENCIAS]
+        ],
+    })
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO")
+@require_POST
+def cargar_conteo(request, conteo_id):
+    """
+    Carga las cantidades contadas desde un archivo CSV o XLSX (campo `archivo`, multipart).
+    Columnas: producto (o sku), cantidad y opcionalmente lote, serie, fecha_vencimiento.
+    Con parcial=1 se cargan las filas válidas aunque otras tengan errores.
+    """
+    conteo = _conteo_o_404(conteo_id)
+    archivo = request.FILES.get("archivo")
+    if not archivo:
+        return JsonResponse({"ok": False, "error": "Debe adjuntar el archivo del conteo."}, status=400)
+    parcial = request.POST.get("parcial") in ("1", "true", "on")
+    try:
+        filas = conteos.leer_archivo(archivo.read(), archivo.name)
+        cargadas, nuevas, errores = conteos.cargar(conteo.pk, filas, parcial=parcial)
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "error": " ".join(e.messages)}, status=400)
+    except ImproperlyConfigured as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({"ok": False, "error": "No se pudo leer el archivo (use CSV UTF-8 o XLSX)."}, status=400)
+
+    errores = [{"fila": n, "error": msg} for n, msg in sorted(errores.items())]
+    if errores and not parcial:
+        return JsonResponse({"ok": False, "errores": errores}, status=400)
+    conteo.refresh_from_db()
+    return JsonResponse({"ok": True, "cargadas": cargadas, "nuevas": nuevas, "errores": errores,
+                         "conteo": _conteo_to_dict(conteo)})
+
+
+@login_required
+@require_roles("ADMIN", "INVENTARIO")
+@require_POST
+def cerrar_conteo(request, conteo_id):
+    """
+    Registra los ajustes del conteo en una sola transacción y lo cierra.
+    Body opcional: {"no_contadas_en_cero": false, "anular": false}
+    """
+    conteo = _conteo_o_404(conteo_id)
+    try:
+        data = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"ok": False, "error": "Payload inválido"}, status=400)
+
+    try:
+        if data.get("anular"):
+            conteos.anular(conteo)
+            ajustes = []
+        else:
+            ajustes = conteos.cerrar(conteo.pk, usuario=request.user,
+                                     no_contadas_en_cero=bool(data.get("no_contadas_en_cero")))
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "error": " ".join(e.messages)}, status=400)
+    conteo.refresh_from_db()
+    return JsonResponse({"ok": True, "ajustes": len(ajustes), "conteo": _conteo_to_dict(conteo)})
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+import django.core.validators
+from django.db import migrations, models
+
+from lilis_erp.texto import rellenar_normalizados
+
+
+def rellenar(apps, schema_editor):
+    rellenar_normalizados(apps.get_model("users", "Usuario"), {"first_name": "first_name_norm", "last_name": "last_name_norm"})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_usuario_invite_code_usuario_must_change_password'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='first_name_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=150, verbose_name='Nombre normalizado'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='last_name_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=150, verbose_name='Apellido normalizado'),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='telefono',
+            field=models.CharField(blank=True, max_length=30, validators=[django.core.validators.RegexValidator(message='Formato inválido: debe ser +569XXXXXXXX (12 caracteres).', regex='^\\+569\\d{8}$')], verbose_name='Teléfono'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['first_name_norm'], name='users_usuar_first_n_40a37b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['last_name_norm'], name='users_usuar_last_na_acd2e9_idx'),
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
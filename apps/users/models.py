@@ -4,6 +4,8 @@ from django.db.models.functions import Upper
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 
+from lilis_erp.texto import NormalizaTextoMixin
+
 # NUEVO: validador específico para celular chileno +569XXXXXXXX
 telefono_chile_validator = RegexValidator(
     regex=r'^\+569\d{8}$',
@@ -11,7 +13,9 @@ telefono_chile_validator = RegexValidator(
 )
 
 
-class Usuario(AbstractUser):
+class Usuario(NormalizaTextoMixin, AbstractUser):
+    CAMPOS_NORMALIZADOS = {"first_name": "first_name_norm", "last_name": "last_name_norm"}
+
     class Roles(models.TextChoices):
         ADMIN = 'ADMIN', _('Administrador')
         COMPRAS = 'COMPRAS', _('Operador de Compras')
@@ -41,6 +45,10 @@ class Usuario(AbstractUser):
         validators=[telefono_chile_validator],  # <-- AQUÍ USAMOS EL NUEVO VALIDADOR
     )
 
+    # Copias sin tildes y en mayúsculas para búsquedas por prefijo (ver lilis_erp/texto.py)
+    first_name_norm = models.CharField("Nombre normalizado", max_length=150, blank=True, default="", editable=False)
+    last_name_norm = models.CharField("Apellido normalizado", max_length=150, blank=True, default="", editable=False)
+
     rol = models.CharField(_("Rol"), max_length=20, choices=Roles.choices, default=Roles.VENTAS)
 
     # NUEVO: el estado que tu UI/vistas usan
@@ -75,6 +83,8 @@ class Usuario(AbstractUser):
         verbose_name_plural = "Usuarios"
         indexes = [
             models.Index(fields=["username"]),
+            models.Index(fields=["first_name_norm"]),
+            models.Index(fields=["last_name_norm"]),
             # índice case-insensitive para búsquedas por email:
             models.Index(Upper("email"), name="user_email_upper_idx"),
             models.Index(fields=["activo"]),
@@ -2,60 +2,36 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, HttpRequest
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.db.models import Q
 from django.db import transaction
-from datetime import datetime
+
+from lilis_erp.paginacion import paginar
+from lilis_erp.texto import prefijo_q
+from lilis_erp.exportar import Columna, FORMATOS, fecha, o_defecto, respuesta_exportacion, si_no
 
 from .models import Usuario
 from .utils_invite import invite_user_and_email
 
-# ====== export a Excel (openpyxl) ======
-try:
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    Workbook = None
-
-def _usuarios_to_excel(queryset):
-    if Workbook is None:
-        return HttpResponse(
-            "Falta dependencia: instala openpyxl (pip install openpyxl)",
-            status=500,
-            content_type="text/plain; charset=utf-8",
-        )
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Usuarios"
-    headers = ["ID", "Username", "Email", "Nombre", "Apellido", "Teléfono",
-               "Rol", "Estado", "Activo", "MFA", "Último acceso", "Creado"]
-    ws.append(headers)
-    for u in queryset:
-        ws.append([
-            u.id, u.username, u.email, u.first_name or "", u.last_name or "",
-            u.telefono or "", getattr(u, "rol", ""), getattr(u, "estado", ""),
-            "Sí" if u.activo else "No",
-            "Sí" if getattr(u, "mfa_habilitado", False) else "No",
-            u.last_login.strftime("%d/%m/%Y %H:%M") if u.last_login else "",
-            u.date_joined.strftime("%d/%m/%Y %H:%M") if u.date_joined else "",
-        ])
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                max_len = max(max_len, len(str(cell.value)) if cell.value else 0)
-            except Exception:
-                pass
-        ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    filename = f"usuarios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+# ====== export a Excel / CSV ======
+COLUMNAS_EXPORT = [
+    Columna("ID", "id"),
+    Columna("Username", "username"),
+    Columna("Email", "email"),
+    Columna("Nombre", "first_name", o_defecto("")),
+    Columna("Apellido", "last_name", o_defecto("")),
+    Columna("Teléfono", "telefono", o_defecto("")),
+    Columna("Rol", "rol", o_defecto("")),
+    Columna("Estado", "estado", o_defecto("")),
+    Columna("Activo", "activo", si_no),
+    Columna("MFA", "mfa_habilitado", si_no),
+    Columna("Último acceso", "last_login", fecha("%d/%m/%Y %H:%M")),
+    Columna("Creado", "date_joined", fecha("%d/%m/%Y %H:%M")),
+]
+
+
+def _usuarios_to_excel(queryset, formato="xlsx"):
+    return respuesta_exportacion(queryset, COLUMNAS_EXPORT, "usuarios", formato=formato, hoja="Usuarios")
 
 def _rol_from_text(q: str):
     q = (q or "").strip().lower()
@@ -106,12 +82,15 @@ def gestion_usuarios(request):
     q = (request.GET.get('q') or '').strip()
     expr = Q()
     if q:
-        # username, nombre, apellido, email, teléfono
-        expr |= Q(username__icontains=q)
-        expr |= Q(first_name__icontains=q)
-        expr |= Q(last_name__icontains=q)
-        expr |= Q(email__icontains=q)
-        expr |= Q(telefono__icontains=q)
+        # Por prefijo sobre columnas indexadas (nombre/apellido sin tildes ni mayúsculas)
+        expr |= Q(username__istartswith=q)
+        expr |= Q(email__istartswith=q)
+        expr |= prefijo_q("first_name_norm", q)
+        expr |= prefijo_q("last_name_norm", q)
+        # "Juan Pérez" -> nombre empieza con JUAN y apellido con PEREZ
+        partes = q.split(None, 1)
+        if len(partes) == 2:
+            expr |= prefijo_q("first_name_norm", partes[0]) & prefijo_q("last_name_norm", partes[1])
 
         # ID exacto si es número
         try:
@@ -128,12 +107,10 @@ def gestion_usuarios(request):
 
     usuarios_list = usuarios_list.order_by(sort_by)
 
-    if export == 'xlsx':
-        return _usuarios_to_excel(usuarios_list)
+    if export in FORMATOS:
+        return _usuarios_to_excel(usuarios_list, formato=export)
     
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(usuarios_list, 10)
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginar(request, usuarios_list, sort_by)
 
     return render(
         request,
@@ -0,0 +1,245 @@
+# lilis_erp/exportar.py
+"""
+Motor de exportación compartido (XLSX / CSV) para todos los módulos.
+
+Cada listado declara sus columnas con `Columna(titulo, campo, formato)`; las filas
+se leen con values_list() (sin instanciar modelos) por trozos de CHUNK filas, cada
+uno su propia consulta: con mysqlclient no hay cursor del lado del servidor e
+iterator() igual recibe el resultado completo en el driver. Los trozos se piden por
+keyset sobre el orden del queryset + pk (WHERE (orden, pk) > último visto), así que
+la memoria es la de un trozo en cualquier motor. Si el orden no lo permite
+(expresiones, columnas con NULL) se cae a LIMIT/OFFSET. Las filas se escriben en
+streaming:
+
+- CSV: StreamingHttpResponse fila a fila, memoria constante.
+- XLSX: openpyxl en modo write_only sobre un archivo temporal en disco, que luego
+  se envía por trozos con FileResponse. El ancho de columnas se estima con una
+  muestra de las primeras filas (no se recorre la hoja completa otra vez).
+
+Uso en una vista:
+    return respuesta_exportacion(qs, COLUMNAS, "productos", formato="xlsx", hoja="Productos")
+"""
+import csv
+import operator
+import tempfile
+from datetime import datetime
+from functools import reduce
+from itertools import chain, islice
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+# Excel opcional
+try:
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+except ImportError:
+    Workbook = None
+
+FORMATOS = ("xlsx", "csv")
+CHUNK = 2000          # filas por ida a la BD
+MUESTRA = 200         # filas usadas para estimar el ancho de columnas
+ANCHO_MAX = 50
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class Columna:
+    """
+    Especificación declarativa de una columna exportada.
+    - titulo: encabezado
+    - campo: ruta para values_list ("producto__sku"); None si sólo depende de `formato`
+    - formato: callable(valor) -> valor de celda (fechas, "Sí"/"No", valores por defecto...)
+    """
+
+    def __init__(self, titulo, campo, formato=None):
+        self.titulo = titulo
+        self.campo = campo
+        self.formato = formato
+
+
+# -------------------------- Formatos comunes --------------------------
+
+def si_no(valor):
+    return "Sí" if valor else "No"
+
+
+def fecha(patron, vacio=""):
+    def _fmt(valor):
+        return valor.strftime(patron) if valor else vacio
+    return _fmt
+
+
+def o_defecto(defecto):
+    def _fmt(valor):
+        return valor if valor not in (None, "") else defecto
+    return _fmt
+
+
+# -------------------------- Lectura de filas --------------------------
+
+def _no_nulo(modelo, campo):
+    """True si la ruta `campo` ("producto__nombre") nunca es NULL (FKs intermedias incluidas)."""
+    partes = campo.split("__")
+    try:
+        for parte in partes:
+            field = modelo._meta.get_field(parte)
+            if not field.concrete or field.null:
+                return False
+            modelo = field.related_model
+    except FieldDoesNotExist:
+        return False  # anotación u otra expresión
+    return True
+
+
+def _orden_keyset(queryset):
+    """[(campo, descendente)] terminado en pk para recorrer `queryset` por keyset, o None."""
+    query = queryset.query
+    if query.combinator or query.distinct or query.low_mark or query.high_mark is not None:
+        return None
+    orden = list(query.order_by or (queryset.model._meta.ordering if query.default_ordering else []))
+    nombre_pk = queryset.model._meta.pk.name
+    resultado = []
+    for item in orden:
+        if not isinstance(item, str) or item == "?":
+            return None
+        desc, campo = item.startswith("-"), item.lstrip("-")
+        if campo in ("pk", nombre_pk):
+            resultado.append(("pk", desc))
+            return resultado  # el pk es único: lo que siga no cambia el orden
+        if campo in query.annotations or not _no_nulo(queryset.model, campo):
+            return None
+        resultado.append((campo, desc))
+    resultado.append(("pk", False))
+    return resultado
+
+
+def _despues_de(orden, valores):
+    """WHERE (c1, c2, ..., pk) viene después de `valores` en `orden` (comparación lexicográfica)."""
+    condiciones, iguales = [], Q()
+    for (campo, desc), valor in zip(orden, valores):
+        condiciones.append(iguales & Q(**{f"{campo}__{'lt' if desc else 'gt'}": valor}))
+        iguales &= Q(**{campo: valor})
+    return reduce(operator.or_, condiciones)
+
+
+def _valores_por_trozos(queryset, campos, chunk_size):
+    orden = _orden_keyset(queryset)
+    if orden is None:
+        inicio = 0
+        while True:
+            trozo = list(queryset.values_list(*campos)[inicio:inicio + chunk_size])
+            yield from trozo
+            if len(trozo) < chunk_size:
+                return
+            inicio += chunk_size
+
+    n = len(campos)
+    qs = queryset.order_by(*[("-" if desc else "") + campo for campo, desc in orden])
+    ultimo = None
+    while True:
+        pagina = qs if ultimo is None else qs.filter(_despues_de(orden, ultimo))
+        trozo = list(pagina.values_list(*campos, *[campo for campo, _ in orden])[:chunk_size])
+        for crudo in trozo:
+            yield crudo[:n]
+        if len(trozo) < chunk_size:
+            return
+        ultimo = trozo[-1][n:]
+
+
+def iterar_filas(queryset, columnas, chunk_size=CHUNK):
+    """Genera listas de valores ya formateados, leyendo por trozos (keyset)."""
+    campos = [c.campo for c in columnas if c.campo]
+    posiciones = []
+    i = 0
+    for c in columnas:
+        posiciones.append(i if c.campo else None)
+        if c.campo:
+            i += 1
+
+    for crudo in _valores_por_trozos(queryset, campos, chunk_size):
+        fila = []
+        for col, pos in zip(columnas, posiciones):
+            valor = crudo[pos] if pos is not None else None
+            fila.append(col.formato(valor) if col.formato else valor)
+        yield fila
+
+
+# -------------------------- Escritores --------------------------
+
+def _estimar_anchos(columnas, muestra):
+    anchos = [len(str(c.titulo)) for c in columnas]
+    for fila in muestra:
+        for i, valor in enumerate(fila):
+            if valor is not None:
+                anchos[i] = max(anchos[i], len(str(valor)))
+    return [min(a + 2, ANCHO_MAX) for a in anchos]
+
+
+def escribir_xlsx(destino, filas, columnas, hoja="Datos"):
+    """Escribe un XLSX write-only en `destino` (ruta o archivo binario abierto)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=hoja)
+
+    filas = iter(filas)
+    muestra = list(islice(filas, MUESTRA))
+    for i, ancho in enumerate(_estimar_anchos(columnas, muestra), start=1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    ws.append([c.titulo for c in columnas])
+    for fila in chain(muestra, filas):
+        ws.append(fila)
+    wb.save(destino)
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def iterar_csv(filas, columnas):
+    # BOM + ';' para que Excel en configuración regional es-CL abra el archivo bien
+    escritor = csv.writer(_Eco(), delimiter=";")
+    yield "\ufeff" + escritor.writerow([c.titulo for c in columnas])
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def escribir_csv(destino, filas, columnas):
+    """Escribe el CSV completo en `destino` (archivo de texto abierto)."""
+    for linea in iterar_csv(filas, columnas):
+        destino.write(linea)
+
+
+# -------------------------- Respuesta HTTP --------------------------
+
+def nombre_archivo(base, formato):
+    return f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+
+
+def respuesta_exportacion(queryset, columnas, base_nombre, formato="xlsx", hoja="Datos"):
+    formato = (formato or "xlsx").lower()
+    if formato not in FORMATOS:
+        return HttpResponse("Formato de exportación no soportado (usa xlsx o csv).", status=400,
+                            content_type="text/plain; charset=utf-8")
+
+    filas = iterar_filas(queryset, columnas)
+    filename = nombre_archivo(base_nombre, formato)
+
+    if formato == "csv":
+        resp = StreamingHttpResponse(iterar_csv(filas, columnas), content_type="text/csv; charset=utf-8")
+        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return resp
+
+    if Workbook is None:
+        return HttpResponse("Falta dependencia: instala openpyxl (pip install openpyxl)", status=500,
+                            content_type="text/plain; charset=utf-8")
+
+    # Archivo temporal en disco: se borra solo al cerrarse (FileResponse lo cierra al terminar)
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    escribir_xlsx(tmp, filas, columnas, hoja=hoja)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
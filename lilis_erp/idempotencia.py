@@ -0,0 +1,78 @@
+# lilis_erp/idempotencia.py
+"""
+Soporte de la cabecera Idempotency-Key en las vistas que crean registros.
+
+    @login_required
+    @require_roles(...)
+    @idempotente
+    def crear_algo(request): ...
+
+Sin la cabecera la vista corre igual que siempre. Con ella:
+
+1. Se inserta ClaveIdempotencia(clave=hash(usuario, ruta, Idempotency-Key)) en la misma
+   transacción que la vista: una sola escritura sobre el índice único.
+2. Si no choca, corre la vista y su respuesta queda guardada en esa fila (salvo 5xx: se
+   revierte todo, también la clave, y el cliente puede reintentar).
+3. Si choca, la petición es un reintento: se devuelve la respuesta guardada sin volver a
+   validar, buscar ni tocar stock. Un reintento simultáneo espera en el índice único a
+   que la primera termine. Si el cuerpo es distinto al original se responde 422.
+"""
+import hashlib
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+
+from apps.transactional.models import ClaveIdempotencia
+
+CABECERA = "Idempotency-Key"
+LARGO_MAXIMO = 200
+
+
+def _hash(*partes):
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(parte if isinstance(parte, bytes) else str(parte).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def _reproducir(guardada, huella):
+    if guardada is None or guardada.estado is None:
+        return JsonResponse({"ok": False, "error": "La solicitud original sigue en proceso; reintente."}, status=409)
+    if guardada.huella != huella:
+        return JsonResponse({"ok": False, "error": f"{CABECERA} ya usada con otro contenido."}, status=422)
+    respuesta = HttpResponse(guardada.contenido, status=guardada.estado, content_type=guardada.tipo_contenido)
+    respuesta["Idempotent-Replayed"] = "true"
+    return respuesta
+
+
+def idempotente(view_func):
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        clave_cliente = (request.headers.get(CABECERA) or "").strip()
+        if not clave_cliente:
+            return view_func(request, *args, **kwargs)
+        if len(clave_cliente) > LARGO_MAXIMO:
+            return JsonResponse({"ok": False, "error": f"{CABECERA} demasiado larga."}, status=400)
+
+        clave = _hash(request.user.pk, request.path, clave_cliente)
+        huella = _hash(request.body)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    registro = ClaveIdempotencia.objects.create(clave=clave, huella=huella)
+            except IntegrityError:
+                return _reproducir(ClaveIdempotencia.objects.filter(clave=clave).first(), huella)
+
+            respuesta = view_func(request, *args, **kwargs)
+            if respuesta.status_code >= 500:
+                transaction.set_rollback(True)
+                return respuesta
+            ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+                estado=respuesta.status_code,
+                tipo_contenido=respuesta.get("Content-Type", ""),
+                contenido=respuesta.content.decode(respuesta.charset or "utf-8"),
+            )
+        return respuesta
+    return _wrapped
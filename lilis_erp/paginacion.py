@@ -0,0 +1,216 @@
+# lilis_erp/paginacion.py
+"""
+Paginación por cursor (keyset) compartida por los listados.
+
+El Paginator de Django hace COUNT(*) + OFFSET en cada página; en tablas grandes
+(MovimientoInventario) las páginas profundas se vuelven cada vez más lentas.
+Aquí cada página filtra por (columna de orden, id) a partir del último registro
+visto, así que el costo es el mismo en la página 1 que en la 10.000.
+
+Uso en una vista:
+    page_obj = paginar(request, qs, "-fecha")
+
+- ?modo=cursor (o la presencia de ?cursor=...) activa el modo cursor; sin eso se
+  usa el Paginator clásico, para no cambiar el comportamiento actual.
+- ?conteo=exacto fuerza COUNT(*) en modo cursor; por defecto se estima.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+
+# Hasta cuántas filas contamos "de verdad" antes de mostrar "más de N"
+TOPE_CONTEO = 10000
+
+
+# -------------------------- Tokens opacos --------------------------
+
+def _codificar(valor, pk, direccion):
+    crudo = json.dumps({"v": valor, "id": pk, "d": direccion}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decodificar(token):
+    """Devuelve el dict del cursor o None si el token viene vacío o adulterado."""
+    token = (token or "").strip()
+    if not token:
+        return None
+    try:
+        relleno = "=" * (-len(token) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(token + relleno).decode("utf-8"))
+        if not isinstance(datos, dict) or datos.get("d") not in ("n", "p"):
+            return None
+        int(datos["id"])
+        return datos
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+# -------------------------- Conteo --------------------------
+
+def contar(queryset, estimado=False, tope=TOPE_CONTEO):
+    """
+    Devuelve (total, exacto).
+    - exacto: COUNT(*) normal.
+    - estimado sin filtros en MySQL: estadística de information_schema (instantánea).
+    - estimado con filtros: cuenta como máximo `tope` + 1 filas (LIMIT dentro del COUNT).
+    """
+    if not estimado:
+        return queryset.count(), True
+
+    conexion = connections[queryset.db]
+    if conexion.vendor == "mysql" and not queryset.query.has_filters():
+        with conexion.cursor() as cur:
+            cur.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table],
+            )
+            fila = cur.fetchone()
+        if fila and fila[0] is not None:
+            return int(fila[0]), False
+
+    total = queryset.order_by()[: tope + 1].count()
+    return min(total, tope), total <= tope
+
+
+# -------------------------- Página cursor --------------------------
+
+class PaginaCursor:
+    """
+    Equivalente mínimo a django.core.paginator.Page para el modo cursor.
+    Las plantillas distinguen el modo con `page_obj.modo_cursor`.
+    """
+    modo_cursor = True
+
+    def __init__(self, object_list, next_cursor, prev_cursor, count, count_exacto, conteo):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.count = count
+        self.count_exacto = count_exacto
+        self.conteo = conteo  # se propaga en los enlaces (?conteo=exacto)
+        self.filtros = ""  # query string de la petición sin cursor/modo/page (lo fija paginar)
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+    @property
+    def has_previous(self):
+        return bool(self.prev_cursor)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class PaginadorCursor:
+    """
+    Pagina `queryset` por `orden` (p. ej. "-fecha", "categoria__nombre") + pk.
+    La columna de orden debe ser NOT NULL; el pk desempata.
+    """
+
+    def __init__(self, queryset, orden, por_pagina=10):
+        self.queryset = queryset
+        self.descendente = orden.startswith("-")
+        self.campo = orden.lstrip("-")
+        if self.campo == "id":
+            self.campo = "pk"
+        self.por_pagina = por_pagina
+
+    def _campo_modelo(self):
+        modelo = self.queryset.model
+        partes = self.campo.split("__")
+        for parte in partes[:-1]:
+            modelo = modelo._meta.get_field(parte).related_model
+        return modelo._meta.get_field(partes[-1])
+
+    def _valor(self, obj):
+        valor = obj
+        for parte in self.campo.split("__"):
+            valor = getattr(valor, parte, None)
+        return valor
+
+    def _serializar(self, valor):
+        if valor is None or isinstance(valor, (int, str)):
+            return valor
+        if hasattr(valor, "isoformat"):
+            return valor.isoformat()
+        return str(valor)
+
+    def _token(self, obj, direccion):
+        valor = None if self.campo == "pk" else self._serializar(self._valor(obj))
+        return _codificar(valor, obj.pk, direccion)
+
+    def pagina(self, cursor=None, conteo=None):
+        datos = _decodificar(cursor)
+        hacia_atras = bool(datos) and datos["d"] == "p"
+        desc = self.descendente != hacia_atras
+        op = "lt" if desc else "gt"
+
+        qs = self.queryset
+        if datos:
+            pk = int(datos["id"])
+            if self.campo == "pk":
+                qs = qs.filter(**{f"pk__{op}": pk})
+            else:
+                valor = self._campo_modelo().to_python(datos["v"])
+                qs = qs.filter(Q(**{f"{self.campo}__{op}": valor}) | Q(**{self.campo: valor, f"pk__{op}": pk}))
+
+        orden = (f"-{self.campo}", "-pk") if desc else (self.campo, "pk")
+        if self.campo == "pk":
+            orden = orden[1:]
+        filas = list(qs.order_by(*orden)[: self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[: self.por_pagina]
+        if hacia_atras:
+            filas.reverse()
+
+        # Hacia adelante: siempre hay anterior si llegamos con cursor.
+        # Hacia atrás: siempre hay siguiente (venimos de ella).
+        tiene_siguiente = hay_mas if not hacia_atras else True
+        tiene_anterior = bool(datos) if not hacia_atras else hay_mas
+
+        next_cursor = self._token(filas[-1], "n") if filas and tiene_siguiente else ""
+        prev_cursor = self._token(filas[0], "p") if filas and tiene_anterior else ""
+
+        conteo = (conteo or "").strip().lower()
+        total, exacto = contar(self.queryset, estimado=(conteo != "exacto"))
+        return PaginaCursor(filas, next_cursor, prev_cursor, total, exacto, conteo if conteo == "exacto" else "")
+
+
+# -------------------------- Punto de entrada para vistas --------------------------
+
+def modo_cursor(request):
+    if request.GET.get("cursor") or request.GET.get("modo") == "cursor":
+        return True
+    return getattr(settings, "PAGINACION_CURSOR", False)
+
+
+def filtros(request, *excluir):
+    """Query string de la petición sin el cursor: los enlaces de página conservan todos los filtros."""
+    params = request.GET.copy()
+    for clave in ("cursor", "modo", *excluir):
+        params.pop(clave, None)
+    return params.urlencode()
+
+
+def paginar(request, queryset, orden, por_pagina=10, parametro="page"):
+    """
+    Devuelve una Page clásica (Paginator) o una PaginaCursor según el modo pedido.
+    `orden` es la columna activa del listado ("-id", "razon_social", "-stock_total", ...).
+    """
+    if modo_cursor(request):
+        pagina = PaginadorCursor(queryset, orden, por_pagina).pagina(
+            request.GET.get("cursor"), conteo=request.GET.get("conteo")
+        )
+        pagina.filtros = filtros(request, parametro)
+        return pagina
+    return Paginator(queryset, por_pagina).get_page(request.GET.get(parametro))
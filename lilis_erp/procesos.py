@@ -0,0 +1,27 @@
+# lilis_erp/procesos.py
+"""
+Pool de procesos para trabajos batch (exportaciones, cálculos por producto, etc.).
+
+Se usa el contexto "spawn": cada proceso hijo abre sus propias conexiones a la BD
+(con "fork" compartiría el socket MySQL del padre). El inicializador prepara Django
+antes de que el hijo reciba la primera tarea, así que las funciones enviadas al
+pool pueden vivir en módulos que importan modelos.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def inicializar_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lilis_erp.settings")
+    import django
+    django.setup()
+
+
+def crear_pool(procesos=None):
+    procesos = procesos or os.cpu_count() or 2
+    return ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=inicializar_django,
+    )
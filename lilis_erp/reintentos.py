@@ -0,0 +1,97 @@
+# lilis_erp/reintentos.py
+"""
+Reintento de transacciones que chocan en un deadlock o agotan la espera de un bloqueo.
+
+    @reintentar_bloqueos
+    @transaction.atomic
+    def aplicar(...): ...
+
+Los caminos que escriben stock bloquean las filas en orden fijo (Stock por clave,
+StockResumen por producto×bodega), así que dos movimientos opuestos no deberían
+cruzarse; esto cubre lo que quede (otros órdenes, MySQL eligiendo víctima por
+bloqueos de índice, "database is locked" en SQLite).
+
+- Sólo reintenta si la llamada abre la transacción: dentro de un atomic() externo
+  el error sube y lo reintenta quien abrió la transacción (el motor ya la revirtió).
+- Un decorado dentro de otro decorado no reintenta por su cuenta: lo hace el de afuera,
+  una sola vez por intento (sin multiplicar los reintentos).
+- Espera aleatoria entre 0 y ESPERA_BASE × 2^intento (tope ESPERA_MAXIMA), para que los
+  que chocaron no vuelvan a chocar al mismo tiempo.
+- `contadores` lleva por función los reintentos, los que se recuperaron y los agotados.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+INTENTOS = 4
+ESPERA_BASE = 0.05
+ESPERA_MAXIMA = 1.0
+
+# MySQL/MariaDB: 1213 deadlock, 1205 lock wait timeout
+CODIGOS_MYSQL = {1205, 1213}
+# PostgreSQL: deadlock_detected, lock_not_available, serialization_failure
+CODIGOS_POSTGRES = {"40P01", "55P03", "40001"}
+
+contadores = Counter()
+_local = threading.local()
+
+
+def es_bloqueo(error):
+    """True si `error` es un deadlock / espera de bloqueo agotada (se puede reintentar)."""
+    if not isinstance(error, OperationalError):
+        return False
+    causa = error.__cause__
+    if error.args and error.args[0] in CODIGOS_MYSQL:
+        return True
+    if getattr(causa, "pgcode", None) in CODIGOS_POSTGRES:
+        return True
+    return "database is locked" in str(error)  # SQLite
+
+
+def reintentar_bloqueos(func=None, *, intentos=INTENTOS):
+    """Decorador (con o sin argumentos): reintenta `func` ante es_bloqueo()."""
+    if func is None:
+        return lambda f: reintentar_bloqueos(f, intentos=intentos)
+    nombre = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def _wrapped(*args, **kwargs):
+        if getattr(_local, "activo", False) or connection.in_atomic_block:
+            return func(*args, **kwargs)
+        _local.activo = True
+        try:
+            for intento in range(1, intentos + 1):
+                try:
+                    resultado = func(*args, **kwargs)
+                except OperationalError as e:
+                    if not es_bloqueo(e):
+                        raise
+                    if intento == intentos:
+                        contadores[(nombre, "agotados")] += 1
+                        logger.error("%s: bloqueo tras %d intentos: %s", nombre, intentos, e)
+                        raise
+                    contadores[(nombre, "reintentos")] += 1
+                    logger.warning("%s: bloqueo (intento %d/%d), se reintenta: %s", nombre, intento, intentos, e)
+                    time.sleep(random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** intento)))
+                    continue
+                if intento > 1:
+                    contadores[(nombre, "recuperados")] += 1
+                return resultado
+        finally:
+            _local.activo = False
+    return _wrapped
+
+
+def estadisticas():
+    """{función: {"reintentos", "recuperados", "agotados"}} de este proceso."""
+    resumen = {}
+    for (nombre, evento), n in contadores.items():
+        resumen.setdefault(nombre, {"reintentos": 0, "recuperados": 0, "agotados": 0})[evento] = n
+    return resumen
@@ -192,3 +192,47 @@ SECURE_CROSS_ORIGIN_OPENER_POLICY = None
 # --- Dominio fijo para los enlaces de recuperación de contraseña ---
 PASSWORD_RESET_DOMAIN = "3.85.33.49"   # IP pública de tu instancia EC2
 PASSWORD_RESET_PROTOCOL = "http"       # usa "https" si tienes SSL en la instancia
+
+# --- Paginación de listados ---
+# True: todos los listados usan paginación por cursor (keyset) en vez de COUNT + OFFSET.
+# Con False se puede activar por petición con ?modo=cursor.
+PAGINACION_CURSOR = False
+
+# --- Exportaciones en segundo plano (manage.py exportaciones_worker) ---
+EXPORTACIONES_DIR = BASE_DIR / 'exportaciones'
+EXPORTACIONES_REUSO_MINUTOS = 10      # mismos parámetros dentro de esta ventana -> mismo archivo
+EXPORTACIONES_RETENCION_HORAS = 24    # archivos terminados más viejos se borran
+
+# --- Stock fragmentado (productos con Producto.stock_fragmentado) ---
+# Sub-filas de Stock por clave; `manage.py compactar_stock` las vuelve a juntar.
+# Antes de bajar este valor, compactar.
+STOCK_FRAGMENTOS = 8
+
+# --- Cola de stock (manage.py stock_applier) ---
+# True: POST /transacciones/lote/ encola los lotes de una sola partición y un worker por
+# partición los aplica en serie. Particiones = bodega % STOCK_COLA_PARTICIONES (un worker
+# por cada una). Las demás escrituras de stock no pasan por la cola (ver cola.py).
+STOCK_COLA = False
+STOCK_COLA_PARTICIONES = 4
+STOCK_COLA_ESPERA_SEGUNDOS = 10       # lo que la vista espera la confirmación antes de responder 202
+STOCK_COLA_RETENCION_HORAS = 24       # registros aplicados más viejos se borran
+
+# --- Caché compartida ---
+# Las alertas de bajo stock (apps/products/alertas.py) se invalidan desde cualquier proceso
+# que mueva stock (workers de gunicorn, stock_applier, compactar_stock, resumen_stock): con
+# la caché local por proceso por defecto, el resto seguiría sirviendo la lista vieja. Tabla
+# en la misma base, creada por la migración products 0007 (o `manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_lilis',
+    },
+}
+
+# --- Dashboard ---
+# Segundos que se reutilizan los KPIs (MovimientoDiario) por rol antes de recalcularlos.
+DASHBOARD_KPIS_SEGUNDOS = 60
+
+# --- Idempotencia ---
+# Horas que se guarda la respuesta de una petición con Idempotency-Key (manage.py purgar_idempotencia).
+IDEMPOTENCIA_HORAS = 24
@@ -0,0 +1,110 @@
+# lilis_erp/texto.py
+"""
+Normalización de texto para búsquedas: mayúsculas, sin tildes y espacios colapsados.
+    normalizar_texto("  Dulcería   Añejo ") -> "DULCERIA ANEJO"
+
+- Los modelos guardan copias normalizadas e indexadas de sus nombres
+  (NormalizaTextoMixin + columnas *_norm), que se consultan con prefijo_q().
+- prefijo_q() expresa "empieza con" como un rango (>= / <) además del LIKE, para
+  que el motor pueda usar el índice de la columna en vez de recorrer la tabla.
+"""
+import re
+import unicodedata
+
+from django.db.models import Q
+
+_NO_ALFANUM = re.compile(r"[^0-9A-Z]+")
+LOTE = 1000
+
+
+def normalizar_texto(valor):
+    s = unicodedata.normalize("NFKD", valor or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.upper().split())
+
+
+def tokens(valor):
+    """Palabras alfanuméricas normalizadas ("ABC-12 Maní" -> ["ABC", "12", "MANI"])."""
+    return [t for t in _NO_ALFANUM.split(normalizar_texto(valor)) if t]
+
+
+# -------------------------- Prefijos indexables --------------------------
+
+def _siguiente_prefijo(prefijo):
+    """
+    Cota superior para "empieza con `prefijo`" ("CAR" -> "CAS", "AZ" -> "B", "ZZ" -> None).
+    Sólo usa 0-9A-Z, que ordenan igual en collation binaria y en las *_ci de MySQL;
+    lo que venga después de la última letra/dígito se ignora (la cota queda más holgada).
+    """
+    base = re.sub(r"[^0-9A-Z].*$", "", prefijo).rstrip("Z")
+    if not base:
+        return None
+    ultimo = base[-1]
+    return base[:-1] + ("A" if ultimo == "9" else chr(ord(ultimo) + 1))
+
+
+def prefijo_q(campo, texto, normalizar=True):
+    """
+    Q para `campo` (columna ya normalizada) que empieza con `texto`.
+    El rango acota el índice; el startswith final asegura el resultado exacto.
+    """
+    prefijo = normalizar_texto(texto) if normalizar else (texto or "")
+    if not prefijo:
+        return Q()
+    cond = Q(**{f"{campo}__gte": prefijo, f"{campo}__startswith": prefijo})
+    tope = _siguiente_prefijo(prefijo)
+    if tope:
+        cond &= Q(**{f"{campo}__lt": tope})
+    return cond
+
+
+# -------------------------- Columnas normalizadas --------------------------
+
+class NormalizaTextoMixin:
+    """
+    Mantiene columnas normalizadas al guardar.
+        CAMPOS_NORMALIZADOS = {"nombre": "nombre_norm"}
+    Si se guarda con update_fields, la columna normalizada se agrega sola.
+    """
+    CAMPOS_NORMALIZADOS = {}
+
+    def normalizar_campos(self):
+        for origen, destino in self.CAMPOS_NORMALIZADOS.items():
+            largo = self._meta.get_field(destino).max_length
+            setattr(self, destino, normalizar_texto(getattr(self, origen, ""))[:largo])
+
+    def save(self, *args, **kwargs):
+        self.normalizar_campos()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = [d for o, d in self.CAMPOS_NORMALIZADOS.items() if o in update_fields]
+            kwargs["update_fields"] = list(dict.fromkeys(list(update_fields) + extra))
+        super().save(*args, **kwargs)
+
+
+def rellenar_normalizados(modelo, campos, lote=LOTE):
+    """
+    Recalcula las columnas normalizadas de `modelo` ({origen: destino}) con bulk_update.
+    Sirve para el comando de relleno y para migraciones (modelos históricos).
+    Devuelve cuántas filas cambiaron.
+    """
+    largos = {d: modelo._meta.get_field(d).max_length for d in campos.values()}
+    nombres = ["pk", *campos.keys(), *campos.values()]
+    cambiadas, pendientes = 0, []
+    for obj in modelo._default_manager.only(*nombres[1:]).order_by("pk").iterator(chunk_size=lote):
+        cambio = False
+        for origen, destino in campos.items():
+            valor = normalizar_texto(getattr(obj, origen))[:largos[destino]]
+            if getattr(obj, destino) != valor:
+                setattr(obj, destino, valor)
+                cambio = True
+        if cambio:
+            pendientes.append(obj)
+        if len(pendientes) >= lote:
+            modelo._default_manager.bulk_update(pendientes, list(campos.values()))
+            cambiadas += len(pendientes)
+            pendientes = []
+    if pendientes:
+        modelo._default_manager.bulk_update(pendientes, list(campos.values()))
+        cambiadas += len(pendientes)
+    return cambiadas
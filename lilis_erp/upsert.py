@@ -0,0 +1,59 @@
+# lilis_erp/upsert.py
+"""
+INSERT ... que suma sobre la fila existente si ya hay una con la misma clave única,
+en un solo statement (sin SELECT previo ni read-modify-write):
+
+- MySQL/MariaDB:     INSERT ... ON DUPLICATE KEY UPDATE c = c + VALUES(c)
+- SQLite/PostgreSQL: INSERT ... ON CONFLICT (clave) DO UPDATE SET c = tabla.c + excluded.c
+
+Uso:
+    upsert_sumando(Stock, [{"clave": k, "producto_id": 1, ..., "cantidad": 5}],
+                   conflicto="clave", sumar=["cantidad"])
+"""
+from django.db import NotSupportedError, connections, router
+
+LOTE = 500
+
+
+def upsert_sumando(modelo, filas, conflicto, sumar, lote=LOTE):
+    """
+    Inserta `filas` (dicts campo -> valor, todas con los mismos campos). Las que choquen
+    con el índice único de `conflicto` (un campo, o una tupla para un unique_together)
+    suman los campos `sumar` a la fila existente.
+    En MySQL ON DUPLICATE KEY aplica a cualquier índice único de la tabla: `conflicto`
+    debe ser el único que pueda chocar. Devuelve el rowcount informado por el motor.
+    """
+    if not filas:
+        return 0
+    conexion = connections[router.db_for_write(modelo)]
+    qn = conexion.ops.quote_name
+    meta = modelo._meta
+
+    nombres = list(filas[0])
+    campos = [meta.get_field(nombre) for nombre in nombres]  # acepta "producto" o "producto_id"
+    tabla = qn(meta.db_table)
+    columnas = ", ".join(qn(f.column) for f in campos)
+    sumas = [qn(meta.get_field(nombre).column) for nombre in sumar]
+
+    if conexion.vendor == "mysql":
+        extra = "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = {c} + VALUES({c})" for c in sumas)
+    elif conexion.vendor in ("sqlite", "postgresql"):
+        if isinstance(conflicto, str):
+            conflicto = (conflicto,)
+        extra = (f"ON CONFLICT ({', '.join(qn(meta.get_field(c).column) for c in conflicto)}) DO UPDATE SET "
+                 + ", ".join(f"{c} = {tabla}.{c} + excluded.{c}" for c in sumas))
+    else:
+        raise NotSupportedError(f"upsert_sumando no soporta el motor {conexion.vendor}")
+
+    marcadores = "(" + ", ".join(["%s"] * len(campos)) + ")"
+    total = 0
+    with conexion.cursor() as cur:
+        for i in range(0, len(filas), lote):
+            trozo = filas[i:i + lote]
+            valores = [f.get_db_prep_save(fila[n], conexion) for fila in trozo for n, f in zip(nombres, campos)]
+            cur.execute(
+                f"INSERT INTO {tabla} ({columnas}) VALUES {', '.join([marcadores] * len(trozo))} {extra}",
+                valores,
+            )
+            total += cur.rowcount
+    return total
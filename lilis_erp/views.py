@@ -1,13 +1,19 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from apps.account.views import get_redirect_for_role
+from apps.transactional import diario
 
 @login_required(login_url='login')
 def dashboard_page(request):
     user = request.user
     if not (user.is_superuser or getattr(user, "rol", "") == "ADMIN"):
         return redirect(get_redirect_for_role(user))
-    return render(request, "dashboard.html")
+    # KPIs desde MovimientoDiario, cacheados por rol (todos los usuarios de un rol ven lo mismo)
+    rol = "ADMIN" if user.is_superuser else user.rol
+    kpis = cache.get_or_set(f"dashboard:kpis:{rol}", diario.kpis, settings.DASHBOARD_KPIS_SEGUNDOS)
+    return render(request, "dashboard.html", {"kpis": kpis})
 
 def handler403(request, exception=None):
     return render(request, "403.html", status=403)
@@ -1,5 +1,6 @@
 // main.js — Búsqueda AJAX en vivo para formularios GET con [data-live="search"]
 // Reemplaza: <tbody id="list-body">, <nav id="list-pagination"> y <small id="list-pagination-label">
+// Paginación por cursor: los enlaces de #list-pagination llevan ?cursor=<token opaco>; se siguen tal cual.
 // Funciona con input (q), selects, paginación y submit. Si falla AJAX, el form sigue funcionando normal.
 
 (function () {
@@ -122,7 +123,9 @@
         const debounced = debounce(() => {
           if (!q.value) {
             const base = form.getAttribute("action") || window.location.pathname;
-            const url  = `${base}?q=`;
+            // En modo cursor (keyset) el formulario trae <input name="modo">; se conserva al limpiar
+            const modo = form.querySelector('input[name="modo"]');
+            const url  = modo ? `${base}?q=&modo=${encodeURIComponent(modo.value)}` : `${base}?q=`;
             refreshFromURL(url, form)
               .catch(err => { if (!isAbort(err)) log("[live-search] error:", err?.message || err); });
           } else {
@@ -154,8 +157,70 @@
     });
   }
 
+  // ---- Exportación en segundo plano ----
+  // <a data-export-async href="...&export=xlsx"> encola el trabajo (&async=1),
+  // consulta su estado cada 2 s y descarga el archivo cuando queda listo.
+  const EXPORT_POLL_MS = 2000;
+
+  function sleep(ms) { return new Promise(r => setTimeout(r, ms)); }
+
+  async function exportAsync(a) {
+    if (a.dataset.exporting === "1") return;
+    a.dataset.exporting = "1";
+    const original = a.innerHTML;
+    a.classList.add("disabled");
+    a.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Generando…';
+    try {
+      const sep = a.href.includes("?") ? "&" : "?";
+      let resp = await fetch(a.href + sep + "async=1", { credentials: "same-origin" });
+      let job = await resp.json();
+      while (job.ok && job.estado !== "LISTO" && job.estado !== "ERROR") {
+        await sleep(EXPORT_POLL_MS);
+        resp = await fetch(job.estado_url, { credentials: "same-origin" });
+        job = await resp.json();
+      }
+      if (job.ok && job.estado === "LISTO") {
+        window.location.href = job.descarga_url;
+      } else {
+        const msg = job.error || "No se pudo generar la exportación.";
+        if (window.Swal) Swal.fire("Exportación", msg, "error"); else alert(msg);
+      }
+    } catch (err) {
+      log("[export-async] error:", err?.message || err);
+    } finally {
+      a.innerHTML = original;
+      a.classList.remove("disabled");
+      delete a.dataset.exporting;
+    }
+  }
+
+  function setupExportAsync(root) {
+    root.querySelectorAll("a[data-export-async]").forEach(a => {
+      a.addEventListener("click", (ev) => {
+        ev.preventDefault();
+        exportAsync(a);
+      });
+    });
+  }
+
   document.addEventListener("DOMContentLoaded", () => {
     setupLiveSearch(document);
+    setupExportAsync(document);
     log("[live-search] listo");
   });
 })();
+
+// Idempotency-Key para los POST que crean registros: el mismo cuerpo reenviado (doble clic,
+// reintento) lleva la misma clave y el servidor devuelve la respuesta original en vez de
+// crear un duplicado. Un cuerpo distinto obtiene una clave nueva.
+window.claveIdempotencia = (function () {
+  let ultimo = { cuerpo: null, clave: null };
+  function nuevaClave() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(16) + "-" + Math.random().toString(16).slice(2);
+  }
+  return function (cuerpo) {
+    if (ultimo.cuerpo !== cuerpo) ultimo = { cuerpo: cuerpo, clave: nuevaClave() };
+    return ultimo.clave;
+  };
+})();